@@ -0,0 +1,108 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark of the acting and training paths of :py:class:`~pytorch_seed_rl.nets.AtariNet`.
+
+Compares against the default forward pass, which always samples actions
+and divides input frames by 255.
+
+Usage::
+
+    python benchmarks/atari_net_benchmark.py --device cpu
+"""
+import argparse
+import copy
+import timeit
+
+import torch
+
+from pytorch_seed_rl.nets import AtariNet
+
+PARSER = argparse.ArgumentParser(description="AtariNet benchmark")
+PARSER.add_argument("--device", default="cpu", type=str,
+                    help="Torch device the benchmark runs on.")
+PARSER.add_argument("--num_actions", default=6, type=int,
+                    help="Number of discrete actions.")
+PARSER.add_argument("--rollout", default=80, type=int,
+                    help="Rollout length of training batches.")
+PARSER.add_argument("--batchsizes", default=[4, 16, 64], type=int, nargs='+',
+                    help="Batch sizes to benchmark.")
+PARSER.add_argument("--repeat", default=10, type=int,
+                    help="Number of timed calls per setting.")
+
+OBSERVATION_SHAPE = (4, 84, 84)
+
+
+def _inputs(T: int, B: int, num_actions: int, device: torch.device) -> dict:
+    """Returns random model inputs of shape [T, B, ...].
+    """
+    # pylint: disable=invalid-name
+    return {
+        'frame': torch.randint(0, 255, (T, B) + OBSERVATION_SHAPE,
+                               dtype=torch.uint8, device=device),
+        'reward': torch.randn(T, B, device=device),
+        'done': torch.zeros(T, B, dtype=torch.bool, device=device),
+        'last_action': torch.randint(0, num_actions, (T, B), device=device),
+    }
+
+
+def _time(func, repeat: int, device: torch.device) -> float:
+    """Returns the mean runtime in milliseconds of :py:attr:`func`.
+    """
+    def run():
+        func()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+
+    run()  # warm-up
+    return timeit.timeit(run, number=repeat) / repeat * 1000
+
+
+def main(flags):
+    """Runs the benchmark and prints a table of results.
+    """
+    device = torch.device(flags.device)
+    model = AtariNet(OBSERVATION_SHAPE, flags.num_actions).to(device)
+    folded_model = copy.deepcopy(model)
+    folded_model.fold_input_scale()
+
+    print("training: forward and backward of [%d, B] batches" % (flags.rollout + 1))
+    print("%5s %14s %14s %8s" % ("B", "default [ms]", "training [ms]", "speedup"))
+    for batchsize in flags.batchsizes:
+        inputs = _inputs(flags.rollout + 1, batchsize, flags.num_actions, device)
+
+        def default():
+            model(inputs)[0]['policy_logits'].sum().backward()
+
+        def training():
+            model(inputs, sample_action=False)[0]['policy_logits'].sum().backward()
+
+        t_default = _time(default, flags.repeat, device)
+        t_training = _time(training, flags.repeat, device)
+        print("%5d %14.3f %14.3f %7.2fx" %
+              (batchsize, t_default, t_training, t_default / t_training))
+
+    print("\nacting: inference of [1, B] batches")
+    print("%5s %14s %14s %8s" % ("B", "default [ms]", "folded [ms]", "speedup"))
+    for batchsize in flags.batchsizes:
+        inputs = _inputs(1, batchsize, flags.num_actions, device)
+
+        with torch.no_grad():
+            t_default = _time(lambda: model(inputs), flags.repeat, device)
+            t_folded = _time(lambda: folded_model(inputs), flags.repeat, device)
+        print("%5d %14.3f %14.3f %7.2fx" %
+              (batchsize, t_default, t_folded, t_default / t_folded))
+
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,71 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark of environment steps per second with the chain of Atari wrappers
+and with :py:class:`~pytorch_seed_rl.environments.atari_wrappers.FusedAtariEnv`,
+with new and with inplace updated observations.
+
+Both are wrapped by :py:class:`~pytorch_seed_rl.environments.atari_wrappers.DictObservationsEnv`,
+as spawned by :py:class:`~pytorch_seed_rl.environments.EnvSpawner`.
+Emulation is included, so the speedup of preprocessing alone is larger.
+
+Usage::
+
+    python benchmarks/atari_wrappers_benchmark.py --env PongNoFrameskip-v4
+"""
+import argparse
+import time
+
+import torch
+
+from pytorch_seed_rl.environments import EnvSpawner
+
+PARSER = argparse.ArgumentParser(description="Atari wrappers benchmark")
+PARSER.add_argument("--env", type=str, default="PongNoFrameskip-v4",
+                    help="Gym environment.")
+PARSER.add_argument("--steps", default=2000, type=int,
+                    help="Number of timed environment steps per setting.")
+
+
+def _steps_per_second(env, num_steps: int) -> float:
+    """Returns the steps per second of :py:attr:`env` taking random actions.
+    """
+    env.initial()
+    actions = torch.randint(0, env.action_space.n, (num_steps, 1, 1))
+
+    start = time.time()
+    for action in actions:
+        env.step(action)
+    return num_steps / (time.time() - start)
+
+
+def main(flags):
+    """Runs the benchmark and prints a table of results.
+    """
+    print("%8s %8s %14s %8s" % ("wrappers", "inplace", "steps/s", "speedup"))
+    baseline = None
+    for fused in (False, True):
+        for inplace in (False, True):
+            env = EnvSpawner(flags.env, 1,
+                             fused_preprocessing=fused,
+                             inplace_observations=inplace).spawn()[0]
+            result = _steps_per_second(env, flags.steps)
+            env.close()
+
+            baseline = baseline or result
+            print("%8s %8s %14.1f %7.2fx" %
+                  ("fused" if fused else "chain", inplace, result, result / baseline))
+
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
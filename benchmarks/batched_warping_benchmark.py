@@ -0,0 +1,93 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark of environment steps per second of an actor's environments,
+each stepped on its own and stepped by
+:py:class:`~pytorch_seed_rl.environments.vec_env.BatchedAtariVecEnv`
+with a varying number of warp threads.
+
+All environments use :py:class:`~pytorch_seed_rl.environments.atari_wrappers.FusedAtariEnv`.
+Emulation is included, so the speedup of preprocessing alone is larger.
+
+Usage::
+
+    python benchmarks/batched_warping_benchmark.py --env PongNoFrameskip-v4 --num_envs 32
+"""
+import argparse
+import time
+
+import torch
+
+from pytorch_seed_rl.environments import EnvSpawner
+
+PARSER = argparse.ArgumentParser(description="Batched frame warping benchmark")
+PARSER.add_argument("--env", type=str, default="PongNoFrameskip-v4",
+                    help="Gym environment.")
+PARSER.add_argument("--num_envs", default=32, type=int,
+                    help="Number of environments of the actor.")
+PARSER.add_argument("--steps", default=200, type=int,
+                    help="Number of timed steps of all environments per setting.")
+PARSER.add_argument("--warp_threads", default=[1, 2, 4], type=int, nargs='+',
+                    help="Numbers of warp threads to benchmark.")
+
+
+def _steps_per_second(envs, num_actions: int, num_steps: int) -> float:
+    """Returns the steps per second of all :py:attr:`envs` taking random actions.
+    """
+    batched = not isinstance(envs, list)
+    if batched:
+        envs.initial()
+    else:
+        for env in envs:
+            env.initial()
+    actions = torch.randint(0, num_actions, (num_steps, len(envs), 1, 1))
+
+    start = time.time()
+    for step_actions in actions:
+        if batched:
+            envs.step(step_actions)
+        else:
+            for env, action in zip(envs, step_actions):
+                env.step(action)
+    return num_steps * len(envs) / (time.time() - start)
+
+
+def _close(envs):
+    if isinstance(envs, list):
+        for env in envs:
+            env.close()
+    else:
+        envs.close()
+
+
+def main(flags):
+    """Runs the benchmark and prints a table of results.
+    """
+    print("%8s %8s %14s %8s" % ("batched", "threads", "steps/s", "speedup"))
+    settings = [(False, 1)] + [(True, threads) for threads in flags.warp_threads]
+    baseline = None
+    for batched, threads in settings:
+        env_spawner = EnvSpawner(flags.env, flags.num_envs,
+                                 fused_preprocessing=True,
+                                 batched_preprocessing=batched,
+                                 warp_threads=threads)
+        envs = env_spawner.spawn()
+        result = _steps_per_second(envs, env_spawner.env_info['action_space'].n, flags.steps)
+        _close(envs)
+
+        baseline = baseline or result
+        print("%8s %8s %14.1f %7.2fx" % (batched, threads, result, result / baseline))
+
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,124 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=protected-access
+"""Benchmark of data-parallel learning processes on CPU.
+
+Every process trains a replica of :py:class:`~pytorch_seed_rl.nets.AtariNet`
+on random batches, using :py:meth:`~pytorch_seed_rl.agents.Learner._update()`.
+The intra-op threads of the machine are split evenly between processes.
+
+Usage::
+
+    python benchmarks/data_parallel_benchmark.py --num_learners 1 2 4
+"""
+import argparse
+import os
+import socket
+import time
+
+import torch
+import torch.multiprocessing as mp
+from torch.optim import RMSprop
+
+from pytorch_seed_rl.agents import Learner, data_parallel
+from pytorch_seed_rl.nets import AtariNet
+
+PARSER = argparse.ArgumentParser(description="Data-parallel learner benchmark")
+PARSER.add_argument("--num_learners", default=[1, 2, 4], type=int, nargs='+',
+                    help="Numbers of learning processes to benchmark.")
+PARSER.add_argument("--batchsize", default=4, type=int,
+                    help="Batch size of every learning process.")
+PARSER.add_argument("--rollout", default=80, type=int,
+                    help="Rollout length.")
+PARSER.add_argument("--num_actions", default=6, type=int,
+                    help="Number of discrete actions.")
+PARSER.add_argument("--iterations", default=10, type=int,
+                    help="Number of timed updates.")
+
+OBSERVATION_SHAPE = (4, 84, 84)
+
+
+def _batch(rollout: int, batchsize: int, num_actions: int) -> dict:
+    """Returns a random batch as created by :py:meth:`~Learner._to_batch()`.
+    """
+    shape = (rollout + 1, batchsize)
+    return {
+        'frame': torch.randint(0, 255, shape + OBSERVATION_SHAPE, dtype=torch.uint8),
+        'reward': torch.randn(shape),
+        'done': torch.zeros(shape, dtype=torch.bool),
+        'last_action': torch.randint(0, num_actions, shape),
+        'action': torch.randint(0, num_actions, shape),
+        'action_log_prob': -torch.rand(shape),
+        'current_length': torch.full((batchsize,), rollout + 1),
+    }
+
+
+def _run(rank: int, world_size: int, port: int, flags, results: mp.Queue):
+    """Trains a replica and puts the measured steps per second on :py:attr:`results`.
+    """
+    torch.set_num_threads(max(1, os.cpu_count() // world_size))
+    if world_size > 1:
+        data_parallel.init_process_group(rank, world_size, port)
+
+    model = AtariNet(OBSERVATION_SHAPE, flags.num_actions)
+    optimizer = RMSprop(model.parameters(), lr=0.0005)
+    scheduler = Learner._build_scheduler(optimizer, 1, 10**9)
+    if world_size > 1:
+        data_parallel.broadcast_parameters(model)
+
+    batch = _batch(flags.rollout, flags.batchsize, flags.num_actions)
+
+    # warm-up
+    Learner._update(model, optimizer, scheduler, batch, world_size=world_size)
+
+    steps = 0
+    start = time.time()
+    for _ in range(flags.iterations):
+        steps += Learner._update(model, optimizer, scheduler, batch, world_size=world_size)[0]
+    runtime = time.time() - start
+
+    if rank == 0:
+        results.put(steps / runtime)
+    if world_size > 1:
+        data_parallel.destroy_process_group()
+
+
+def _free_port() -> int:
+    """Returns a currently unused local port.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main(flags):
+    """Runs the benchmark and prints a table of results.
+    """
+    results = mp.get_context('spawn').Queue()
+    print("%8s %14s %8s" % ("learners", "steps/s", "scaling"))
+    baseline = None
+    for world_size in flags.num_learners:
+        mp.spawn(_run,
+                 args=(world_size, _free_port(), flags, results),
+                 nprocs=world_size,
+                 join=True)
+        steps_per_second = results.get()
+        baseline = baseline or steps_per_second
+        print("%8d %14.1f %7.2fx" %
+              (world_size, steps_per_second, steps_per_second / baseline))
+
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,80 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=protected-access
+"""Benchmark of the V-trace recursion, python loop against vectorized scan.
+
+Usage::
+
+    python benchmarks/vtrace_benchmark.py --device cpu
+"""
+import argparse
+import timeit
+
+import torch
+
+from pytorch_seed_rl.functional import vtrace
+
+PARSER = argparse.ArgumentParser(description="V-trace benchmark")
+PARSER.add_argument("--device", default="cpu", type=str,
+                    help="Torch device the benchmark runs on.")
+PARSER.add_argument("--rollouts", default=[20, 80, 320], type=int, nargs='+',
+                    help="Rollout lengths T to benchmark.")
+PARSER.add_argument("--batchsizes", default=[1, 4, 32, 128], type=int, nargs='+',
+                    help="Batch sizes B to benchmark.")
+PARSER.add_argument("--repeat", default=50, type=int,
+                    help="Number of timed calls per setting.")
+
+
+def _inputs(rollout: int, batchsize: int, device: torch.device) -> dict:
+    """Returns random inputs for :py:func:`vtrace._from_importance_weights`.
+    """
+    discounts = (torch.rand(rollout, batchsize, device=device) > 0.01).float() * 0.99
+    return {
+        "log_rhos": torch.randn(rollout, batchsize, device=device) * 0.1,
+        "values": torch.randn(rollout, batchsize, device=device),
+        "bootstrap_value": torch.randn(batchsize, device=device),
+        "discounts": discounts,
+        "rewards": torch.randn(rollout, batchsize, device=device),
+    }
+
+
+def _time(inputs: dict, vectorized: bool, repeat: int, device: torch.device) -> float:
+    """Returns the mean runtime in milliseconds of a single V-trace call.
+    """
+    def run():
+        vtrace._from_importance_weights(vectorized=vectorized, **inputs)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+
+    run()  # warm-up
+    return timeit.timeit(run, number=repeat) / repeat * 1000
+
+
+def main(flags):
+    """Runs the benchmark and prints a table of results.
+    """
+    device = torch.device(flags.device)
+    print("%5s %5s %12s %12s %8s" % ("T", "B", "loop [ms]", "scan [ms]", "speedup"))
+    for rollout in flags.rollouts:
+        for batchsize in flags.batchsizes:
+            inputs = _inputs(rollout, batchsize, device)
+            t_loop = _time(inputs, False, flags.repeat, device)
+            t_scan = _time(inputs, True, flags.repeat, device)
+            print("%5d %5d %12.3f %12.3f %7.2fx" %
+                  (rollout, batchsize, t_loop, t_scan, t_loop / t_scan))
+
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
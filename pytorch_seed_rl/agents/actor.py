@@ -15,14 +15,16 @@
 # pylint: disable=empty-docstring
 """
 """
+import queue
 import time
 
-from torch import tensor
+from torch import Tensor, tensor
 from torch.distributed.rpc import RRef
 from torch.futures import Future
 
 from .. import agents
 from ..environments import EnvSpawner
+from ..environments.vec_env import BatchedAtariVecEnv, SubprocVecEnv
 from .rpc_caller import RpcCaller
 
 
@@ -41,27 +43,69 @@ class Actor(RpcCaller):
     env_spawner: :py:class:`~.EnvSpawner`
         Object that spawns an environment on invoking it's
         :py:meth:`~.EnvSpawner.spawn()` method.
+    num_groups: `int`
+        Number of groups the environments are split into.
+        Groups alternate between waiting for actions and stepping.
+        Ignored, if :py:attr:`as_completed` is set.
+    as_completed: `bool`
+        Set True, if each environment shall be stepped as soon as its action arrives
+        and send its next request right away, independent of all other environments.
+    frame_ring_info: `dict`
+        Description of a :py:class:`~.tools.FrameRing` created by the :py:class:`~.agents.Learner`,
+        as returned by :py:meth:`~.tools.FrameRing.info()`.
+        If given, frames are written into this shared memory ring
+        and requests carry only the slot index.
     """
 
     def __init__(self,
                  rank: int,
                  infer_rref: RRef,
-                 env_spawner: EnvSpawner):
+                 env_spawner: EnvSpawner,
+                 num_groups: int = 1,
+                 as_completed: bool = False,
+                 frame_ring_info: dict = None):
         # ASSERTIONS
         # infer_rref must be a Learner
         assert infer_rref._get_type() is agents.Learner
+        assert 0 < num_groups <= env_spawner.num_envs
 
         super().__init__(rank, infer_rref)
 
         self._num_envs = env_spawner.num_envs
+        self._frame_ring = None
+        if frame_ring_info is not None:
+            # imported lazily, shared memory is missing before python 3.8
+            from ..tools.frame_ring import FrameRing  # pylint: disable=import-outside-toplevel
+            self._frame_ring = FrameRing.attach(frame_ring_info)
+
         self._envs = env_spawner.spawn()
-        self._current_states = [env.initial() for env in self._envs]
+        self._vec_env = isinstance(self._envs, (SubprocVecEnv, BatchedAtariVecEnv))
+        if self._vec_env:
+            self._current_states = [self._own_frame(state) for state in self._envs.initial()]
+        else:
+            self._current_states = [env.initial() for env in self._envs]
 
         # pylint: disable=not-callable
-        self._metrics = [{'latency': tensor(0.).view(1, 1)}
+        self._metrics = [{'latency': tensor(0.).view(1, 1),
+                          'actor_utilization': tensor(0.).view(1, 1),
+                          'actor_idle_time': tensor(0.).view(1, 1),
+                          'env_steps_per_second': tensor(0.).view(1, 1),
+                          'reset_time': tensor(0.).view(1, 1)}
                          for _ in range(self._num_envs)]
 
-        self._futures = []
+        # contiguous groups of environment indices
+        self._groups = [list(range(self._num_envs))[g * self._num_envs // num_groups:
+                                                    (g + 1) * self._num_envs // num_groups]
+                        for g in range(num_groups)]
+        self._next_group = 0
+
+        self._futures = {}
+        self._send_times = [0.] * self._num_envs
+        self._step_times = [time.time()] * self._num_envs
+
+        # indices of environments whose action arrived, put by future callbacks
+        self._as_completed = as_completed
+        self._completed = queue.SimpleQueue()
 
     def _loop(self):
         """Inner loop method of an :py:class:`Actor`.
@@ -69,50 +113,216 @@ class Actor(RpcCaller):
 
             Implements :py:meth:`~.RpcCaller._loop()`.
         """
-        self.act()
+        if self._as_completed:
+            self.act_as_completed()
+        else:
+            self.act()
 
     def act(self):
         """Interact with internal environment.
 
-            # . Send current state (and metrics) off to batching layer for inference.
-            # . Receive action.
+            # . Send current state (and metrics) off to batching layer for inference,
+                for all environments without pending request.
+            # . Receive actions of the next group of environments.
+            # . Step this group of environments.
+
+        Groups take turns, so while one group steps, the requests of all other groups
+        are processed by the :py:class:`~.agents.Learner`.
+
+        If environments are vectorized, e.g. run in subprocesses, each environment starts its step
+        as soon as its action is received, all steps of the group are awaited at the end.
         """
 
-        # Send off inference requests for all environments at once, take time
-        send_time = time.time()
-        self._futures = [self._act(i) for i in range(self._num_envs)]
+        self._send_pending()
+        if self.shutdown:
+            return
+
+        group = self._groups[self._next_group]
+        self._next_group = (self._next_group + 1) % len(self._groups)
+
+        # Wait for requested action for each environment of this group.
+        start = time.time()
+        answers = [self._futures.pop(i).wait() for i in group]
+        wait_end = time.time()
+
+        inference_infos = {}
+        for i, (action, self.shutdown, answer_id, infos) in zip(group, answers):
+            # If requested action is None, Learner was shutdown. Loop can be exited here.
+            if action is None:
+                return
+
+            # sanity: assert answer is actually for this environment
+            assert self._gen_env_id(i) == answer_id
+
+            # perform an environment step,
+            # save new state and possible information recorded during inference on the Learner.
+            if self._vec_env:
+                self._envs.step_async(i, action)
+                inference_infos[i] = infos
+                continue
+            self._current_states[i] = self._with_infos(self._own_frame(self._envs[i].step(action)),
+                                                       infos)
 
-        # Wait for requested action for each environment.
-        if not self.shutdown:
-            for i, rpc_tuple in enumerate(self._futures):
-                action, self.shutdown, answer_id, inference_infos = rpc_tuple.wait()
+        if self._vec_env:
+            for i, state in self._envs.step_wait().items():
+                self._current_states[i] = self._with_infos(self._own_frame(state),
+                                                           inference_infos[i])
 
-                # If requested action is None, Learner was shutdown. Loop can be exited here.
-                if action is None:
-                    return
+        # share of this cycle spent stepping instead of waiting for actions
+        end = time.time()
+        utilization = (end - wait_end) / max(end - start, 1e-9)
 
-                # pylint: disable=not-callable
-                self._metrics[i] = {
-                    'latency': tensor(time.time() - send_time).view(1, 1)
-                }
+        for i in group:
+            self._set_metrics(i, wait_end, utilization, wait_end - start)
 
-                # sanity: assert answer is actually for this environment
-                assert self._gen_env_id(i) == answer_id
+    def act_as_completed(self):
+        """Interact with internal environment, as actions arrive.
 
-                # perform an environment step,
-                # save new state and possible information recorded during inference on the Learner.
-                self._current_states[i] = self._envs[i].step(action)
-                self._current_states[i] = {
-                    **self._current_states[i], **inference_infos}
+            # . Send current state (and metrics) off to batching layer for inference,
+                for all environments without pending request.
+            # . Wait for any action to arrive.
+            # . Step each environment whose action arrived
+                and send its next request right away.
+
+        A slow answer for one environment does not hold back the others.
+
+        If environments are vectorized, all environments whose action arrived
+        start their step at once and send their request, when it is done.
+        """
+        self._send_pending()
+        if self.shutdown:
+            return
+
+        # Wait for any action, then collect all further actions that have arrived meanwhile.
+        start = time.time()
+        ready = [self._completed.get()]
+        wait_end = time.time()
+        while True:
+            try:
+                ready.append(self._completed.get_nowait())
+            except queue.Empty:
+                break
+
+        inference_infos = {}
+        for i in ready:
+            action, self.shutdown, answer_id, infos = self._futures.pop(i).wait()
+            if action is None:
+                return
+            assert self._gen_env_id(i) == answer_id
+
+            if self._vec_env:
+                self._envs.step_async(i, action)
+                inference_infos[i] = infos
+                continue
+            self._current_states[i] = self._with_infos(self._own_frame(self._envs[i].step(action)),
+                                                       infos)
+            end = time.time()
+            self._set_metrics(i, wait_end, (end - wait_end) / max(end - start, 1e-9),
+                              wait_end - start)
+            self._send(i)
+
+        if self._vec_env:
+            states = self._envs.step_wait()
+            end = time.time()
+            for i, state in states.items():
+                self._current_states[i] = self._with_infos(self._own_frame(state),
+                                                           inference_infos[i])
+                self._set_metrics(i, wait_end, (end - wait_end) / max(end - start, 1e-9),
+                                  wait_end - start)
+                self._send(i)
+
+    def _send_pending(self):
+        """Sends inference requests for all environments without pending request.
+        """
+        for i in range(self._num_envs):
+            if i not in self._futures:
+                self._send(i)
+
+    def _send(self, i: int):
+        """Sends the inference request of environment :py:attr:`i` and takes time.
+        """
+        self._send_times[i] = time.time()
+        future = self._act(i)
+        if self._as_completed:
+            # Future.then() runs the callback once the answer arrives
+            future.then(lambda _, i=i: self._completed.put(i))
+        self._futures[i] = future
+
+    def _set_metrics(self,
+                     i: int,
+                     arrival_time: float,
+                     utilization: float,
+                     idle_time: float):
+        """Sets the metrics that are sent with the next request of environment :py:attr:`i`.
+
+        Parameters
+        ----------
+        i: `int`
+            The index of the environment, which has just been stepped.
+        arrival_time: `float`
+            The time the action of this environment was received.
+        utilization: `float`
+            Share of the last cycle the actor spent stepping instead of waiting for actions.
+        idle_time: `float`
+            The time the actor waited for actions in the last cycle.
+        """
+        now = time.time()
+        steps_per_second = 1. / max(now - self._step_times[i], 1e-9)
+        self._step_times[i] = now
+
+        if self._vec_env:
+            reset_time = self._envs.reset_times[i]
+        else:
+            reset_time = self._envs[i].reset_time
+
+        # pylint: disable=not-callable
+        self._metrics[i] = {
+            'latency': tensor(arrival_time - self._send_times[i]).view(1, 1),
+            'actor_utilization': tensor(utilization).view(1, 1),
+            'actor_idle_time': tensor(idle_time).view(1, 1),
+            'env_steps_per_second': tensor(steps_per_second).view(1, 1),
+            'reset_time': tensor(reset_time).view(1, 1),
+        }
+
+    @staticmethod
+    def _with_infos(state: dict, infos: dict) -> dict:
+        """Returns :py:attr:`state` merged with information recorded during inference.
+
+        Avoids building a new `dict`, if there is no information.
+        """
+        if infos:
+            return {**state, **infos}
+        return state
+
+    def _own_frame(self, state: dict) -> dict:
+        """Replaces the frame of :py:attr:`state` by a copy,
+        if it is a view of a larger buffer, e.g. the shared frame buffer of subprocess environments.
+
+        RPCs serialize the whole storage of a tensor, not only the viewed part.
+        Frames sent through a frame ring are copied into the ring instead.
+        """
+        frame = state['frame']
+        if self._frame_ring is None and _storage_nbytes(frame) > frame.numel() * frame.element_size():
+            state['frame'] = frame.clone()
+        return state
 
     def _act(self, i: int) -> Future:
         """Wraps rpc call that is processed batch-wise by a :py:class:`~.agents.Learner`.
             Calls :py:meth:`~.RpcCaller.batched_rpc()`.
 
             Called by :py:meth:`act()`
+
+        If a frame ring is used, the frame is written into it and replaced by its slot index.
         """
+        state = self._current_states[i]
+        if self._frame_ring is not None:
+            slot = self._frame_ring.write(self._gen_env_id(i), state['frame'])
+            state = {k: v for k, v in state.items() if k != 'frame'}
+            # pylint: disable=not-callable
+            state['frame_slot'] = tensor(slot).view(1, 1)
+
         return self.batched_rpc(self._gen_env_id(i),
-                                self._current_states[i],
+                                state,
                                 metrics=self._metrics[i]
                                 )
 
@@ -130,5 +340,20 @@ class Actor(RpcCaller):
             del state
 
         # in case this actor renders an environment
-        for env in self._envs:
-            env.close()
+        if self._vec_env:
+            self._envs.close()
+        else:
+            for env in self._envs:
+                env.close()
+
+        if self._frame_ring is not None:
+            self._frame_ring.close()
+
+
+def _storage_nbytes(tensor: Tensor) -> int:
+    """Returns the size of the storage underlying :py:attr:`tensor` in bytes.
+    """
+    try:
+        return tensor.untyped_storage().nbytes()
+    except AttributeError:  # torch < 2.0
+        return tensor.storage().size() * tensor.element_size()
@@ -0,0 +1,133 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Collective operations used by data-parallel learning processes.
+
+All learning processes form a process group using the gloo backend.
+Every process trains a replica of the same model on its own batches.
+Gradients are averaged across the group before each optimizer step,
+so all replicas stay equal, as long as they started equal.
+"""
+from typing import Iterable, Tuple
+
+import torch
+import torch.distributed as dist
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+INIT_METHOD = "tcp://{}:{}"
+
+
+def init_process_group(rank: int,
+                       world_size: int,
+                       port: int,
+                       address: str = "127.0.0.1"):
+    """Joins the process group of all learning processes.
+
+    Parameters
+    ----------
+    rank: `int`
+        Rank of this learning process. Rank 0 is the :py:class:`~.agents.Learner`.
+    world_size: `int`
+        Total number of learning processes.
+    port: `int`
+        A free port on :py:attr:`address`, used to initialize the process group.
+    address: `str`
+        Address of rank 0.
+    """
+    dist.init_process_group("gloo",
+                            init_method=INIT_METHOD.format(address, port),
+                            rank=rank,
+                            world_size=world_size)
+
+
+def destroy_process_group():
+    """Leaves the process group of all learning processes.
+    """
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+
+@torch.no_grad()
+def broadcast_parameters(model: torch.nn.Module, src: int = 0):
+    """Overwrites parameters and buffers of :py:attr:`model` with the ones of rank :py:attr:`src`.
+
+    Parameters
+    ----------
+    model: :py:class:`torch.nn.Module`
+        The local model replica.
+    src: `int`
+        The rank whose model is copied.
+    """
+    tensors = list(model.state_dict().values())
+    flat = _flatten_dense_tensors(tensors)
+    dist.broadcast(flat, src)
+    for tensor, synced in zip(tensors, _unflatten_dense_tensors(flat, tensors)):
+        tensor.copy_(synced)
+
+
+@torch.no_grad()
+def all_reduce_gradients(parameters: Iterable[torch.Tensor],
+                         world_size: int,
+                         num_steps: int = 0) -> int:
+    """Averages gradients of :py:attr:`parameters` across all learning processes inplace.
+
+    The number of environment steps each process learned from is summed within
+    the same collective operation.
+
+    Parameters
+    ----------
+    parameters: iterable of :py:class:`torch.Tensor`
+        Parameters of the local model replica.
+    world_size: `int`
+        Total number of learning processes.
+    num_steps: `int`
+        The number of environment steps this process learned from.
+
+    Returns
+    -------
+    The total number of environment steps learned from across all processes.
+    """
+    grads = [p.grad for p in parameters if p.grad is not None]
+    flat = _flatten_dense_tensors(grads)
+    flat = torch.cat([flat, flat.new_tensor([num_steps])])
+    dist.all_reduce(flat)
+
+    total_steps = int(flat[-1].item())
+    flat = flat[:-1].div_(world_size)
+    for grad, reduced in zip(grads, _unflatten_dense_tensors(flat, grads)):
+        grad.copy_(reduced)
+
+    return total_steps
+
+
+def agree(ready: bool, shutdown: bool) -> Tuple[bool, bool]:
+    """Agrees on the next action of all learning processes.
+
+    Collective operations block until all processes join,
+    so every process must call this before each training step.
+
+    Parameters
+    ----------
+    ready: `bool`
+        Set True, if this process holds a batch to learn from.
+    shutdown: `bool`
+        Set True, if this process wants all processes to stop.
+
+    Returns
+    -------
+    A tuple (all ready, any shutdown).
+    """
+    # pylint: disable=not-callable
+    flags = torch.tensor([int(not ready), int(shutdown)])
+    dist.all_reduce(flags)
+    return flags[0].item() == 0, flags[1].item() > 0
@@ -16,7 +16,9 @@
 """
 """
 import copy
+import functools
 import gc
+import glob
 import os
 import pprint
 import queue
@@ -28,18 +30,24 @@ from typing import Any, Dict, List, Tuple, Union
 
 import torch
 import torch.multiprocessing as mp
-import torch.nn.functional as F
 from torch import nn
 from torch.nn.parallel import DataParallel
 from torch.optim.lr_scheduler import LambdaLR
 
 from .. import agents
+from ..agents import data_parallel
 from ..agents.rpc_callee import RpcCallee
 from ..environments import EnvSpawner
-from ..functional import loss, vtrace
-from ..tools import Recorder, TrajectoryStore
+from ..functional import impala
+from ..tools import CheckpointWriter, FrameRing, ModelSync, Recorder, TrajectoryStore
+from ..tools.frame_ring import FRAME_RING_SUPPORTED
+from ..tools import checkpoint_writer
+from ..tools.metrics_server import MetricsServer
 from ..tools.functions import listdict_to_dictlist
 
+# lower bin edges of the policy lag histogram, counted in training epochs
+POLICY_LAG_BINS = (0, 1, 2, 4, 8, 16, 32, 64)
+
 
 class Learner(RpcCallee):
     """Agent that runs inference and learning in parallel.
@@ -88,6 +96,12 @@ class Learner(RpcCallee):
         If bigger 0, clips the computed gradient norm to given maximum value.
     reward_clipping : `bool`
         Reward clipping.
+    vectorized_vtrace : `bool`
+        Set True, if the V-trace recursion shall be computed vectorized instead of a python loop.
+    store_action_log_probs_only : `bool`
+        Set True, if only the log-probability of the sampled action shall be stored,
+        which is all V-trace needs, instead of also storing the full policy logits
+        of each inference.
     batchsize_training : `int`
         Number of complete trajectories to gather before learning from them as batch.
     rollout : `int`
@@ -104,11 +118,33 @@ class Learner(RpcCallee):
         The number of threads that shall perform inference.
     threads_store : `int`
         The number of threads that shall store data into trajectory store.
+    actor_groups : `int`
+        Number of groups each :py:class:`~.agents.Actor` splits its environments into.
+        Groups alternate between waiting for actions and stepping.
+    actor_as_completed : `bool`
+        Set True, if actors shall step each environment as soon as its action arrives,
+        instead of waiting for a whole group.
+    shared_frames : `bool`
+        Set True, if actors run on the same host and shall pass frames
+        through a shared memory :py:class:`~.tools.FrameRing` instead of RPCs.
+        Ignored before python 3.8, which lacks shared memory.
     render: `bool`
         Set True, if episodes shall be rendered.
     max_gif_length: `bool`
         The maximum number of frames that shall be saved as a single gif.
         Set to 0 (default), if no limit shall be enforced.
+    max_gif_memory: `int`
+        The maximum memory in bytes held by recorded frames, that are not written as gif yet.
+        Further frames are dropped.
+    log_modes : `list` of `str`
+        The modes of the :py:class:`~.tools.logger.Logger`, e.g. ``['csv', 'npy']``.
+    aggregate_interval : `float`
+        Interval in seconds of logging aggregates of episode metrics and policy lag.
+    log_episodes : `bool`
+        Set False, if only aggregates shall be logged instead of a row per episode.
+    metrics_port : `int`
+        If greater 0, system, training and aggregated metrics are served
+        at ``http://127.0.0.1:<metrics_port>/metrics`` by a :py:class:`~.tools.MetricsServer`.
     verbose : `bool`
         Set True if system metrics shall be printed at interval set by `print_interval`.
     print_interval : `int`
@@ -119,12 +155,35 @@ class Learner(RpcCallee):
         Set True if the most checkpoint shall be loaded.
     checkpoint_interval : `int`
         Interval of checkpointing. Set to 0 to surpress checkpointing.
+    num_checkpoints : `int`
+        Number of rolling checkpoints that are kept.
+    publish_interval : `int`
+        Number of training epochs between publishing the learning model to the inference model.
+        Set to 0 to publish by time only.
+    publish_interval_time : `float`
+        Seconds between publishing the learning model to the inference model.
+        Set to 0 (default) to publish by training epochs only.
+    max_policy_lag : `int`
+        Maximum policy lag of a trajectory in training epochs, i.e. the number of updates
+        between the inference of its oldest state and learning from it.
+        Set to 0 (default), if no bound shall be enforced.
+    policy_lag_mode : `str`
+        How trajectories beyond :py:attr:`max_policy_lag` are handled.
+        ``'drop'`` excludes them from the loss and from the counted training steps,
+        a batch of only dropped trajectories does not update the model.
+        ``'weight'`` down-weights their loss by :py:attr:`max_policy_lag` / lag.
     max_queued_batches: `int`
         Limits the number of batches that can be queued at once.
     max_queued_drops: `int`
         Limits the number of dropped trajectories that can be queued by the trajectory store.
     max_queued_stores: `int`
         Limits the number of states that can be queued to be stored.
+    num_learners: `int`
+        Number of data-parallel learning processes, including this one.
+        If bigger 1, each process learns from its own batches and gradients are averaged
+        across all processes using the gloo backend.
+    learner_port: `int`
+        A free local port used to initialize the process group of the learning processes.
     """
 
     def __init__(self,
@@ -140,6 +199,8 @@ class Learner(RpcCallee):
                  discounting: float = 0.99,
                  grad_norm_clipping: float = 40.,
                  reward_clipping: bool = True,
+                 vectorized_vtrace: bool = False,
+                 store_action_log_probs_only: bool = False,
                  batchsize_training: int = 4,
                  rollout: int = 80,
                  total_steps: int = -1,
@@ -148,26 +209,54 @@ class Learner(RpcCallee):
                  threads_prefetch: int = 1,
                  threads_inference: int = 1,
                  threads_store: int = 1,
+                 actor_groups: int = 1,
+                 actor_as_completed: bool = False,
+                 shared_frames: bool = False,
                  render: bool = False,
                  max_gif_length: int = 0,
+                 max_gif_memory: int = 2**28,
+                 log_modes: List[str] = None,
+                 aggregate_interval: float = 10.,
+                 log_episodes: bool = True,
+                 metrics_port: int = 0,
                  verbose: bool = False,
                  print_interval: int = 10,
                  system_log_interval: int = 1,
                  load_checkpoint: bool = False,
                  checkpoint_interval: int = 10,
+                 num_checkpoints: int = 2,
+                 publish_interval: int = 1,
+                 publish_interval_time: float = 0.,
+                 max_policy_lag: int = 0,
+                 policy_lag_mode: str = 'drop',
                  max_queued_batches: int = 128,
                  max_queued_drops: int = 128,
-                 max_queued_stores: int = 1024):
+                 max_queued_stores: int = 1024,
+                 num_learners: int = 1,
+                 learner_port: int = 29501):
 
         self.total_num_envs = num_actors*env_spawner.num_envs
         self.envs_list = [i for i in range(self.total_num_envs)]
 
+        # frames of all environments, written by actors on this host
+        self.frame_ring = None
+        if shared_frames and not FRAME_RING_SUPPORTED:
+            print("Shared frames require python 3.8 or newer, frames are sent via RPC.")
+            shared_frames = False
+        if shared_frames:
+            # frames are stored as uint8, the zero frame of an initial observation is cast
+            self.frame_ring = FrameRing(self.total_num_envs,
+                                        env_spawner.placeholder_obs['frame'].shape[2:])
+
         super().__init__(rank,
                          num_callees=1,
                          num_callers=num_actors,
                          threads_process=threads_inference,
                          caller_class=agents.Actor,
-                         caller_args=[env_spawner],
+                         caller_args=[env_spawner,
+                                      actor_groups,
+                                      actor_as_completed,
+                                      self.frame_ring.info() if shared_frames else None],
                          future_keys=self.envs_list)
 
         # ATTRIBUTES
@@ -180,6 +269,8 @@ class Learner(RpcCallee):
         self._discounting = discounting
         self._grad_norm_clipping = grad_norm_clipping
         self._reward_clipping = reward_clipping
+        self._vectorized_vtrace = vectorized_vtrace
+        self._store_action_log_probs_only = store_action_log_probs_only
         self._batchsize_training = batchsize_training
         self._rollout = rollout
 
@@ -191,6 +282,14 @@ class Learner(RpcCallee):
         self._print_interval = print_interval
         self._system_log_interval = system_log_interval
         self._checkpoint_interval = checkpoint_interval
+        self._num_checkpoints = num_checkpoints
+        assert publish_interval > 0 or publish_interval_time > 0
+        self._publish_interval = publish_interval
+        self._publish_interval_time = publish_interval_time
+        assert policy_lag_mode in ('drop', 'weight')
+        self._max_policy_lag = max_policy_lag
+        self._policy_lag_mode = policy_lag_mode
+        self._num_learners = num_learners
 
         # COUNTERS
         self.inference_epoch = 0
@@ -202,11 +301,28 @@ class Learner(RpcCallee):
         self.training_time = 0.
 
         self.fetching_time = 0.
+        self.checkpoint_snapshot_time = 0.
+
+        # version of the inference model, counted in training epochs
+        self.policy_version = 0
+        self.publish_time = 0.
+        self._published_steps = 0
+        self._t_last_publish = time.time()
+
+        # counts of trajectories per bin of POLICY_LAG_BINS
+        self.policy_lag_histogram = torch.zeros(len(POLICY_LAG_BINS), dtype=torch.long)
+
+        # metrics of the last training step
+        self.training_metrics = {}
 
         self.runtime = 0
 
         self.dead_counter = 0
 
+        # STORAGE
+        self._pending_batch = None
+        self._learners_stopped = False
+
         # TORCH
         self.training_device = torch.device(
             "cuda:0" if torch.cuda.is_available() else "cpu")
@@ -217,25 +333,34 @@ class Learner(RpcCallee):
         else:
             print("2 GPUs used!")
             self.eval_device = torch.device("cuda:1")
-            model = DataParallel(model)
+            # data-parallel learning processes replace DataParallel
+            if num_learners == 1:
+                model = DataParallel(model)
 
         self.model = model.to(self.training_device)
 
         self.eval_model = copy.deepcopy(self.model)
         self.eval_model = self.eval_model.to(self.eval_device)
         self.eval_model.eval()
+        self.model_sync = ModelSync(self.model, self.eval_model)
 
         self.optimizer = optimizer
 
-        # define a linear decreasing function for linear scheduler
-        def linear_lambda(epoch):
-            return 1 - min(epoch * rollout * batchsize_training, total_steps) / total_steps
-        self.scheduler = LambdaLR(self.optimizer, linear_lambda)
+        # each training epoch learns from a batch of every learning process
+        self._steps_per_epoch = rollout * batchsize_training * num_learners
+        self.scheduler = self._build_scheduler(self.optimizer,
+                                               self._steps_per_epoch,
+                                               total_steps)
 
         # TOOLS
         self.recorder = Recorder(save_path=self._save_path,
                                  render=render,
-                                 max_gif_length=max_gif_length)
+                                 max_gif_length=max_gif_length,
+                                 log_modes=log_modes,
+                                 max_recording_bytes=max_gif_memory,
+                                 aggregate_interval=aggregate_interval,
+                                 log_episodes=log_episodes)
+        self.checkpoint_writer = CheckpointWriter()
 
         # LOAD CHECKPOINT, IF WANTED
         if load_checkpoint:
@@ -272,8 +397,30 @@ class Learner(RpcCallee):
                                        name='storing_thread_%d' % i)
                                 for i in range(threads_store)]
 
+        # Create additional data-parallel learning processes with rank > 0
+        self.learning_processes = [mp.Process(target=self._learn_replica,
+                                              args=(i,
+                                                    num_learners,
+                                                    learner_port,
+                                                    copy.deepcopy(self.model),
+                                                    self.optimizer.__class__,
+                                                    self.optimizer.defaults,
+                                                    self.optimizer.state_dict(),
+                                                    self.scheduler.state_dict(),
+                                                    self._steps_per_epoch,
+                                                    total_steps,
+                                                    self.queue_batches,
+                                                    self.shutdown_event,
+                                                    self._get_update_kwargs(),
+                                                    max_policy_lag,
+                                                    policy_lag_mode),
+                                              daemon=True,
+                                              name='learning_process_%d' % i)
+                                   for i in range(1, num_learners)]
+
         # spawn trajectory store
-        placeholder_eval_obs = self._build_placeholder_eval_obs(env_spawner)
+        placeholder_eval_obs = self._build_placeholder_eval_obs(env_spawner,
+                                                                store_action_log_probs_only)
         self.trajectory_store = TrajectoryStore(self.envs_list,
                                                 placeholder_eval_obs,
                                                 self.eval_device,
@@ -285,9 +432,24 @@ class Learner(RpcCallee):
         self._start_callers()
 
         # start threads and processes
-        for thread in [*self.prefetch_threads, *self.storing_threads]:
+        for thread in [*self.prefetch_threads,
+                       *self.storing_threads,
+                       *self.learning_processes]:
             thread.start()
 
+        # sources are read by the serving thread on request, without locks
+        self.metrics_server = None
+        if metrics_port > 0:
+            self.metrics_server = MetricsServer({'system': self._get_system_metrics,
+                                                 'training': lambda: self.training_metrics,
+                                                 'aggregates': lambda: self.recorder.aggregates},
+                                                port=metrics_port)
+
+        # all learning processes start from the model of this process
+        if num_learners > 1:
+            data_parallel.init_process_group(0, num_learners, learner_port)
+            data_parallel.broadcast_parameters(self.model)
+
     # pylint: disable=arguments-differ
     def _loop(self, waiting_time: float = 5):
         """Inner loop function of a :py:class:`Learner`.
@@ -295,8 +457,10 @@ class Learner(RpcCallee):
         Called by :py:meth:`.RpcCallee.loop()`.
 
         This method first pulls a batch in :py:attr:`self.queue_batches`.
+        If data-parallel learning processes are used, it agrees with them on
+        whether all processes hold a batch or shall shut down.
         Then it invokes :py:meth:`_learn_from_batch()`
-        and copies the updated model weights from the learning model to :py:attr:`self.eval_model`.
+        and, if the publish interval has been reached, invokes :py:meth:`_publish_model()`.
         System metrics are passed logged using :py:meth:`~.Recorder.log()`.
         Finally, it checks for reached shutdown criteria,
         like :py:attr:`self._total_steps` has been reached.
@@ -306,13 +470,24 @@ class Learner(RpcCallee):
         waiting_time: `float`
             Seconds to wait on batches delivered by :py:attr:`self.queue_batches`.
         """
-        batch = None
-        try:
-            batch = self.queue_batches.get(timeout=waiting_time)
-        except queue.Empty:
-            pass
+        if self._pending_batch is None:
+            try:
+                self._pending_batch = self.queue_batches.get(timeout=waiting_time)
+            except queue.Empty:
+                pass
 
-        if batch is not None:
+        ready = self._pending_batch is not None
+        if self._num_learners > 1:
+            ready, stop = data_parallel.agree(ready,
+                                              self.shutdown or self.shutdown_event.is_set())
+            if stop:
+                ready = False
+                self.shutdown = True
+                self._learners_stopped = True
+
+        if ready:
+            batch = self._pending_batch
+            self._pending_batch = None
             training_metrics = self._learn_from_batch(batch,
                                                       grad_norm_clipping=self._grad_norm_clipping,
                                                       pg_cost=self._pg_cost,
@@ -322,17 +497,17 @@ class Learner(RpcCallee):
             # delete Tensors after usage to free memory (see torch multiprocessing)
             del batch
 
-            with self.lock_model:
-                self.eval_model.load_state_dict(self.model.state_dict())
+            if self._publish_due():
+                self._publish_model()
 
-            self.recorder.log('training', training_metrics)
+            self.training_metrics = training_metrics
+            self.recorder.log('training', dict(training_metrics))
 
-        if self._checkpoint_interval > 0:
+        if ready and self._checkpoint_interval > 0:
             # mus split up to not divide by zero
             if self.training_epoch % self._checkpoint_interval == 0:
-                # 0 or 1
-                i = int(self.training_epoch %
-                        (2*self._checkpoint_interval) != 0)
+                # rolling index of checkpoint files
+                i = (self.training_epoch // self._checkpoint_interval) % self._num_checkpoints
                 self._save_checkpoint(self._model_path, i)
 
         # check if queues are dead
@@ -381,6 +556,12 @@ class Learner(RpcCallee):
         misc : `dict`
             Dict of keyword arguments. Primarily used for metrics in this application.
         """
+        # read frames sent through the frame ring, [1, batchsize, C, H, W]
+        if self.frame_ring is not None:
+            frame_slots = torch.cat(batch[0].pop('frame_slot'), dim=1)
+            batch[0]['frame'] = [self.frame_ring.read(torch.tensor(caller_ids),
+                                                      frame_slots).unsqueeze(0)]
+
         # concat tensors for each dict in a batch and move to own device
         for dictionary in batch:
             for key, value in dictionary.items():
@@ -399,11 +580,19 @@ class Learner(RpcCallee):
         start = time.time()
         with self.lock_model:
             inference_output, _ = self.eval_model(states)
+            published_steps = self._published_steps
+            policy_version = self.policy_version
         self.inference_time += time.time() - start
 
         # log model state at time of inference
         inference_output['training_steps'] = torch.zeros_like(
-            states['episode_return']).fill_(self.training_steps)
+            states['episode_return']).fill_(published_steps)
+        inference_output['policy_version'] = torch.zeros_like(
+            states['episode_return']).fill_(policy_version)
+
+        # V-trace only needs the log-probability of the sampled action
+        if self._store_action_log_probs_only:
+            del inference_output['policy_logits']
 
         self.inference_steps += states['frame'].shape[1]
         self.inference_epoch += 1
@@ -425,6 +614,29 @@ class Learner(RpcCallee):
 
         return results
 
+    def _publish_due(self) -> bool:
+        """Returns True, if the learning model shall be published to the inference model.
+        """
+        if self.training_epoch == self.policy_version:
+            return False
+        return ((self._publish_interval > 0 and
+                 self.training_epoch - self.policy_version >= self._publish_interval) or
+                (self._publish_interval_time > 0 and
+                 time.time() - self._t_last_publish >= self._publish_interval_time))
+
+    def _publish_model(self):
+        """Copies the weights of the learning model to :py:attr:`self.eval_model`.
+
+        Uses :py:class:`~.ModelSync` to copy all tensors inplace.
+        """
+        start = time.time()
+        with self.lock_model:
+            self.model_sync.copy()
+            self.policy_version = self.training_epoch
+            self._published_steps = self.training_steps
+        self._t_last_publish = time.time()
+        self.publish_time += self._t_last_publish - start
+
     def _queue_for_storing(self,
                            caller_id: str,
                            state: dict,
@@ -495,48 +707,312 @@ class Learner(RpcCallee):
         entropy_cost : `float`
             Cost/Multiplier for entropy regularization.
         """
+        lag_metrics = self._measure_policy_lag(batch)
+
+        start = time.time()
+        batch_length, losses = self._update(self.model,
+                                            self.optimizer,
+                                            self.scheduler,
+                                            batch,
+                                            world_size=self._num_learners,
+                                            grad_norm_clipping=grad_norm_clipping,
+                                            pg_cost=pg_cost,
+                                            baseline_cost=baseline_cost,
+                                            entropy_cost=entropy_cost,
+                                            discounting=self._discounting,
+                                            reward_clipping=self._reward_clipping,
+                                            vectorized_vtrace=self._vectorized_vtrace)
+        self.training_time += time.time() - start
+
+        # a batch of only dropped trajectories does not update the model
+        if batch_length > 0:
+            self.training_steps += batch_length
+            self.training_epoch += 1
+
+        return {"runtime": self.get_runtime(),
+                "training_time": self.training_time,
+                "training_epoch": self.training_epoch,
+                "training_steps": self.training_steps,
+                **losses,
+                **lag_metrics,
+                }
+
+    def _measure_policy_lag(self, batch: Dict[str, torch.Tensor]) -> Dict[str, float]:
+        """Measures the policy lag of each trajectory in :py:attr:`batch`
+        and returns its statistics.
+
+        The lag is counted from the oldest state of a trajectory,
+        in training epochs and in environment steps.
+        It is added to :py:attr:`self.policy_lag_histogram`.
+        If :py:attr:`self._max_policy_lag` is set,
+        loss weights of all trajectories are added to :py:attr:`batch`.
+
+        Parameters
+        ----------
+        batch : `dict`
+            Dict of stacked tensors of complete trajectories as returned by :py:meth:`_to_batch()`.
+        """
+        lag = self.training_epoch - batch['policy_version'].min(dim=0)[0]
+        lag_steps = self.training_steps - batch['training_steps'].min(dim=0)[0]
+
+        bins = torch.tensor(POLICY_LAG_BINS[1:], dtype=lag.dtype, device=lag.device)
+        self.policy_lag_histogram += torch.bincount(torch.bucketize(lag, bins, right=True),
+                                                    minlength=len(POLICY_LAG_BINS)).cpu()
+        self.recorder.aggregate('policy_lag', lag.cpu().numpy())
+
+        stale = 0
+        if self._max_policy_lag > 0:
+            batch['weight'] = self._policy_lag_weights(lag,
+                                                       self._max_policy_lag,
+                                                       self._policy_lag_mode)
+            stale = (lag > self._max_policy_lag).sum().item()
+
+        return {"policy_lag_mean": lag.mean().item(),
+                "policy_lag_max": lag.max().item(),
+                "policy_lag_steps_mean": lag_steps.mean().item(),
+                "stale_trajectories": stale,
+                }
+
+    @staticmethod
+    def _policy_lag_weights(lag: torch.Tensor,
+                            max_policy_lag: int,
+                            policy_lag_mode: str = 'drop') -> torch.Tensor:
+        """Returns the loss weights of trajectories with the given policy :py:attr:`lag`.
+
+        Trajectories within :py:attr:`max_policy_lag` have weight 1.
+
+        Parameters
+        ----------
+        lag : :py:class:`torch.Tensor`
+            The policy lag of each trajectory in training epochs.
+        max_policy_lag : `int`
+            Maximum policy lag in training epochs.
+        policy_lag_mode : `str`
+            ``'drop'`` weights stale trajectories with 0,
+            ``'weight'`` with :py:attr:`max_policy_lag` / :py:attr:`lag`.
+        """
+        if policy_lag_mode == 'drop':
+            return (lag <= max_policy_lag).float()
+        return torch.clamp(max_policy_lag / lag.float().clamp(min=1), max=1.)
+
+    @staticmethod
+    def _update(model: nn.Module,
+                optimizer: torch.optim.Optimizer,
+                scheduler: LambdaLR,
+                batch: Dict[str, torch.Tensor],
+                world_size: int = 1,
+                grad_norm_clipping: float = 40.,
+                pg_cost: float = 1.,
+                baseline_cost: float = 0.5,
+                entropy_cost: float = 0.01,
+                **loss_kwargs) -> Tuple[int, Dict[str, float]]:
+        """Performs a single update of :py:attr:`model` using the given :py:attr:`batch`.
+
+        If :py:attr:`world_size` is bigger 1, gradients are averaged across all
+        data-parallel learning processes before the update.
+
+        Returns the number of environment steps learned from (summed over all
+        learning processes) and a dictionary of loss values.
+        Trajectories with a loss weight of 0, as dropped for their policy lag, are not counted.
+        If no trajectory is left, neither :py:attr:`optimizer` nor :py:attr:`scheduler` step,
+        so that the learning rate schedule only advances on data that was learned from.
+
+        Parameters
+        ----------
+        model : :py:class:`torch.nn.Module`
+            The model to update.
+        optimizer : :py:class:`torch.optim.Optimizer`
+            The optimizer that links to :py:attr:`model`.
+        scheduler : :py:class:`torch.optim.lr_scheduler.LambdaLR`
+            The learning rate scheduler of :py:attr:`optimizer`.
+        batch : `dict`
+            Dict of stacked tensors of complete trajectories as returned by :py:meth:`_to_batch()`.
+        world_size : `int`
+            Total number of data-parallel learning processes.
+        grad_norm_clipping : `float`
+            If bigger 0, clips the computed gradient norm to given maximum value.
+        pg_cost : `float`
+            Cost/Multiplier for policy gradient loss.
+        baseline_cost : `float`
+            Cost/Multiplier for baseline loss.
+        entropy_cost : `float`
+            Cost/Multiplier for entropy regularization.
+        **loss_kwargs:
+            Keyword arguments for :py:meth:`compute_losses()`.
+        """
         # evaluate training batch
-        batch_length = batch['current_length'].sum().item()
-        learner_outputs, _ = self.model(batch)
+        lengths = batch['current_length'].view(-1)
+        if 'weight' in batch:
+            lengths = lengths * (batch['weight'].view(-1) > 0)
+        batch_length = lengths.sum().item()
+        learner_outputs, _ = model(batch, sample_action=False)
 
-        pg_loss, baseline_loss, entropy_loss = self.compute_losses(
-            batch,
-            learner_outputs,
-            discounting=self._discounting,
-            reward_clipping=self._reward_clipping
-        )
+        pg_loss, baseline_loss, entropy_loss = Learner.compute_losses(batch,
+                                                                      learner_outputs,
+                                                                      **loss_kwargs)
 
         total_loss = pg_cost * pg_loss \
             + baseline_cost * baseline_loss \
             + entropy_cost * entropy_loss
 
-        self.training_steps += batch_length
-        self.training_epoch += 1
-
         # perform update
-        self.optimizer.zero_grad()
+        optimizer.zero_grad()
         total_loss.backward()
-        if grad_norm_clipping > 0:
-            nn.utils.clip_grad_norm_(
-                self.model.parameters(), grad_norm_clipping)
-        self.optimizer.step()
-        self.scheduler.step()
-
-        return {"runtime": self.get_runtime(),
-                "training_time": self.training_time,
-                "training_epoch": self.training_epoch,
-                "training_steps": self.training_steps,
-                "total_loss": total_loss.detach().cpu().item(),
-                "pg_loss": pg_loss.detach().cpu().item(),
-                "baseline_loss": baseline_loss.detach().cpu().item(),
-                "entropy_loss": entropy_loss.detach().cpu().item(),
+        if world_size > 1:
+            batch_length = data_parallel.all_reduce_gradients(model.parameters(),
+                                                              world_size,
+                                                              batch_length)
+        # the summed length is equal in all learning processes, which skip together
+        if batch_length > 0:
+            if grad_norm_clipping > 0:
+                nn.utils.clip_grad_norm_(model.parameters(), grad_norm_clipping)
+            optimizer.step()
+            scheduler.step()
+
+        return batch_length, {"total_loss": total_loss.detach().cpu().item(),
+                              "pg_loss": pg_loss.detach().cpu().item(),
+                              "baseline_loss": baseline_loss.detach().cpu().item(),
+                              "entropy_loss": entropy_loss.detach().cpu().item(),
+                              }
+
+    def _get_update_kwargs(self) -> Dict[str, Any]:
+        """Returns the keyword arguments of :py:meth:`_update()` that are set on initialization.
+        """
+        return {"world_size": self._num_learners,
+                "grad_norm_clipping": self._grad_norm_clipping,
+                "pg_cost": self._pg_cost,
+                "baseline_cost": self._baseline_cost,
+                "entropy_cost": self._entropy_cost,
+                "discounting": self._discounting,
+                "reward_clipping": self._reward_clipping,
+                "vectorized_vtrace": self._vectorized_vtrace,
                 }
 
+    @staticmethod
+    def _build_scheduler(optimizer: torch.optim.Optimizer,
+                         steps_per_epoch: int,
+                         total_steps: int) -> LambdaLR:
+        """Returns a scheduler that decreases the learning rate linearly
+        until :py:attr:`total_steps` are reached.
+
+        Parameters
+        ----------
+        optimizer : :py:class:`torch.optim.Optimizer`
+            The optimizer whose learning rate shall be scheduled.
+        steps_per_epoch : `int`
+            The number of environment steps learned from in a single training epoch.
+        total_steps : `int`
+            Maximum number of environment steps to learn from.
+        """
+        return LambdaLR(optimizer, functools.partial(_linear_decay,
+                                                     steps_per_epoch=steps_per_epoch,
+                                                     total_steps=total_steps))
+
+    @staticmethod
+    def _learn_replica(rank: int,
+                       world_size: int,
+                       port: int,
+                       model: nn.Module,
+                       optimizer_class: type,
+                       optimizer_defaults: dict,
+                       optimizer_state_dict: dict,
+                       scheduler_state_dict: dict,
+                       steps_per_epoch: int,
+                       total_steps: int,
+                       in_queue: mp.Queue,
+                       shutdown_event: mp.Event,
+                       update_kwargs: dict,
+                       max_policy_lag: int = 0,
+                       policy_lag_mode: str = 'drop',
+                       waiting_time: float = 5):
+        """Trains a replica of the learning model as data-parallel learning process.
+
+        This joins the process group of all learning processes and receives the
+        model parameters of rank 0. Until any process asks for shutdown,
+        this method pulls batches from :py:attr:`in_queue` and performs synchronized updates
+        using :py:meth:`_update()`.
+
+        This usually runs as an asynchronous :py:obj:`multiprocessing.Process`.
+
+        Parameters
+        ----------
+        rank: `int`
+            Rank of this learning process, bigger 0.
+        world_size: `int`
+            Total number of learning processes.
+        port: `int`
+            The port used to initialize the process group.
+        model: :py:class:`torch.nn.Module`
+            A copy of the learning model.
+        optimizer_class: `type`
+            The class of the learning models optimizer.
+        optimizer_defaults: `dict`
+            Keyword arguments to create an optimizer of :py:attr:`optimizer_class`.
+        optimizer_state_dict: `dict`
+            The state of the learning models optimizer.
+        scheduler_state_dict: `dict`
+            The state of the learning models scheduler.
+        steps_per_epoch: `int`
+            The number of environment steps learned from in a single training epoch.
+        total_steps : `int`
+            Maximum number of environment steps to learn from.
+        in_queue: :py:obj:`multiprocessing.Queue`
+            A queue that delivers batches.
+        shutdown_event: :py:obj:`multiprocessing.Event`
+            An event that breaks this methods internal loop.
+        update_kwargs: `dict`
+            Keyword arguments for :py:meth:`_update()`.
+        max_policy_lag : `int`
+            Maximum policy lag of a trajectory in training epochs. Set to 0 for no bound.
+        policy_lag_mode : `str`
+            How trajectories beyond :py:attr:`max_policy_lag` are handled, see :py:class:`Learner`.
+        waiting_time: `float`
+            Seconds to wait on batches delivered by :py:attr:`in_queue`.
+        """
+        data_parallel.init_process_group(rank, world_size, port)
+        data_parallel.broadcast_parameters(model)
+
+        optimizer = optimizer_class(model.parameters(), **optimizer_defaults)
+        optimizer.load_state_dict(optimizer_state_dict)
+        scheduler = Learner._build_scheduler(optimizer, steps_per_epoch, total_steps)
+        with warnings.catch_warnings():
+            # see _load_checkpoint()
+            warnings.simplefilter("ignore", category=UserWarning)
+            scheduler.load_state_dict(scheduler_state_dict)
+
+        batch = None
+        while True:
+            if batch is None:
+                try:
+                    batch = in_queue.get(timeout=waiting_time)
+                except queue.Empty:
+                    pass
+
+            ready, stop = data_parallel.agree(batch is not None,
+                                              shutdown_event.is_set())
+            if stop:
+                break
+            if ready:
+                if max_policy_lag > 0:
+                    # the scheduler steps once per training epoch of all learning processes
+                    lag = scheduler.last_epoch - batch['policy_version'].min(dim=0)[0]
+                    batch['weight'] = Learner._policy_lag_weights(lag,
+                                                                  max_policy_lag,
+                                                                  policy_lag_mode)
+                Learner._update(model, optimizer, scheduler, batch, **update_kwargs)
+                # delete Tensors after usage to free memory (see torch multiprocessing)
+                del batch
+                batch = None
+
+        del batch
+        data_parallel.destroy_process_group()
+
     @staticmethod
     def compute_losses(batch: Dict[str, torch.Tensor],
                        learner_outputs: Dict[str, torch.Tensor],
                        discounting: float = 0.99,
-                       reward_clipping: bool = True
+                       reward_clipping: bool = True,
+                       vectorized_vtrace: bool = False
                        ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
         """Computes and returns the components of IMPALA loss.
 
@@ -544,6 +1020,7 @@ class Learner(RpcCallee):
 
         See Also
         --------
+        * The :py:mod:`.functional.impala` module.
         * The :py:mod:`.functional.loss` module.
         * The :py:mod:`.functional.vtrace` module.
 
@@ -551,20 +1028,25 @@ class Learner(RpcCallee):
         ----------
         batch : `dict`
             Dict of stacked tensors of complete trajectories as returned by :py:meth:`_to_batch()`.
+            May hold loss weights of each trajectory under the key ``'weight'``.
         learner_outputs : `dict`
             Dict with outputs generated during evaluation within training.
         discounting : `float`
             Reward discout factor, must be a positive smaller than 1.
         reward_clipping : `bool`
             If set, rewards are clamped between -1 and 1.
+        vectorized_vtrace : `bool`
+            If set, the V-trace recursion is computed vectorized instead of a python loop.
         """
         assert 0 < discounting <= 1.
 
         # Take final value function slice for bootstrapping.
         bootstrap_value = learner_outputs["baseline"][-1]
 
+        weights = batch.get("weight")
+
         # Move from obs[t] -> action[t] to action[t] -> obs[t].
-        batch = {key: tensor[1:] for key, tensor in batch.items()}
+        batch = {key: tensor[1:] for key, tensor in batch.items() if key != "weight"}
         learner_outputs = {key: tensor[:-1]
                            for key, tensor in learner_outputs.items()}
 
@@ -574,25 +1056,18 @@ class Learner(RpcCallee):
 
         discounts = (~batch["done"]).float() * discounting
 
-        vtrace_returns = vtrace.from_logits(behavior_policy_logits=batch["policy_logits"],
-                                            target_policy_logits=learner_outputs["policy_logits"],
-                                            values=learner_outputs["baseline"],
-                                            bootstrap_value=bootstrap_value,
-                                            actions=batch["action"],
-                                            rewards=batch["reward"],
-                                            discounts=discounts,)
-
-        pg_loss = loss.policy_gradient(learner_outputs["policy_logits"],
-                                       batch["action"],
-                                       vtrace_returns.pg_advantages)
+        losses = impala.losses_from_action_log_probs(
+            behavior_action_log_probs=batch["action_log_prob"],
+            target_policy_logits=learner_outputs["policy_logits"],
+            values=learner_outputs["baseline"],
+            bootstrap_value=bootstrap_value,
+            actions=batch["action"],
+            rewards=batch["reward"],
+            discounts=discounts,
+            vectorized=vectorized_vtrace,
+            weights=weights)
 
-        baseline_loss = F.mse_loss(learner_outputs["baseline"],
-                                   vtrace_returns.vs,
-                                   reduction='sum')
-
-        entropy_loss = loss.entropy(learner_outputs["policy_logits"])
-
-        return pg_loss, baseline_loss, entropy_loss
+        return losses.pg_loss, losses.baseline_loss, losses.entropy_loss
 
     @staticmethod
     def _prefetch(in_queue: mp.Queue,
@@ -680,17 +1155,37 @@ class Learner(RpcCallee):
             "trajectories_seen": self.recorder.trajectories_seen,
             "episodes_seen": self.recorder.episodes_seen,
             "mean_inference_latency": self.recorder.mean_latency,
+            "mean_actor_utilization": self.recorder.mean_metrics.get('actor_utilization', 0.),
+            "mean_actor_idle_time": self.recorder.mean_metrics.get('actor_idle_time', 0.),
+            "mean_env_steps_per_second": self.recorder.mean_metrics.get('env_steps_per_second', 0.),
+            # metrics are logged at episode ends, so this is the mean time of resets
+            "mean_reset_time": self.recorder.mean_metrics.get('reset_time', 0.),
+            "dropped_gif_frames": self.recorder.dropped_frames,
+            "dropped_log_values": self.recorder.dropped_log_values,
             "fetching_time": self.fetching_time,
+            "checkpoint_snapshot_time": self.checkpoint_snapshot_time,
+            "checkpoint_write_time": self.checkpoint_writer.write_time,
             "inference_time": self.inference_time,
             "inference_steps": self.inference_steps,
             "training_time": self.training_time,
             "training_steps": self.training_steps,
+            "publish_time": self.publish_time,
+            "policy_version": self.policy_version,
+            **self._get_policy_lag_histogram(),
             "queue_batches": self.queue_batches.qsize(),
             "queue_drops": self.queue_drops.qsize(),
             "queue_rpcs": len(self._pending_rpcs),
             "queue_storing": len(self.storing_deque),
         }
 
+    def _get_policy_lag_histogram(self) -> Dict[str, int]:
+        """Returns the counts of :py:attr:`self.policy_lag_histogram` by bin name.
+        """
+        names = ["policy_lag_%d_%d" % (low, high - 1)
+                 for low, high in zip(POLICY_LAG_BINS[:-1], POLICY_LAG_BINS[1:])]
+        names.append("policy_lag_%d_up" % POLICY_LAG_BINS[-1])
+        return dict(zip(names, self.policy_lag_histogram.tolist()))
+
     def _save_model(self,
                     path: str,
                     filename: str = 'final_model.pt'):
@@ -716,6 +1211,9 @@ class Learner(RpcCallee):
 
         The filename is fixed to ``checkpoint_i.pt``. ``i`` being an integer.
 
+        All state is copied to CPU memory on the calling thread.
+        Writing happens on the background thread of :py:attr:`self.checkpoint_writer`.
+
         Parameters
         ----------
         path: `str`
@@ -723,6 +1221,7 @@ class Learner(RpcCallee):
         i: `str`
             The filenames suffix. This is used to enable multiple consecutive checkpoints.
         """
+        start = time.time()
         with warnings.catch_warnings():
             # warning thrown on scheduler.state_dict(): optimizers state should be saved as well.
             # disable this warning because we do save the optimizers state
@@ -760,10 +1259,13 @@ class Learner(RpcCallee):
             **counters_dict
         }
 
-        os.makedirs(path, exist_ok=True)
-        save_path = os.path.join(path, 'checkpoint_%d.pt' % i)
+        snapshot = self.checkpoint_writer.snapshot(save_dict)
+        self.checkpoint_snapshot_time += time.time() - start
 
-        torch.save(save_dict, save_path)
+        self.checkpoint_writer.write(snapshot,
+                                     os.path.join(path, 'checkpoint_%d.pt' % i),
+                                     metadata={'training_epoch': self.training_epoch,
+                                               'training_steps': self.training_steps})
 
         if self._verbose:
             print('Made checkpoint after training epoch %d.' %
@@ -774,7 +1276,8 @@ class Learner(RpcCallee):
         """Loads the latest checkpoint from the given path.
         Data will be loaded directly into programs components.
 
-        The files 'checkpoint_0.pt' and 'checkpoint_1.pt' will be checked at the given path.
+        Only the checkpoint listed in the manifest written by :py:class:`~.CheckpointWriter`
+        is read. Without a manifest, all files 'checkpoint_i.pt' will be checked at the given path.
 
         Parameters
         ----------
@@ -782,25 +1285,19 @@ class Learner(RpcCallee):
             A valid path to a directory.
         """
         try:
-            checkpoint_0 = torch.load(os.path.join(path, 'checkpoint_0.pt'))
+            checkpoint = checkpoint_writer.load_latest(path)
+            filenames = []
         except FileNotFoundError:
-            checkpoint_0 = None
-        try:
-            checkpoint_1 = torch.load(os.path.join(path, 'checkpoint_1.pt'))
-        except FileNotFoundError:
-            checkpoint_1 = None
-
-        if (checkpoint_0 is not None
-                and (checkpoint_1 is None
-                     or checkpoint_0['training_epoch'] >= checkpoint_1['training_epoch'])):
-            checkpoint = checkpoint_0
-            del checkpoint_1
-        elif (checkpoint_1 is not None
-              and (checkpoint_0 is None
-                   or checkpoint_1['training_epoch'] > checkpoint_0['training_epoch'])):
-            checkpoint = checkpoint_1
-            del checkpoint_0
-        else:
+            checkpoint = None
+            filenames = glob.glob(os.path.join(path, 'checkpoint_*.pt'))
+
+        for filename in filenames:
+            candidate = torch.load(filename)
+            if checkpoint is None or candidate['training_epoch'] > checkpoint['training_epoch']:
+                checkpoint = candidate
+            del candidate
+
+        if checkpoint is None:
             raise FileNotFoundError('No checkpoints found!')
 
             # model
@@ -831,9 +1328,13 @@ class Learner(RpcCallee):
         self.training_steps = checkpoint['training_steps']
         self.training_epoch = checkpoint['training_epoch']
         self.inference_steps = checkpoint['inference_steps']
+        self.policy_version = self.training_epoch
+        self._published_steps = self.training_steps
 
     @staticmethod
-    def _build_placeholder_eval_obs(env_spawner: EnvSpawner) -> Dict[str, torch.Tensor]:
+    def _build_placeholder_eval_obs(env_spawner: EnvSpawner,
+                                    store_action_log_probs_only: bool = False
+                                    ) -> Dict[str, torch.Tensor]:
         """Returns a dictionary that mimics an evaluated observation with all values being 0.
 
         Parameters
@@ -841,13 +1342,19 @@ class Learner(RpcCallee):
         env_spawner: :py:class:`.EnvSpawner`
             An :py:class:`.EnvSpawner` that holds information about the environment,
             that can be spawned.
+        store_action_log_probs_only: `bool`
+            Set True, if the full policy logits are not stored
+            in addition to the log-probability of the sampled action.
         """
         placeholder_eval_obs = env_spawner.placeholder_obs
         placeholder_eval_obs['action'] = torch.zeros(1, 1)
+        placeholder_eval_obs['action_log_prob'] = torch.zeros(1, 1)
         placeholder_eval_obs['baseline'] = torch.zeros(1, 1)
-        placeholder_eval_obs['policy_logits'] = torch.zeros(
-            1, 1, env_spawner.env_info['action_space'].n)
+        if not store_action_log_probs_only:
+            placeholder_eval_obs['policy_logits'] = torch.zeros(
+                1, 1, env_spawner.env_info['action_space'].n)
         placeholder_eval_obs['training_steps'] = torch.zeros(1, 1)
+        placeholder_eval_obs['policy_version'] = torch.zeros(1, 1)
 
         return placeholder_eval_obs
 
@@ -883,8 +1390,19 @@ class Learner(RpcCallee):
         Overwrites and calls :py:meth:`~.RpcCallee._cleanup()`.
         """
         self._save_model(self._model_path)
+        self.checkpoint_writer.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
 
         self.runtime = self.get_runtime()
+
+        # release data-parallel learning processes waiting for the next training step
+        if self._num_learners > 1:
+            if not self._learners_stopped:
+                data_parallel.agree(False, True)
+            data_parallel.destroy_process_group()
+        del self._pending_batch
+
         self.queue_batches.close()
         self.queue_drops.close()
         self.trajectory_store.del_all()
@@ -894,8 +1412,7 @@ class Learner(RpcCallee):
 
         # write last buffers
         print("Write and empty log buffers.")
-        # pylint: disable=protected-access
-        self.recorder._logger.write_buffers()
+        self.recorder.close()
 
         print("Empty queues.")
         # Empty queues
@@ -908,7 +1425,9 @@ class Learner(RpcCallee):
 
         # Remove process to ensure freeing of resources.
         print("Join threads.")
-        for thread in [*self.prefetch_threads, *self.storing_threads]:
+        for thread in [*self.prefetch_threads,
+                       *self.storing_threads,
+                       *self.learning_processes]:
             try:
                 thread.join(timeout=waiting_time)
             except RuntimeError:
@@ -918,6 +1437,9 @@ class Learner(RpcCallee):
         self.queue_batches.join_thread()
         self.queue_drops.join_thread()
 
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+
         print("Empty CUDA cache.")
         torch.cuda.empty_cache()
 
@@ -955,3 +1477,11 @@ class Learner(RpcCallee):
 
             print("Mean inference latency:", str(
                 self.recorder.mean_latency), "seconds")
+
+
+def _linear_decay(epoch: int,
+                  steps_per_epoch: int,
+                  total_steps: int) -> float:
+    """Linear decreasing function for the learning rate scheduler of a :py:class:`Learner`.
+    """
+    return 1 - min(epoch * steps_per_epoch, total_steps) / total_steps
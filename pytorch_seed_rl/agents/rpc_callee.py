@@ -327,6 +327,11 @@ class RpcCallee():
         """
         self.shutdown = True
 
+    def get_callers_ready(self) -> int:
+        """Returns the number of spawned callers, that finished their initiation.
+        """
+        return sum(caller_rref.confirmed_by_owner() for caller_rref in self._caller_rrefs)
+
     def get_shutdown(self) -> bool:
         """Returns :py:attr:`self.shutdown`.
         """
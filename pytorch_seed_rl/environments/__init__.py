@@ -9,6 +9,8 @@ Exposed classes:
 
 Unexposed modules:
     * :py:mod:`~pytorch_seed_rl.environments.atari_wrappers`
+    * :py:mod:`~pytorch_seed_rl.environments.synthetic_env`
+    * :py:mod:`~pytorch_seed_rl.environments.vec_env`
 
 See Also
 --------
@@ -33,7 +33,10 @@ See Also
 `OpenAI Gym <https://gym.openai.com/>`__
 """
 
+import time
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 import cv2
 import gym
@@ -187,6 +190,46 @@ class AutoResetWrapper(gym.Wrapper):
         return observation
 
 
+class BackgroundResetEnv(gym.Wrapper):
+    """Resets a spare environment in the background and swaps it in, when an episode ends.
+
+    Only resets after a true game over are swapped, i.e. if the wrapped environment
+    has no attribute `was_real_done` or it is True.
+    Other resets, like the no-op step of :py:class:`EpisodicLifeEnv` after a lost life,
+    are done inline.
+
+    The background reset runs on a helper thread, while the caller waits for its next action.
+
+    Parameters
+    ----------
+    env_fn: `callable`
+        Function that returns a new instance of the environment to wrap.
+    """
+
+    def __init__(self, env_fn: Callable[[], gym.Env]):
+        super().__init__(env_fn())
+        self._spare = env_fn()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._spare_reset = self._executor.submit(self._spare.reset)
+
+    def reset(self, **kwargs):
+        if not getattr(self.env, 'was_real_done', True):
+            return self.env.reset(**kwargs)
+
+        obs = self._spare_reset.result()
+        self.env, self._spare = self._spare, self.env
+        self._spare_reset = self._executor.submit(self._spare.reset, **kwargs)
+        return obs
+
+    def step(self, action):
+        return self.env.step(action)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._spare.close()
+        self.env.close()
+
+
 class ClipRewardEnv(gym.RewardWrapper):
     """Clips rewards.
 
@@ -209,16 +252,28 @@ class DictObservationsEnv(gym.Wrapper):
 
     Adds :py:meth:`initial()` method, which returns the initial observation.
 
+    The time spent resetting during the last :py:meth:`step()` is kept in :py:attr:`self.reset_time`.
+
     Parameters
     ----------
     env: :py:obj:`gym.Env`
         An environment that will be wrapped.
+    inplace: `bool`
+        Set True, if :py:meth:`step()` shall update and return the same observation `dict`
+        with the same tensors on every step, instead of allocating new ones.
+        Observations must then be consumed, e.g. sent or copied, before the next step.
     """
 
-    def __init__(self, env):
+    def __init__(self, env, inplace: bool = False):
         gym.Wrapper.__init__(self, env)
         self.episode_return = None
         self.episode_step = None
+        self.reset_time = 0.
+
+        self._inplace = inplace
+        self._record = None
+        # episode metrics are zeroed in the next step, so the last step still returns them
+        self._new_episode = False
 
     def initial(self) -> dict:
         """Returns an initial observation.
@@ -243,16 +298,38 @@ class DictObservationsEnv(gym.Wrapper):
         except AttributeError:
             obs['real_done'] = torch.tensor(
                 self.initial_done, dtype=torch.bool).view(1, 1)
+
+        if self._inplace:
+            self.episode_return.zero_()
+            self.episode_step.zero_()
+            self._new_episode = False
+            self._record = obs
         return obs
 
     def step(self, action):
         frame, reward, done, unused_info = self.env.step(action.item())
+        return self.observe(action, frame, reward, done)
+
+    def observe(self, action, frame, reward: float, done: bool) -> dict:
+        """Returns the observation after the wrapped environment performed :py:attr:`action`
+        and returned :py:attr:`frame`, :py:attr:`reward` and :py:attr:`done`.
+        Resets, if :py:attr:`done`.
+
+        Called by :py:meth:`step()`. Allows to step the wrapped environment elsewhere,
+        e.g. in a batch of environments.
+        """
+        if self._inplace:
+            return self._observe_inplace(action, frame, reward, done)
+
         self.episode_step += 1
         self.episode_return += reward
         episode_step = self.episode_step
         episode_return = self.episode_return
+        self.reset_time = 0.
         if done:
+            start = time.time()
             frame = self.reset()
+            self.reset_time = time.time() - start
 
         # pylint: disable=not-callable
         reward = torch.tensor(reward).view(1, 1)
@@ -275,9 +352,37 @@ class DictObservationsEnv(gym.Wrapper):
 
         return obs
 
+    def _observe_inplace(self, action, frame, reward: float, done: bool) -> dict:
+        """Observes like :py:meth:`observe()`, but updates the tensors of the observation
+        returned by :py:meth:`initial()` inplace and returns it again.
+        """
+        if self._new_episode:
+            self.episode_return.zero_()
+            self.episode_step.zero_()
+            self._new_episode = False
+        self.episode_step += 1
+        self.episode_return += reward
+        self.reset_time = 0.
+        if done:
+            start = time.time()
+            frame = self.reset()
+            self.reset_time = time.time() - start
+
+        obs = self._record
+        obs['frame'] = frame
+        obs['reward'].fill_(reward)
+        obs['done'].fill_(done)
+        obs['last_action'] = action
+        obs['real_done'].fill_(getattr(self, 'was_real_done', done))
+
+        return obs
+
     def reset(self, **kwargs):
-        self.episode_return = torch.zeros(1, 1)
-        self.episode_step = torch.zeros(1, 1, dtype=torch.int32)
+        if self._inplace and self.episode_return is not None:
+            self._new_episode = True
+        else:
+            self.episode_return = torch.zeros(1, 1)
+            self.episode_step = torch.zeros(1, 1, dtype=torch.int32)
         return self.env.reset(**kwargs)
 
     def close(self):
@@ -397,6 +502,185 @@ class FrameStack(gym.Wrapper):
         return LazyFrames(list(self.frames))
 
 
+class FusedAtariEnv(gym.Wrapper):
+    """Applies the preprocessing of :py:func:`make_atari`, :py:func:`wrap_deepmind`
+    (with frame stacking, without reward clipping and scaling) and :py:func:`wrap_pytorch`
+    in a single wrapper.
+
+    Behaves like this chain of wrappers, but avoids a Python layer per wrapper
+    and all allocations of a step:
+
+        * Max pooling of the last two skipped frames writes into a reused buffer.
+        * Frames are warped into a preallocated ring of the last :py:attr:`k` frames.
+          Each frame is stored twice, so the stacked frames are a contiguous window of the ring.
+
+    Observations are views of the ring of shape [1, 1, k, height, width],
+    which are overwritten by later steps. Copy them, if they must be kept.
+
+    Parameters
+    ----------
+    env: :py:obj:`gym.Env`
+        An Atari environment that doesn't perform frameskip natively.
+    noop_max: `int`
+        The maximum number of no-ops on reset, as :py:class:`NoopResetEnv`.
+    skip: `int`
+        Every `skip`-th frame is returned, as :py:class:`MaxAndSkipEnv`.
+    k: `int`
+        Number of last frames to stack, as :py:class:`FrameStack`.
+    width: `int`
+        Target width of warped frames, as :py:class:`WarpFrame`.
+    height: `int`
+        Target height of warped frames, as :py:class:`WarpFrame`.
+    """
+
+    def __init__(self,
+                 env: gym.Env,
+                 noop_max: int = 30,
+                 skip: int = 4,
+                 k: int = 4,
+                 width: int = 84,
+                 height: int = 84):
+        gym.Wrapper.__init__(self, env)
+        if env.spec is not None:
+            assert 'NoFrameskip' in env.spec.id
+        action_meanings = env.unwrapped.get_action_meanings()
+        assert action_meanings[0] == 'NOOP'
+        self._fire_reset = 'FIRE' in action_meanings
+        if self._fire_reset:
+            assert action_meanings[1] == 'FIRE'
+            assert len(action_meanings) >= 3
+
+        self.noop_max = noop_max
+        self.override_num_noops = None
+        self.noop_action = 0
+        self.k = k
+        self._skip = skip
+        self._width = width
+        self._height = height
+
+        self.lives = 0
+        self.was_real_done = True
+
+        # BUFFERS
+        raw_shape = env.observation_space.shape
+        self._obs_buffer = np.zeros((2,) + raw_shape, dtype=np.uint8)
+        self._max_frame = np.zeros(raw_shape, dtype=np.uint8)
+        self._gray_frame = np.zeros(raw_shape[:2], dtype=np.uint8)
+
+        # frame i is stored at i and i + k, the last k frames end at self._head + k
+        self._frames = np.zeros((2 * k, height, width), dtype=np.uint8)
+        self._frames_torch = torch.from_numpy(self._frames)
+        self._head = 0
+
+        self.observation_space = spaces.Box(low=0, high=255,
+                                            shape=(k, height, width),
+                                            dtype=np.uint8)
+
+    def reset(self, **kwargs):
+        """Reset only when lives are exhausted, as :py:class:`EpisodicLifeEnv`.
+        """
+        if self.was_real_done:
+            self._push(self._fire_reset_env(**kwargs))
+            self._frames[:] = self._frames[self._head]
+        else:
+            # no-op step to advance from terminal/lost life state
+            self._push(self._max_and_skip(0)[0])
+        self.lives = self.env.unwrapped.ale.lives()
+        return self._observation()
+
+    def step(self, action):
+        obs, reward, done, info = self._max_and_skip(action)
+        self._push(obs)
+        return self._end_step(reward, done, info)
+
+    def _end_step(self, reward, done, info):
+        """Returns the result of a step, after the new frame has been pushed.
+        """
+        # make loss of life terminal, as EpisodicLifeEnv
+        self.was_real_done = done
+        lives = self.env.unwrapped.ale.lives()
+        if lives < self.lives and lives > 0:
+            done = True
+        self.lives = lives
+        return self._observation(), reward, done, info
+
+    def _noop_reset(self, **kwargs):
+        """Resets and does a random number of no-ops, as :py:class:`NoopResetEnv`.
+        """
+        self.env.reset(**kwargs)
+        if self.override_num_noops is not None:
+            noops = self.override_num_noops
+        else:
+            noops = self.unwrapped.np_random.randint(
+                1, self.noop_max + 1)  # pylint: disable=E1101
+        assert noops > 0
+        obs = None
+        for _ in range(noops):
+            obs, _, done, _ = self.env.step(self.noop_action)
+            if done:
+                obs = self.env.reset(**kwargs)
+        return obs
+
+    def _fire_reset_env(self, **kwargs):
+        """Resets and fires, if the game has to be started, as :py:class:`FireResetEnv`.
+        """
+        obs = self._noop_reset(**kwargs)
+        if not self._fire_reset:
+            return obs
+        obs, _, done, _ = self._max_and_skip(1)
+        if done:
+            self._noop_reset(**kwargs)
+        obs, _, done, _ = self._max_and_skip(2)
+        if done:
+            self._noop_reset(**kwargs)
+        return obs
+
+    def _max_and_skip(self, action, max_pool: bool = True):
+        """Repeats action, sums reward and max pools the last two frames,
+        as :py:class:`MaxAndSkipEnv`.
+
+        If :py:attr:`max_pool` is False, the last two frames are left in :py:attr:`self._obs_buffer`
+        and must be pooled into :py:attr:`self._max_frame` by the caller.
+        """
+        total_reward = 0.0
+        done = None
+        info = None
+        for i in range(self._skip):
+            obs, reward, done, info = self.env.step(action)
+            if i == self._skip - 2:
+                self._obs_buffer[0] = obs
+            if i == self._skip - 1:
+                self._obs_buffer[1] = obs
+            total_reward += reward
+            if done:
+                break
+        if max_pool:
+            np.maximum(self._obs_buffer[0], self._obs_buffer[1], out=self._max_frame)
+
+        return self._max_frame, total_reward, done, info
+
+    def _push(self, obs: np.ndarray):
+        """Warps :py:attr:`obs` into the next slot of the frame ring, as :py:class:`WarpFrame`.
+        """
+        cv2.cvtColor(obs, cv2.COLOR_RGB2GRAY, dst=self._gray_frame)
+        self._push_gray()
+
+    def _push_gray(self):
+        """Resizes :py:attr:`self._gray_frame` into the next slot of the frame ring.
+        """
+        self._head = (self._head + 1) % self.k
+        cv2.resize(self._gray_frame, (self._width, self._height),
+                   dst=self._frames[self._head], interpolation=cv2.INTER_AREA)
+        self._frames[self._head + self.k] = self._frames[self._head]
+
+    def _observation(self) -> torch.Tensor:
+        """Returns the last :py:attr:`self.k` frames as view of the frame ring.
+        """
+        start = self._head + 1
+        return self._frames_torch[start:start + self.k].view(
+            (1, 1) + self.observation_space.shape)  # (...) -> (T,B,...).
+
+
 class ImageToPyTorch(gym.ObservationWrapper):
     """Changes image shape to channels x weight x height
 
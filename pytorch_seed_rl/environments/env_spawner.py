@@ -15,11 +15,29 @@
 # pylint: disable=empty-docstring
 """
 """
-from typing import List
+import hashlib
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
 
 import gym
 
-from . import atari_wrappers
+from . import atari_wrappers, synthetic_env
+from .synthetic_env import SYNTHETIC_ENV_ID, SyntheticEnv
+from .vec_env import BatchedAtariVecEnv, SubprocVecEnv
+
+
+def _source_hash() -> str:
+    """Returns a hash of the sources of all modules that shape environment infos.
+    """
+    source_hash = hashlib.sha1()
+    for module in (atari_wrappers, synthetic_env):
+        with open(module.__file__, 'rb') as source_file:
+            source_hash.update(source_file.read())
+    with open(__file__, 'rb') as source_file:
+        source_hash.update(source_file.read())
+    return source_hash.hexdigest()
 
 
 class EnvSpawner():
@@ -31,9 +49,38 @@ class EnvSpawner():
     Parameters
     ----------
     env_id: `str`
-        The environments identifier as registered with :py:mod:`gym`.
+        The environments identifier as registered with :py:mod:`gym`,
+        or ``'Synthetic-v0'`` for a :py:class:`~.synthetic_env.SyntheticEnv`.
     num_envs: `int`
         The number of environments :py:meth:`spawn()` returns.
+    subprocess_envs: `bool`
+        Set True, if :py:meth:`spawn()` shall return a :py:class:`~.vec_env.SubprocVecEnv`
+        that steps all environments in parallel worker processes.
+    fused_preprocessing: `bool`
+        Set True, if the Atari preprocessing shall be applied by the single
+        :py:class:`~.atari_wrappers.FusedAtariEnv` instead of a chain of wrappers.
+    inplace_observations: `bool`
+        Set True, if each environment shall update its observation inplace on every step,
+        see :py:class:`~.atari_wrappers.DictObservationsEnv`.
+    background_resets: `bool`
+        Set True, if each environment shall keep a spare instance that is reset in the background
+        and swapped in at the end of an episode, see :py:class:`~.atari_wrappers.BackgroundResetEnv`.
+    batched_preprocessing: `bool`
+        Set True, if :py:meth:`spawn()` shall return a :py:class:`~.vec_env.BatchedAtariVecEnv`
+        that warps the frames of all environments in batches.
+        Requires :py:attr:`fused_preprocessing`.
+    warp_threads: `int`
+        Number of threads that resize frames, if :py:attr:`batched_preprocessing` is set.
+    synthetic_config: `dict`
+        Keyword arguments of :py:class:`~.synthetic_env.SyntheticEnv`,
+        if :py:attr:`env_id` is ``'Synthetic-v0'``.
+    spawn_threads: `int`
+        Number of threads that construct environments in parallel on :py:meth:`spawn()`.
+    cache_dir: `str`
+        Directory where infos about the spawned environments are cached,
+        keyed by :py:attr:`env_id`, the preprocessing configuration
+        and the sources of the environment wrappers.
+        Infos are generated by spawning an environment, if not cached or not given.
 
     Attributes
     ----------
@@ -42,20 +89,53 @@ class EnvSpawner():
     self.placeholder_obs: `dict`
         A dictionary with the same structure as observations return by
         the spawned environments :py:meth:`~gym.Env.step()` method.
+    self.env_info_cached: `bool`
+        True, if infos were loaded from :py:attr:`cache_dir`.
     """
 
     def __init__(self,
                  env_id: str,
-                 num_envs: int = 1):
+                 num_envs: int = 1,
+                 subprocess_envs: bool = False,
+                 fused_preprocessing: bool = False,
+                 inplace_observations: bool = False,
+                 background_resets: bool = False,
+                 batched_preprocessing: bool = False,
+                 warp_threads: int = 1,
+                 synthetic_config: dict = None,
+                 spawn_threads: int = 1,
+                 cache_dir: str = None):
+        assert spawn_threads > 0
+        assert not batched_preprocessing or fused_preprocessing
+        assert not batched_preprocessing or not (subprocess_envs or background_resets)
+        assert env_id != SYNTHETIC_ENV_ID or not batched_preprocessing
 
         # ATTRIBUTES
         self.env_id = env_id
         self.num_envs = num_envs
-        self._generate_env_info()
+        self.subprocess_envs = subprocess_envs
+        self.fused_preprocessing = fused_preprocessing
+        self.inplace_observations = inplace_observations
+        self.background_resets = background_resets
+        self.batched_preprocessing = batched_preprocessing
+        self.warp_threads = warp_threads
+        self.synthetic_config = synthetic_config or {}
+        self.spawn_threads = spawn_threads
+
+        self.env_info_cached = cache_dir is not None and self._load_env_info(cache_dir)
+        if not self.env_info_cached:
+            self._generate_env_info()
+            if cache_dir is not None:
+                self._save_env_info(cache_dir)
 
-    def spawn(self) -> List[gym.Env]:
+    def spawn(self, subprocess_envs: bool = None) -> Union[List[gym.Env],
+                                                           SubprocVecEnv,
+                                                           BatchedAtariVecEnv]:
         """Returns a list of wrapped environments (using OpenAI's :py:mod:`gym`).
 
+        If :py:attr:`subprocess_envs` is set, the environments are returned as
+        :py:class:`~.vec_env.SubprocVecEnv` instead.
+
         Applies:
             * :py:class:`~.atari_wrappers.ClipRewardEnv`
             * :py:class:`~.atari_wrappers.DictObservationsEnv`
@@ -67,22 +147,74 @@ class EnvSpawner():
             * :py:class:`~.atari_wrappers.NoopResetEnv`
               (`noop_max` = 30)
             * :py:class:`~.atari_wrappers.WarpFrame`
+
+        If :py:attr:`fused_preprocessing` is set, all wrappers but
+        :py:class:`~.atari_wrappers.DictObservationsEnv` are replaced by
+        :py:class:`~.atari_wrappers.FusedAtariEnv`.
+
+        If :py:attr:`background_resets` is set,
+        :py:class:`~.atari_wrappers.BackgroundResetEnv` is applied
+        below :py:class:`~.atari_wrappers.DictObservationsEnv`.
+
+        If :py:attr:`batched_preprocessing` is set, the environments are returned as
+        :py:class:`~.vec_env.BatchedAtariVecEnv`, unless :py:attr:`subprocess_envs` is given.
+
+        Parameters
+        ----------
+        subprocess_envs: `bool`
+            Overrides the setting given on initiation, if not None.
+        """
+        if subprocess_envs is None:
+            subprocess_envs = self.subprocess_envs
+            batched_preprocessing = self.batched_preprocessing
+        else:
+            batched_preprocessing = False
+
+        if subprocess_envs:
+            return SubprocVecEnv([self._make_env] * self.num_envs,
+                                 self.env_info['observation_space'].shape)
+        if self.spawn_threads > 1:
+            # construction of emulators releases the GIL for the most part
+            with ThreadPoolExecutor(min(self.spawn_threads, self.num_envs)) as pool:
+                envs = [pool.submit(self._make_env) for _ in range(self.num_envs)]
+                envs = [env.result() for env in envs]
+        else:
+            envs = [self._make_env() for _ in range(self.num_envs)]
+        if batched_preprocessing:
+            return BatchedAtariVecEnv(envs, self.warp_threads)
+        return envs
+
+    def _make_env(self) -> gym.Env:
+        """Returns a single wrapped environment.
         """
-        return [atari_wrappers.DictObservationsEnv(
-            atari_wrappers.wrap_pytorch(
-                atari_wrappers.wrap_deepmind(
-                    atari_wrappers.make_atari(self.env_id),
-                    clip_rewards=False,
-                    frame_stack=True,
-                    scale=False,
-                )
+        if self.background_resets:
+            env = atari_wrappers.BackgroundResetEnv(self._make_preprocessed_env)
+        else:
+            env = self._make_preprocessed_env()
+        return atari_wrappers.DictObservationsEnv(env, inplace=self.inplace_observations)
+
+    def _make_preprocessed_env(self) -> gym.Env:
+        """Returns a single environment with Atari preprocessing applied.
+
+        A synthetic environment emits preprocessed frames itself.
+        """
+        if self.env_id == SYNTHETIC_ENV_ID:
+            return SyntheticEnv(**self.synthetic_config)
+        if self.fused_preprocessing:
+            return atari_wrappers.FusedAtariEnv(gym.make(self.env_id))
+        return atari_wrappers.wrap_pytorch(
+            atari_wrappers.wrap_deepmind(
+                atari_wrappers.make_atari(self.env_id),
+                clip_rewards=False,
+                frame_stack=True,
+                scale=False,
             )
-        ) for _ in range(self.num_envs)]
+        )
 
     def _generate_env_info(self):
         """Spawns environment once to save properties for later reference by learner and model
         """
-        placeholder_env = self.spawn()[0]
+        placeholder_env = self._make_env()
 
         self.env_info = {
             "env_id": self.env_id,
@@ -97,3 +229,49 @@ class EnvSpawner():
 
         placeholder_env.close()
         del placeholder_env
+
+    def _cache_path(self, cache_dir: str) -> str:
+        """Returns the path of the cached infos within :py:attr:`cache_dir`.
+
+        The file name is a hash of all settings that affect the infos
+        and of the sources of the modules that create them,
+        so that infos cached by older code are not reused.
+        The number of environments and settings that only affect speed are excluded.
+        """
+        config = {'env_id': self.env_id,
+                  'fused_preprocessing': self.fused_preprocessing,
+                  'synthetic_config': (sorted(self.synthetic_config.items())
+                                       if self.env_id == SYNTHETIC_ENV_ID else None),
+                  'gym_version': gym.__version__,
+                  'source_hash': _source_hash()}
+        key = hashlib.sha1(repr(sorted(config.items())).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cache_dir, 'env_info_%s.pkl' % key)
+
+    def _load_env_info(self, cache_dir: str) -> bool:
+        """Loads infos cached by :py:meth:`_save_env_info()`.
+
+        Returns True on success, False if there are no readable cached infos.
+        """
+        try:
+            with open(self._cache_path(cache_dir), 'rb') as cache_file:
+                cached = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return False
+
+        self.env_info = {**cached['env_info'], 'num_envs': self.num_envs}
+        self.placeholder_obs = cached['placeholder_obs']
+        return True
+
+    def _save_env_info(self, cache_dir: str):
+        """Caches :py:attr:`self.env_info` and :py:attr:`self.placeholder_obs`
+        in :py:attr:`cache_dir`.
+        """
+        path = self._cache_path(cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # write to a temporary file first, concurrent runs must not read a partial file
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as cache_file:
+            pickle.dump({'env_info': self.env_info,
+                         'placeholder_obs': self.placeholder_obs}, cache_file)
+        os.replace(tmp_path, path)
@@ -0,0 +1,125 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Synthetic environment that allows to benchmark the pipeline without emulators.
+"""
+import time
+from typing import Tuple
+
+import gym
+import numpy as np
+import torch
+from gym.envs.registration import EnvSpec
+
+SYNTHETIC_ENV_ID = 'Synthetic-v0'
+
+
+class SyntheticEnv(gym.Env):
+    """Environment that emits random frames at a configurable cost.
+
+    Observations are preprocessed like those of the wrapped Atari environments,
+    i.e. uint8 tensors of shape [1, 1, C, H, W],
+    and can be wrapped by :py:class:`~.atari_wrappers.DictObservationsEnv`.
+    Frames are drawn from a small pool of random frames created once.
+
+    Parameters
+    ----------
+    frame_shape: `tuple`
+        Shape [C, H, W] of frames.
+    num_actions: `int`
+        Number of discrete actions.
+    min_episode_length: `int`
+        Minimum number of steps of an episode.
+    max_episode_length: `int`
+        Maximum number of steps of an episode.
+        Episode lengths are drawn uniformly from [min_episode_length, max_episode_length].
+    step_time: `float`
+        Simulated cost of a step in seconds.
+    busy_wait: `bool`
+        Set True, if the step cost shall be simulated by a busy loop
+        that occupies a CPU core, like an emulator. Sleeps otherwise.
+    reward_probability: `float`
+        Probability of a reward of 1 on each step.
+    num_frames: `int`
+        Number of frames in the pool of random frames.
+    seed: `int`
+        Seed of the random number generator.
+    """
+    metadata = {'render.modes': []}
+
+    def __init__(self,
+                 frame_shape: Tuple[int, ...] = (4, 84, 84),
+                 num_actions: int = 6,
+                 min_episode_length: int = 500,
+                 max_episode_length: int = 1500,
+                 step_time: float = 0.,
+                 busy_wait: bool = False,
+                 reward_probability: float = 0.05,
+                 num_frames: int = 16,
+                 seed: int = None):
+        assert 0 < min_episode_length <= max_episode_length
+
+        self.action_space = gym.spaces.Discrete(num_actions)
+        self.observation_space = gym.spaces.Box(low=0, high=255,
+                                                shape=tuple(frame_shape),
+                                                dtype=np.uint8)
+        self.reward_range = (0, 1)
+        self.spec = EnvSpec(SYNTHETIC_ENV_ID, max_episode_steps=max_episode_length)
+
+        self._min_episode_length = min_episode_length
+        self._max_episode_length = max_episode_length
+        self._step_time = step_time
+        self._busy_wait = busy_wait
+        self._reward_probability = reward_probability
+
+        self._rng = np.random.RandomState(seed)
+        self._frames = torch.from_numpy(
+            self._rng.randint(0, 256, (num_frames, 1, 1) + tuple(frame_shape), dtype=np.uint8))
+
+        self._step = 0
+        self._episode_length = 0
+        # every episode end is a game over, as reported by EpisodicLifeEnv
+        self.was_real_done = True
+
+    def reset(self, **kwargs):  # pylint: disable=arguments-differ
+        self._step = 0
+        self._episode_length = self._rng.randint(self._min_episode_length,
+                                                 self._max_episode_length + 1)
+        return self._frame()
+
+    def step(self, action):
+        assert self.action_space.contains(action)
+        self._simulate_cost()
+
+        self._step += 1
+        reward = float(self._rng.rand() < self._reward_probability)
+        done = self._step >= self._episode_length
+        self.was_real_done = done
+        return self._frame(), reward, done, {}
+
+    def _frame(self) -> torch.Tensor:
+        """Returns a frame of the pool, a view of shape [1, 1, C, H, W].
+        """
+        return self._frames[self._step % len(self._frames)]
+
+    def _simulate_cost(self):
+        """Spends :py:attr:`self._step_time` seconds sleeping or in a busy loop.
+        """
+        if self._step_time <= 0:
+            return
+        if not self._busy_wait:
+            time.sleep(self._step_time)
+            return
+        end = time.perf_counter() + self._step_time
+        while time.perf_counter() < end:
+            pass
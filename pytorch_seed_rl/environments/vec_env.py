@@ -0,0 +1,319 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Vectorized environments that step in parallel worker processes
+or share their preprocessing.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import gym
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from .atari_wrappers import FusedAtariEnv
+
+
+class SubprocVecEnv():
+    """Runs each of a list of environments in its own worker process.
+
+    Environments must be wrapped with :py:class:`~.atari_wrappers.DictObservationsEnv`.
+    Frames are written by the workers into a preallocated shared memory buffer
+    :py:attr:`self.frames` of shape [num_envs, C, H, W],
+    all other values of an observation are sent through a pipe.
+
+    Observations returned by :py:meth:`initial()` and :py:meth:`step_wait()`
+    hold frames as views of :py:attr:`self.frames`.
+    These are overwritten by the next step of the same environment.
+    The time each environment spent resetting during its last step is kept in
+    :py:attr:`self.reset_times`.
+
+    Parameters
+    ----------
+    env_fns: `list` of `callable`
+        Functions that each return a wrapped environment.
+        Must be picklable, if processes are started with the ``'spawn'`` method.
+    frame_shape: `tuple`
+        Shape [C, H, W] of frames returned by the environments.
+    """
+
+    def __init__(self,
+                 env_fns: List[Callable],
+                 frame_shape: Tuple[int, ...]):
+        self.num_envs = len(env_fns)
+        self.frames = torch.zeros((self.num_envs,) + tuple(frame_shape),
+                                  dtype=torch.uint8).share_memory_()
+        self.reset_times = [0.] * self.num_envs
+
+        self._waiting = []
+        self._remotes, work_remotes = zip(*[mp.Pipe() for _ in range(self.num_envs)])
+        self._processes = [mp.Process(target=self._work,
+                                      args=(work_remote, env_fn, self.frames, i),
+                                      daemon=True,
+                                      name='env_worker_%d' % i)
+                           for i, (work_remote, env_fn) in enumerate(zip(work_remotes, env_fns))]
+
+        for process in self._processes:
+            process.start()
+        for work_remote in work_remotes:
+            work_remote.close()
+
+    def __len__(self) -> int:
+        return self.num_envs
+
+    @staticmethod
+    def _work(remote,
+              env_fn: Callable,
+              frames: torch.Tensor,
+              i: int):
+        """Steps a single environment on command.
+
+        Intended for use as :py:obj:`multiprocessing.Process`.
+
+        Parameters
+        ----------
+        remote: :py:obj:`multiprocessing.Connection`
+            The workers end of the pipe to the :py:class:`SubprocVecEnv`.
+        env_fn: `callable`
+            Function that returns a wrapped environment.
+        frames: :py:obj:`torch.Tensor`
+            The shared frame buffer.
+        i: `int`
+            The index of this environment.
+        """
+        torch.set_num_threads(1)
+        env = env_fn()
+        try:
+            while True:
+                cmd, data = remote.recv()
+                if cmd == 'step':
+                    obs = env.step(torch.from_numpy(data))
+                elif cmd == 'initial':
+                    obs = env.initial()
+                else:
+                    break
+                frames[i].copy_(obs.pop('frame').view(frames[i].shape))
+                remote.send((_to_numpy(obs), getattr(env, 'reset_time', 0.)))
+        except (KeyboardInterrupt, EOFError):
+            pass
+        finally:
+            env.close()
+            remote.close()
+
+    def _receive(self, i: int) -> Dict[str, torch.Tensor]:
+        """Receives the observation of environment :py:attr:`i`.
+        """
+        obs, self.reset_times[i] = self._remotes[i].recv()
+        obs = _to_torch(obs)
+        obs['frame'] = self.frames[i].view((1, 1) + self.frames.shape[1:])
+        return obs
+
+    def initial(self) -> List[dict]:
+        """Returns the initial observations of all environments.
+        """
+        for remote in self._remotes:
+            remote.send(('initial', None))
+        return [self._receive(i) for i in range(self.num_envs)]
+
+    def step_async(self, i: int, action: torch.Tensor):
+        """Lets environment :py:attr:`i` perform :py:attr:`action` without waiting for the result.
+
+        Parameters
+        ----------
+        i: `int`
+            The index of the environment.
+        action: :py:obj:`torch.Tensor`
+            The action to perform.
+        """
+        self._remotes[i].send(('step', action.numpy()))
+        self._waiting.append(i)
+
+    def step_wait(self) -> Dict[int, dict]:
+        """Waits for all environments stepped by :py:meth:`step_async()`.
+
+        Returns their observations by environment index.
+        """
+        results = {i: self._receive(i) for i in self._waiting}
+        self._waiting = []
+        return results
+
+    def step(self, actions: List[torch.Tensor]) -> List[dict]:
+        """Steps all environments in parallel and returns their observations.
+
+        Parameters
+        ----------
+        actions: `list` of :py:obj:`torch.Tensor`
+            An action for each environment.
+        """
+        for i, action in enumerate(actions):
+            self.step_async(i, action)
+        results = self.step_wait()
+        return [results[i] for i in range(self.num_envs)]
+
+    def close(self):
+        """Closes all environments and joins their worker processes.
+        """
+        try:
+            self.step_wait()
+        except EOFError:  # worker died
+            pass
+        for remote in self._remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+
+
+class BatchedAtariVecEnv():  # pylint: disable=protected-access
+    """Steps a list of environments in process and warps their frames in batches.
+
+    Environments must be :py:class:`~.atari_wrappers.FusedAtariEnv`
+    wrapped with :py:class:`~.atari_wrappers.DictObservationsEnv`.
+    Their raw frame buffers are replaced by views of shared batched buffers,
+    so that the frames of all environments stepped by :py:meth:`step_async()`
+    are max pooled and converted to grayscale by one call each.
+    Resizing is done per frame, optionally by a pool of :py:attr:`num_threads` threads.
+    Results equal those of stepping each environment on its own.
+
+    Exposes the interface of :py:class:`SubprocVecEnv`.
+
+    Parameters
+    ----------
+    envs: `list` of :py:class:`~.atari_wrappers.DictObservationsEnv`
+        Wrapped environments with identical raw frame shapes.
+    num_threads: `int`
+        Number of threads that resize frames. Resizes in the calling thread, if 1.
+    """
+
+    def __init__(self,
+                 envs: List[gym.Env],
+                 num_threads: int = 1):
+        assert num_threads > 0
+        self.envs = envs
+        self.num_envs = len(envs)
+
+        self._fused = [env.env for env in envs]
+        assert all(isinstance(env, FusedAtariEnv) for env in self._fused)
+
+        raw_shape = self._fused[0].env.observation_space.shape
+        self._obs_buffers = np.zeros((self.num_envs, 2) + raw_shape, dtype=np.uint8)
+        self._max_frames = np.zeros((self.num_envs,) + raw_shape, dtype=np.uint8)
+        self._gray_frames = np.zeros((self.num_envs,) + raw_shape[:2], dtype=np.uint8)
+        for i, env in enumerate(self._fused):
+            assert env.env.observation_space.shape == raw_shape
+            env._obs_buffer = self._obs_buffers[i]
+            env._max_frame = self._max_frames[i]
+            env._gray_frame = self._gray_frames[i]
+
+        self._pool = ThreadPoolExecutor(num_threads) if num_threads > 1 else None
+        self._waiting = {}
+
+    def __len__(self) -> int:
+        return self.num_envs
+
+    @property
+    def reset_times(self) -> List[float]:
+        """The time each environment spent resetting during its last step.
+        """
+        return [env.reset_time for env in self.envs]
+
+    def initial(self) -> List[dict]:
+        """Returns the initial observations of all environments.
+        """
+        return [env.initial() for env in self.envs]
+
+    def step_async(self, i: int, action: torch.Tensor):
+        """Schedules environment :py:attr:`i` to perform :py:attr:`action`
+        on the next call of :py:meth:`step_wait()`.
+
+        Parameters
+        ----------
+        i: `int`
+            The index of the environment.
+        action: :py:obj:`torch.Tensor`
+            The action to perform.
+        """
+        self._waiting[i] = action
+
+    def step_wait(self) -> Dict[int, dict]:
+        """Steps all environments scheduled by :py:meth:`step_async()`.
+
+        Returns their observations by environment index.
+        """
+        waiting, self._waiting = self._waiting, {}
+        if not waiting:
+            return {}
+
+        results = {i: self._fused[i]._max_and_skip(action.item(), max_pool=False)
+                   for i, action in waiting.items()}
+
+        # preprocess the smallest range of environments that covers all stepped ones,
+        # frames of environments in between are only recomputed from their own buffers
+        low, high = min(waiting), max(waiting) + 1
+        np.maximum(self._obs_buffers[low:high, 0], self._obs_buffers[low:high, 1],
+                   out=self._max_frames[low:high])
+        width = self._max_frames.shape[2]
+        # a single tall image, as the conversion is per pixel
+        cv2.cvtColor(self._max_frames[low:high].reshape(-1, width, 3), cv2.COLOR_RGB2GRAY,
+                     dst=self._gray_frames[low:high].reshape(-1, width))
+
+        if self._pool is None:
+            for i in waiting:
+                self._fused[i]._push_gray()
+        else:
+            list(self._pool.map(lambda i: self._fused[i]._push_gray(), waiting))
+
+        observations = {}
+        for i, action in waiting.items():
+            _, reward, done, info = results[i]
+            frame, reward, done, _ = self._fused[i]._end_step(reward, done, info)
+            observations[i] = self.envs[i].observe(action, frame, reward, done)
+        return observations
+
+    def step(self, actions: List[torch.Tensor]) -> List[dict]:
+        """Steps all environments and returns their observations.
+
+        Parameters
+        ----------
+        actions: `list` of :py:obj:`torch.Tensor`
+            An action for each environment.
+        """
+        for i, action in enumerate(actions):
+            self.step_async(i, action)
+        results = self.step_wait()
+        return [results[i] for i in range(self.num_envs)]
+
+    def close(self):
+        """Closes all environments and the thread pool.
+        """
+        self._waiting = {}
+        if self._pool is not None:
+            self._pool.shutdown()
+        for env in self.envs:
+            env.close()
+
+
+def _to_numpy(obs: dict) -> dict:
+    """Converts tensors to numpy arrays, which are pickled by value.
+    """
+    return {k: v.numpy() if isinstance(v, torch.Tensor) else v for k, v in obs.items()}
+
+
+def _to_torch(obs: dict) -> dict:
+    """Converts numpy arrays back to tensors.
+    """
+    return {k: torch.from_numpy(v) if isinstance(v, np.ndarray) else v for k, v in obs.items()}
@@ -16,12 +16,17 @@
 """
 """
 import argparse
+import json
+import math
 import os
+import statistics
+import time
+from typing import Dict, List, Union
 
-import gym
 import torch
 
 from .environments import EnvSpawner
+from .environments.vec_env import BatchedAtariVecEnv, SubprocVecEnv
 from .nets import AtariNet
 from .tools import Recorder
 
@@ -31,23 +36,32 @@ PARSER = argparse.ArgumentParser(description="PyTorch_SEED_RL")
 PARSER.add_argument("name", default="",
                     help="Experiments name, defaults to environment id.")
 PARSER.add_argument('-v', '--verbose',
-                    help='Prints system metrics to command line.' +
-                    'Set --print_interval for number of training epochs between prints.',
+                    help='Prints the return of each episode to command line.',
                     action='store_true')
-PARSER.add_argument("--total_steps", default=2000, type=int,
-                    help="Total environment steps.")
+PARSER.add_argument("--num_episodes", default=100, type=int,
+                    help="Number of episodes to evaluate.")
+PARSER.add_argument("--total_steps", default=0, type=int,
+                    help="Maximum number of environment steps. Set to 0 for no limit.")
+PARSER.add_argument("--num_envs", default=8, type=int,
+                    help="Number of environments that are evaluated concurrently.")
+PARSER.add_argument("--subprocess_envs", action="store_true",
+                    help="Steps the environments in parallel worker processes.")
+PARSER.add_argument("--fused_preprocessing", action="store_true",
+                    help="Applies the Atari preprocessing in a single fused wrapper.")
+PARSER.add_argument("--batched_preprocessing", action="store_true",
+                    help="Warps the frames of all environments in a single batched call. " +
+                    "Requires fused preprocessing and excludes subprocess environments.")
+PARSER.add_argument("--confidence", default=0.95, type=float,
+                    help="Confidence level of the reported interval of the mean return.")
 PARSER.add_argument("--env", type=str, default="BreakoutNoFrameskip-v4",
                     help="Gym environment.")
-PARSER.add_argument('--print_interval', default=10, type=int,
-                    help='Number of training epochs between prints.')
 PARSER.add_argument("--savedir", default=os.path.join(os.environ.get("HOME"),
                                                       'logs',
                                                       'pytorch_seed_rl'),
                     type=str, help="Root dir where experiment data will be saved.")
 PARSER.add_argument('--render',
                     action='store_true',
-                    help="Renders an episode as gif, " +
-                    " if the recorded data finished with a new point record.")
+                    help="Renders the episodes of the first environment as gif.")
 PARSER.add_argument('--max_gif_length', default=0, type=int,
                     help="Enforces a maximum gif length." +
                     "Rendering is triggered, if recorded data reaches this volume.")
@@ -77,9 +91,13 @@ def main(flags):
 
     flags.eval_path = os.path.join(flags.full_path, 'eval')
 
-    # create and wrap environment
-    env_spawner = EnvSpawner(flags.env, 1)
-    env = env_spawner.spawn()[0]
+    # create and wrap environments
+    env_spawner = EnvSpawner(flags.env,
+                             min(flags.num_envs, flags.num_episodes),
+                             subprocess_envs=flags.subprocess_envs,
+                             fused_preprocessing=flags.fused_preprocessing,
+                             batched_preprocessing=flags.batched_preprocessing)
+    envs = env_spawner.spawn()
 
     # model
     model = AtariNet(
@@ -88,20 +106,40 @@ def main(flags):
     )
 
     model.load_state_dict(torch.load(flags.model_path))
+    model.fold_input_scale()
     model.eval()
 
     recorder = Recorder(save_path=flags.eval_path,
                         render=flags.render,
                         max_gif_length=flags.max_gif_length)
 
-    _interaction_loop(flags, model, env, recorder)
+    start = time.time()
+    try:
+        returns, steps = _interaction_loop(flags, model, envs, recorder)
+    finally:
+        _close(envs)
+        recorder.close()
+    duration = time.time() - start
+
+    summary = {**_return_statistics(returns, flags.confidence),
+               'steps': steps,
+               'steps_per_second': steps / max(duration, 1e-9)}
+    print(json.dumps(summary, indent=4))
+    with open(os.path.join(flags.eval_path, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=4)
 
 
 def _interaction_loop(flags,
                       model: torch.nn.Module,
-                      env: gym.Env,
-                      recorder: Recorder):
-    """Starts interaction loop
+                      envs: Union[List, SubprocVecEnv, BatchedAtariVecEnv],
+                      recorder: Recorder) -> (List[float], int):
+    """Steps all environments with actions of batched inference,
+    until :py:attr:`flags.num_episodes` episodes are finished.
+
+    Returns the returns of all episodes and the number of environment steps.
+
+    Each environment starts a new episode, only while fewer episodes than wanted were started,
+    so that short episodes are not overrepresented in the result.
 
     Parameters
     ----------
@@ -109,46 +147,111 @@ def _interaction_loop(flags,
         Flags as read by the argument parser.
     model: :py:obj:`torch.nn.Module`
         PyTorch model to evaluate.
-    env: :py:class:`gym.Env`
-        An environment as spawned by the :py:class:`~EnvSpawner`.
-    recorded: :py:class:`~Recorder`
+    envs: `list` of :py:class:`gym.Env` or a vectorized environment
+        Environments as spawned by the :py:class:`~EnvSpawner`.
+    recorder: :py:class:`~Recorder`
         A recorder that logs and records data.
     """
     # pylint: disable=protected-access
+    vectorized = isinstance(envs, (SubprocVecEnv, BatchedAtariVecEnv))
+    states = envs.initial() if vectorized else [env.initial() for env in envs]
+    active = list(range(len(states)))
+    started = len(active)
+
+    returns = []
     steps = 0
-    episodes = 0
-    state = env.initial()
-
-    episode_data = {'episode_id': episodes,
-                    'return': 0,
-                    'length': 0
-                    }
-    while steps < flags.total_steps:
-        eval_dict = model(state)[0]
-        state = env.step(eval_dict['action'])
-        steps += 1
-
-        if flags.verbose:
-            print("STEP: %4d RETURN %4d" % (state['episode_step'],
-                                            state['episode_return']))
-
-        if flags.render:
-            # target shape [H, W]
-            frame = state['frame'][0]
-            recorder._record_frame(frame, checks=False)
-
-        if state['done']:
-            episodes += 1
-            recorder.log('episodes', episode_data)
-
-            if flags.render:
-                recorder.record_eps_id = episodes
+    # inference mode is available since torch 1.9
+    inference_mode = getattr(torch, 'inference_mode', torch.no_grad)
+    while active and (steps < flags.total_steps or flags.total_steps <= 0):
+        batch = {key: torch.cat([states[i][key] for i in active], dim=1)
+                 for key in ('frame', 'last_action', 'reward', 'done')}
+        with inference_mode():
+            actions = model(batch)[0]['action']
+
+        if vectorized:
+            for j, i in enumerate(active):
+                envs.step_async(i, actions[:, j].view(1, 1))
+            for i, state in envs.step_wait().items():
+                states[i] = state
+        else:
+            for j, i in enumerate(active):
+                states[i] = envs[i].step(actions[:, j].view(1, 1))
+        steps += len(active)
+
+        if flags.render and 0 in active:
+            recorder._record_frame(states[0]['frame'][0], checks=False)
+
+        for i in list(active):
+            state = states[i]
+            if not state['done'].item():
+                continue
+
+            returns.append(state['episode_return'].item())
+            recorder.log('episodes', {'episode_id': len(returns),
+                                      'return': state['episode_return'],
+                                      'length': state['episode_step']})
+            if flags.verbose:
+                print("EPISODE %4d RETURN %6.1f" % (len(returns), returns[-1]))
+
+            if flags.render and i == 0:
+                recorder.record_eps_id = len(returns)
                 recorder._record_episode(check_return=False)
 
-        episode_data = {'episode_id': episodes,
-                        'return': state['episode_return'],
-                        'length': state['episode_step']
-                        }
+            if started < flags.num_episodes:
+                started += 1
+            else:
+                active.remove(i)
+
+    return returns, steps
+
+
+def _return_statistics(returns: List[float],
+                       confidence: float = 0.95) -> Dict[str, float]:
+    """Returns statistics of :py:attr:`returns`, including the interval
+    of the mean return at the given :py:attr:`confidence` level.
+
+    The interval uses the normal approximation of the distribution of the mean.
+    """
+    count = len(returns)
+    mean = statistics.mean(returns) if count > 0 else math.nan
+    std = statistics.stdev(returns) if count > 1 else math.nan
+    half_width = (_normal_quantile((1 + confidence) / 2)
+                  * std / math.sqrt(count)) if count > 1 else math.nan
+    return {'episodes': count,
+            'return_mean': mean,
+            'return_std': std,
+            'return_min': min(returns) if count > 0 else math.nan,
+            'return_max': max(returns) if count > 0 else math.nan,
+            'confidence': confidence,
+            'return_ci_low': mean - half_width,
+            'return_ci_high': mean + half_width}
+
+
+def _normal_quantile(p: float) -> float:
+    """Returns the :py:attr:`p`-quantile of the standard normal distribution.
+
+    Inverts its cumulative distribution function by bisection,
+    as :py:class:`statistics.NormalDist` is missing before python 3.8.
+    """
+    assert 0 < p < 1
+    low, high = -40., 40.
+    for _ in range(100):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def _close(envs: Union[List, SubprocVecEnv, BatchedAtariVecEnv]):
+    """Closes all environments.
+    """
+    if isinstance(envs, (SubprocVecEnv, BatchedAtariVecEnv)):
+        envs.close()
+    else:
+        for env in envs:
+            env.close()
 
 
 if __name__ == '__main__':
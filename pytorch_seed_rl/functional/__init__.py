@@ -2,7 +2,11 @@
 for reinforcement learning calculations.
 
 Exposed functions:
+    * :py:func:`impala.losses_from_logits`
     * :py:func:`loss.entropy`
+    * :py:func:`loss.entropy_from_log_probs`
     * :py:func:`loss.policy_gradient`
+    * :py:func:`loss.policy_gradient_from_log_probs`
+    * :py:func:`vtrace.from_action_log_probs`
     * :py:func:`vtrace.from_logits`
 """
@@ -0,0 +1,189 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fused computation of all components of the IMPALA loss.
+
+The log-softmax of the target policy is computed once and shared by V-trace,
+the policy gradient loss and the entropy loss.
+If the log-probabilities of the behavior policy for the taken actions have been
+stored during inference, the behavior policies logits are not needed at all.
+
+See Also
+--------
+`"IMPALA: Scalable Distributed Deep-RL with Importance Weighted Actor-Learner Architectures"
+on arXiv <https://arxiv.org/abs/1802.01561>`__ by Espeholt, Soyer, Munos et al.
+"""
+
+import collections
+
+import torch
+import torch.nn.functional as F
+
+from . import loss, vtrace
+
+ImpalaLossReturns = collections.namedtuple(
+    "ImpalaLossReturns",
+    [
+        "pg_loss",
+        "baseline_loss",
+        "entropy_loss",
+        "vtrace_returns",
+    ],
+)
+
+
+def _select_actions(log_probs: torch.Tensor,
+                    actions: torch.Tensor) -> torch.Tensor:
+    """Select the log-probabilities of the taken actions.
+    """
+    return log_probs.gather(-1, actions.to(torch.long).unsqueeze(-1)).squeeze(-1)
+
+
+def losses_from_logits(behavior_policy_logits: torch.Tensor,
+                       target_policy_logits: torch.Tensor,
+                       values: torch.Tensor,
+                       bootstrap_value: torch.Tensor,
+                       actions: torch.Tensor,
+                       discounts: torch.Tensor,
+                       rewards: torch.Tensor,
+                       clip_rho_threshold: float = 1.0,
+                       clip_pg_rho_threshold: float = 1.0,
+                       vectorized: bool = False,
+                       weights: torch.Tensor = None,
+                       ) -> ImpalaLossReturns:
+    """Computes policy gradient, baseline and entropy loss using V-trace for value estimation.
+
+    Equals the combination of :py:func:`.vtrace.from_logits`, :py:func:`.loss.policy_gradient`,
+    :py:func:`.loss.entropy` and a summed mean squared error of the baseline,
+    but computes each log-softmax only once.
+
+    Parameters
+    ----------
+    behavior_policy_logits: `torch.Tensor`
+        The policies logits used for action sampling during interaction with the environment.
+    target_policy_logits: `torch.Tensor`
+        The policies logits returned by the learning model.
+    values: `torch.Tensor`
+        The values returned by the learning model.
+    bootstrap_value: `torch.Tensor`
+        The value used for bootstrapping (usually most recent value returned by learning model.)
+    actions: `torch.Tensor`
+        The actions used during interaction with the environment.
+    discounts: `torch.Tensor`
+        The discounted rewards.
+    rewards: `torch.Tensor`
+        The original rewards.
+    clip_rho_threshold: `float`,
+        Clipping value for Vtrace. See paper for details.
+    clip_pg_rho_threshold: `float`,
+        Clipping value for Vtrace. See paper for details.
+    vectorized: `bool`
+        Set True, if the V-trace recursion shall be computed vectorized.
+    weights: `torch.Tensor`
+        Optional weights of each state the loss terms are multiplied with,
+        broadcastable to the shape of :py:attr:`values`.
+        V-trace targets are computed unweighted.
+    """
+    with torch.no_grad():
+        behavior_action_log_probs = _select_actions(
+            F.log_softmax(behavior_policy_logits, dim=-1), actions)
+
+    return losses_from_action_log_probs(behavior_action_log_probs=behavior_action_log_probs,
+                                        target_policy_logits=target_policy_logits,
+                                        values=values,
+                                        bootstrap_value=bootstrap_value,
+                                        actions=actions,
+                                        discounts=discounts,
+                                        rewards=rewards,
+                                        clip_rho_threshold=clip_rho_threshold,
+                                        clip_pg_rho_threshold=clip_pg_rho_threshold,
+                                        vectorized=vectorized,
+                                        weights=weights)
+
+
+def losses_from_action_log_probs(behavior_action_log_probs: torch.Tensor,
+                                 target_policy_logits: torch.Tensor,
+                                 values: torch.Tensor,
+                                 bootstrap_value: torch.Tensor,
+                                 actions: torch.Tensor,
+                                 discounts: torch.Tensor,
+                                 rewards: torch.Tensor,
+                                 clip_rho_threshold: float = 1.0,
+                                 clip_pg_rho_threshold: float = 1.0,
+                                 vectorized: bool = False,
+                                 weights: torch.Tensor = None,
+                                 ) -> ImpalaLossReturns:
+    """Computes policy gradient, baseline and entropy loss using V-trace for value estimation.
+
+    Equals :py:func:`losses_from_logits`, but takes the log-probabilities
+    the behavior policy assigned to the taken actions.
+
+    Parameters
+    ----------
+    behavior_action_log_probs: `torch.Tensor`
+        The log-probabilities of the taken actions under the behavior policy.
+    target_policy_logits: `torch.Tensor`
+        The policies logits returned by the learning model.
+    values: `torch.Tensor`
+        The values returned by the learning model.
+    bootstrap_value: `torch.Tensor`
+        The value used for bootstrapping (usually most recent value returned by learning model.)
+    actions: `torch.Tensor`
+        The actions used during interaction with the environment.
+    discounts: `torch.Tensor`
+        The discounted rewards.
+    rewards: `torch.Tensor`
+        The original rewards.
+    clip_rho_threshold: `float`,
+        Clipping value for Vtrace. See paper for details.
+    clip_pg_rho_threshold: `float`,
+        Clipping value for Vtrace. See paper for details.
+    vectorized: `bool`
+        Set True, if the V-trace recursion shall be computed vectorized.
+    weights: `torch.Tensor`
+        Optional weights of each state the loss terms are multiplied with,
+        broadcastable to the shape of :py:attr:`values`.
+        V-trace targets are computed unweighted.
+    """
+    target_log_probs = F.log_softmax(target_policy_logits, dim=-1)
+    target_action_log_probs = _select_actions(target_log_probs, actions)
+
+    vtrace_returns = vtrace.from_action_log_probs(
+        behavior_action_log_probs=behavior_action_log_probs.detach(),
+        target_action_log_probs=target_action_log_probs.detach(),
+        values=values,
+        bootstrap_value=bootstrap_value,
+        discounts=discounts,
+        rewards=rewards,
+        clip_rho_threshold=clip_rho_threshold,
+        clip_pg_rho_threshold=clip_pg_rho_threshold,
+        vectorized=vectorized,
+    )
+
+    pg_loss = loss.policy_gradient_from_log_probs(target_action_log_probs,
+                                                  vtrace_returns.pg_advantages,
+                                                  weights)
+
+    if weights is None:
+        baseline_loss = F.mse_loss(values,
+                                   vtrace_returns.vs,
+                                   reduction='sum')
+    else:
+        baseline_loss = torch.sum(weights * (values - vtrace_returns.vs) ** 2)
+
+    entropy_loss = loss.entropy_from_log_probs(target_log_probs, weights)
+
+    return ImpalaLossReturns(pg_loss=pg_loss,
+                             baseline_loss=baseline_loss,
+                             entropy_loss=entropy_loss,
+                             vtrace_returns=vtrace_returns)
@@ -64,3 +64,45 @@ def policy_gradient(logits: torch.Tensor,
     )
     cross_entropy = cross_entropy.view_as(advantages)
     return torch.sum(cross_entropy * advantages.detach())
+
+
+def entropy_from_log_probs(log_probs: torch.Tensor,
+                           weights: torch.Tensor = None) -> torch.Tensor:
+    """Return the entropy loss from precomputed log-probabilities of the policy.
+
+    Equals :py:func:`entropy` of the logits, :py:attr:`log_probs` were computed from.
+
+    Parameters
+    ----------
+    log_probs: :py:class:`torch.Tensor`
+        Log-softmax of the logits returned by the models policy network.
+    weights: :py:class:`torch.Tensor`
+        Optional weights of each state, broadcastable to the shape of
+        :py:attr:`log_probs` without its last dimension.
+    """
+    negative_entropy = torch.sum(torch.exp(log_probs) * log_probs, dim=-1)
+    if weights is not None:
+        negative_entropy = negative_entropy * weights
+    return torch.sum(negative_entropy)
+
+
+def policy_gradient_from_log_probs(action_log_probs: torch.Tensor,
+                                   advantages: torch.Tensor,
+                                   weights: torch.Tensor = None) -> torch.Tensor:
+    """Compute the policy gradient loss from precomputed log-probabilities of the taken actions.
+
+    Equals :py:func:`policy_gradient` of the logits, :py:attr:`action_log_probs` were selected from.
+
+    Parameters
+    ----------
+    action_log_probs: :py:class:`torch.Tensor`
+        Log-probabilities of the actions that were selected.
+    advantages: :py:class:`torch.Tensor`
+        Advantages that resulted for the related states.
+    weights: :py:class:`torch.Tensor`
+        Optional weights of each state, broadcastable to the shape of :py:attr:`advantages`.
+    """
+    advantages = advantages.detach()
+    if weights is not None:
+        advantages = advantages * weights
+    return -torch.sum(action_log_probs.view_as(advantages) * advantages)
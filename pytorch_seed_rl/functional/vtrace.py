@@ -67,6 +67,7 @@ def from_logits(behavior_policy_logits: torch.Tensor,
                 rewards: torch.Tensor,
                 clip_rho_threshold: float = 1.0,
                 clip_pg_rho_threshold: float = 1.0,
+                vectorized: bool = False,
                 ) -> VTraceFromLogitsReturns:
     """V-trace for softmax policies.
 
@@ -90,11 +91,66 @@ def from_logits(behavior_policy_logits: torch.Tensor,
         Clipping value for Vtrace. See paper for details.
     clip_pg_rho_threshold: `float`,
         Clipping value for Vtrace. See paper for details.
+    vectorized: `bool`
+        Set True, if the V-trace recursion shall be computed
+        by :py:func:`_discounted_reverse_scan` instead of a python loop.
     """
     # prepare logits
     target_action_log_probs = _action_log_probs(target_policy_logits, actions)
     behavior_action_log_probs = _action_log_probs(
         behavior_policy_logits, actions)
+
+    return from_action_log_probs(
+        behavior_action_log_probs=behavior_action_log_probs,
+        target_action_log_probs=target_action_log_probs,
+        values=values,
+        bootstrap_value=bootstrap_value,
+        discounts=discounts,
+        rewards=rewards,
+        clip_rho_threshold=clip_rho_threshold,
+        clip_pg_rho_threshold=clip_pg_rho_threshold,
+        vectorized=vectorized,
+    )
+
+
+def from_action_log_probs(behavior_action_log_probs: torch.Tensor,
+                          target_action_log_probs: torch.Tensor,
+                          values: torch.Tensor,
+                          bootstrap_value: torch.Tensor,
+                          discounts: torch.Tensor,
+                          rewards: torch.Tensor,
+                          clip_rho_threshold: float = 1.0,
+                          clip_pg_rho_threshold: float = 1.0,
+                          vectorized: bool = False,
+                          ) -> VTraceFromLogitsReturns:
+    """V-trace from the log-probabilities of the taken actions.
+
+    Use this, if log-probabilities have already been computed,
+    e.g. for loss computation or during inference.
+
+    Parameters
+    ----------
+    behavior_action_log_probs: `torch.Tensor`
+        Log-probabilities of the taken actions under the policy used
+        for action sampling during interaction with the environment.
+    target_action_log_probs: `torch.Tensor`
+        Log-probabilities of the taken actions under the policy of the learning model.
+    values: `torch.Tensor`
+        The values returned by the learning model.
+    bootstrap_value: `torch.Tensor`
+        The value used for bootstrapping (usually most recent value returned by learning model.)
+    discounts: `torch.Tensor`
+        The discounted rewards.
+    rewards: `torch.Tensor`
+        The original rewards.
+    clip_rho_threshold: `float`,
+        Clipping value for Vtrace. See paper for details.
+    clip_pg_rho_threshold: `float`,
+        Clipping value for Vtrace. See paper for details.
+    vectorized: `bool`
+        Set True, if the V-trace recursion shall be computed
+        by :py:func:`_discounted_reverse_scan` instead of a python loop.
+    """
     log_rhos = target_action_log_probs - behavior_action_log_probs
 
     vtrace_returns = _from_importance_weights(
@@ -105,6 +161,7 @@ def from_logits(behavior_policy_logits: torch.Tensor,
         bootstrap_value=bootstrap_value,
         clip_rho_threshold=clip_rho_threshold,
         clip_pg_rho_threshold=clip_pg_rho_threshold,
+        vectorized=vectorized,
     )
     return VTraceFromLogitsReturns(
         log_rhos=log_rhos,
@@ -125,6 +182,7 @@ def _from_importance_weights(log_rhos: torch.Tensor,
                              rewards: torch.Tensor,
                              clip_rho_threshold: float = 1.0,
                              clip_pg_rho_threshold: float = 1.0,
+                             vectorized: bool = False,
                              ) -> _VTraceReturns:
     """V-trace from logarithmic importance weights.
 
@@ -144,6 +202,9 @@ def _from_importance_weights(log_rhos: torch.Tensor,
         Clipping value for Vtrace. See paper for details.
     clip_pg_rho_threshold: `float`,
         Clipping value for Vtrace. See paper for details.
+    vectorized: `bool`
+        Set True, if the V-trace recursion shall be computed
+        by :py:func:`_discounted_reverse_scan` instead of a python loop.
     """
     # pylint: disable=invalid-name
     with torch.no_grad():
@@ -161,14 +222,17 @@ def _from_importance_weights(log_rhos: torch.Tensor,
         deltas = clipped_rhos * \
             (rewards + discounts * values_t_plus_1 - values)
 
-        acc = torch.zeros_like(bootstrap_value)
-        result = []
-        for t in range(discounts.shape[0] - 1, -1, -1):
-            acc = deltas[t] + discounts[t] * cs[t] * acc
-            result.append(acc)
-        result.reverse()
+        if vectorized:
+            vs_minus_v_xs = _discounted_reverse_scan(deltas, discounts * cs)
+        else:
+            acc = torch.zeros_like(bootstrap_value)
+            result = []
+            for t in range(discounts.shape[0] - 1, -1, -1):
+                acc = deltas[t] + discounts[t] * cs[t] * acc
+                result.append(acc)
+            result.reverse()
 
-        vs_minus_v_xs = torch.stack(result)
+            vs_minus_v_xs = torch.stack(result)
 
         # Add V(x_s) to get v_s.
         vs = torch.add(vs_minus_v_xs, values)
@@ -187,3 +251,78 @@ def _from_importance_weights(log_rhos: torch.Tensor,
 
         # Make sure no gradients backpropagated through the returned values.
         return _VTraceReturns(vs=vs, pg_advantages=pg_advantages)
+
+
+@torch.no_grad()
+def _discounted_reverse_scan(deltas: torch.Tensor,
+                             factors: torch.Tensor,
+                             chunk_size: int = 8) -> torch.Tensor:
+    """Computes ``acc[t] = deltas[t] + factors[t] * acc[t+1]`` (with ``acc[T] = 0``)
+    without stepping through every timestep in python.
+
+    The sequence is split into chunks of :py:attr:`chunk_size` timesteps.
+    Within each chunk, the recursion is unrolled into an upper triangular
+    transfer matrix of cumulative products of :py:attr:`factors`.
+    All chunks are solved at once, assuming nothing is carried over from the following chunk.
+    The values carried from chunk to chunk are then computed by scanning the chunks first
+    timesteps recursively, and added to every chunk afterwards.
+
+    Cumulative products are built from the start of each row of the transfer matrix,
+    so zero factors (e.g. at episode ends) are handled without divisions.
+
+    Parameters
+    ----------
+    deltas: `torch.Tensor`
+        Temporal differences of shape ``[T, ...]``.
+    factors: `torch.Tensor`
+        Multipliers of the accumulated value, broadcastable to :py:attr:`deltas`.
+    chunk_size: `int`
+        Number of timesteps unrolled at once, must be bigger than 1.
+        Memory grows quadratically with this value.
+    """
+    # pylint: disable=invalid-name
+    # chunks of size 1 would never shorten the recursive scan over chunks
+    assert chunk_size > 1
+
+    T = deltas.shape[0]
+    K = min(chunk_size, T)
+    C = -(-T // K)  # ceil division
+
+    # merge all trailing dimensions, pad T to a multiple of the chunk size.
+    # padded timesteps have no deltas and pass nothing on.
+    flat_deltas = deltas.reshape(T, -1)
+    flat_factors = factors.expand_as(deltas).reshape(T, -1)
+    N = flat_deltas.shape[1]
+    padding = C * K - T
+    if padding > 0:
+        flat_deltas = torch.cat([flat_deltas,
+                                 flat_deltas.new_zeros(padding, N)])
+        flat_factors = torch.cat([flat_factors,
+                                  flat_factors.new_zeros(padding, N)])
+    chunk_deltas = flat_deltas.view(C, K, N)
+    chunk_factors = flat_factors.view(C, K, N)
+
+    # row t holds factors[t:] and ones before t,
+    # so its cumulative product at column k equals prod_{i=t}^{k} factors[i].
+    upper = torch.ones(K, K, dtype=torch.bool,
+                       device=deltas.device).triu().view(1, K, K, 1)
+    rows = torch.where(upper,
+                       chunk_factors.unsqueeze(1),
+                       torch.ones(1, dtype=flat_factors.dtype, device=deltas.device))
+    cumulative = torch.cumprod(rows, dim=2)
+
+    # transfer[t, k] = prod_{i=t}^{k-1} factors[i] for k >= t, else 0
+    transfer = torch.cat([torch.ones_like(cumulative[:, :, :1]),
+                          cumulative[:, :, :-1]], dim=2) * upper
+    result = (transfer * chunk_deltas.unsqueeze(1)).sum(dim=2)
+
+    if C > 1:
+        # prod_{i=t}^{K-1} factors[i], multiplier of the value carried from the next chunk
+        carry_factors = cumulative[:, :, -1]
+        chunk_starts = _discounted_reverse_scan(result[:, 0],
+                                                carry_factors[:, 0],
+                                                chunk_size)
+        carried = torch.cat([chunk_starts[1:], chunk_starts.new_zeros(1, N)])
+        result = result + carry_factors * carried.unsqueeze(1)
+
+    return result.view(C * K, N)[:T].view_as(deltas)
@@ -55,6 +55,7 @@ class AtariNet(Module):
         # ATTRIBUTES
         self.observation_shape = observation_shape
         self.num_actions = num_actions
+        self.input_scale_folded = False
 
         # Feature extraction.
         self.conv1 = nn.Conv2d(
@@ -92,7 +93,27 @@ class AtariNet(Module):
             for _ in range(2)
         )
 
-    def forward(self, inputs: dict, core_state: tuple = ()):
+    @torch.no_grad()
+    def fold_input_scale(self):
+        """Folds the normalization of input frames into the weights of the first convolution.
+
+        Afterwards, frames are not divided by 255 during :py:meth:`forward()`,
+        which saves an elementwise operation on the largest input tensor.
+
+        Warnings
+        --------
+        Parameters of a folded model differ from those of an unfolded model.
+        Fold only models that are used for evaluation and neither trained,
+        saved nor synchronized with unfolded models afterwards.
+        """
+        if not self.input_scale_folded:
+            self.conv1.weight.div_(255.0)
+            self.input_scale_folded = True
+
+    def forward(self,
+                inputs: dict,
+                core_state: tuple = (),
+                sample_action: bool = True):
         """Forward step of the neural network
 
         Parameters
@@ -100,11 +121,19 @@ class AtariNet(Module):
         inputs: `dict` of :py:obj:`torch.Tensor`
             Awaits a dictionary as returned by an step of
             :py:class:`~pytorch_seed_rl.environments.atari_wrappers.DictObservationsEnv`
+        core_state: `tuple`
+            The state of the LSTM block, if used.
+        sample_action: `bool`
+            Set True when acting, an action is sampled from the policy
+            and returned together with its log-probability.
+            Set False when training, only policy logits and baseline are returned.
         """
         x = inputs["frame"]  # [T, B, C, H, W].
         T, B, *_ = x.shape
         x = torch.flatten(x, 0, 1)  # Merge time and batch.
-        x = x.float() / 255.0
+        x = x.float()
+        if not self.input_scale_folded:
+            x = x / 255.0
         x = F.leaky_relu(self.conv1(x))
         x = F.leaky_relu(self.conv2(x))
         x = F.leaky_relu(self.conv3(x))
@@ -139,14 +168,14 @@ class AtariNet(Module):
         policy_logits = self.policy(core_output)
         baseline = self.baseline(core_output)
 
-        probs = F.softmax(policy_logits, dim=1)
-        action = torch.multinomial(probs, num_samples=1)
+        outputs = dict(policy_logits=policy_logits.view(T, B, self.num_actions),
+                       baseline=baseline.view(T, B))
 
-        policy_logits = policy_logits.view(T, B, self.num_actions)
-        baseline = baseline.view(T, B)
-        action = action.view(T, B)
+        # the sampled action and its log-probability are only needed when acting
+        if sample_action:
+            log_probs = F.log_softmax(policy_logits, dim=1)
+            action = torch.multinomial(log_probs.exp(), num_samples=1)
+            outputs['action'] = action.view(T, B)
+            outputs['action_log_prob'] = log_probs.gather(1, action).view(T, B)
 
-        return (
-            dict(policy_logits=policy_logits, baseline=baseline, action=action),
-            core_state,
-        )
+        return outputs, core_state
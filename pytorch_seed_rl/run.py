@@ -16,6 +16,7 @@
 """
 """
 import argparse
+import glob
 import json
 import os
 import shutil
@@ -28,6 +29,7 @@ from torch.optim import Adam, RMSprop
 from .agents import Learner
 from .environments import EnvSpawner
 from .nets import AtariNet
+from .tools.checkpoint_writer import read_manifest
 
 PARSER = argparse.ArgumentParser(description="PyTorch_SEED_RL")
 
@@ -52,6 +54,8 @@ PARSER.add_argument('--system_log_interval', default=1, type=int,
                     help='Number of core loops between logging system metrics.')
 PARSER.add_argument('--checkpoint_interval', default=10, type=int,
                     help='Number of training epochs between checkpointing.')
+PARSER.add_argument('--num_checkpoints', default=2, type=int,
+                    help='Number of rolling checkpoints that are kept.')
 PARSER.add_argument("--savedir", default=os.path.join(os.environ.get("HOME"),
                                                       'logs',
                                                       'pytorch_seed_rl'),
@@ -63,6 +67,19 @@ PARSER.add_argument('--render',
 PARSER.add_argument('--max_gif_length', default=0, type=int,
                     help="Enforces a maximum gif length." +
                     "Rendering is triggered, if recorded data reaches this volume.")
+PARSER.add_argument('--max_gif_memory', default=256, type=int,
+                    help="Maximum memory in MB held by recorded frames not yet written as gif. " +
+                    "Further frames are dropped.")
+PARSER.add_argument('--log_modes', default=['csv'], nargs='+', choices=['csv', 'npy'],
+                    help="Formats logs are written in. 'npy' writes columnar logs, " +
+                    "see pytorch_seed_rl.tools.logger.load_npy_log().")
+PARSER.add_argument('--aggregate_interval', default=10., type=float,
+                    help="Interval in seconds of logging windowed aggregates and quantiles " +
+                    "of episode returns, lengths, latencies and policy lags.")
+PARSER.add_argument('--no_episode_logs', action='store_true',
+                    help="Logs only aggregates instead of a row per episode.")
+PARSER.add_argument('--metrics_port', default=0, type=int,
+                    help="Serves live metrics at http://127.0.0.1:<port>/metrics, if set.")
 PARSER.add_argument('--gpu_ids', default="", type=str,
                     help='A comma-separated list of cuda ids this program is permitted to use.')
 
@@ -86,6 +103,50 @@ PARSER.add_argument("--env", type=str, default="BreakoutNoFrameskip-v4",
                     help="Gym environment.")
 PARSER.add_argument("--num_envs", type=int, default=16,
                     help="Number of environments per actor.")
+PARSER.add_argument("--synthetic_frame_shape", type=int, nargs=3, default=[4, 84, 84],
+                    help="Frame shape [C, H, W] of the synthetic environment, " +
+                    "if --env is Synthetic-v0.")
+PARSER.add_argument("--synthetic_num_actions", type=int, default=6,
+                    help="Number of actions of the synthetic environment.")
+PARSER.add_argument("--synthetic_episode_length", type=int, nargs=2, default=[500, 1500],
+                    help="Minimum and maximum episode length of the synthetic environment.")
+PARSER.add_argument("--synthetic_step_time", type=float, default=0.,
+                    help="Simulated cost of a step of the synthetic environment in seconds.")
+PARSER.add_argument("--synthetic_busy_wait", action="store_true",
+                    help="Simulate the step cost of the synthetic environment " +
+                    "by a busy loop instead of sleeping.")
+PARSER.add_argument("--subprocess_envs", action="store_true",
+                    help="Steps the environments of each actor in parallel worker processes.")
+PARSER.add_argument("--fused_preprocessing", action="store_true",
+                    help="Applies the Atari preprocessing in a single fused wrapper.")
+PARSER.add_argument("--inplace_observations", action="store_true",
+                    help="Environments update their observations inplace on every step.")
+PARSER.add_argument("--background_resets", action="store_true",
+                    help="Environments swap in a spare instance that was reset in the background " +
+                    "at the end of an episode.")
+PARSER.add_argument("--batched_preprocessing", action="store_true",
+                    help="Warps the frames of all environments of an actor in batches. " +
+                    "Requires --fused_preprocessing.")
+PARSER.add_argument("--warp_threads", type=int, default=1,
+                    help="Number of threads per actor that resize frames, " +
+                    "if --batched_preprocessing is set.")
+PARSER.add_argument("--spawn_threads", type=int, default=1,
+                    help="Number of threads per actor that construct its environments in parallel.")
+PARSER.add_argument("--env_cache_dir", type=str, default="",
+                    help="Directory where environment infos are cached. " +
+                    "Infos are generated by spawning an environment, if not given.")
+PARSER.add_argument("--startup_timeout", type=int, default=600,
+                    help="Seconds to wait for all actors to start, before shutting down. " +
+                    "Set to 0 to wait forever.")
+PARSER.add_argument("--actor_groups", type=int, default=1,
+                    help="Number of groups each actor splits its environments into. " +
+                    "Groups alternate between waiting for actions and stepping.")
+PARSER.add_argument("--actor_as_completed", action="store_true",
+                    help="Actors step each environment as soon as its action arrives.")
+PARSER.add_argument("--shared_frames", action="store_true",
+                    help="Actors pass frames to the learner through shared memory " +
+                    "instead of RPCs. Actors and learner must run on the same host. " +
+                    "Requires python 3.8 or newer.")
 
 # Architecture settings
 PARSER.add_argument("--master_address", default='localhost', type=str,
@@ -111,6 +172,25 @@ PARSER.add_argument("--max_queued_batches", default=128, type=int,
 PARSER.add_argument("--max_queued_drops", default=128, type=int,
                     help="Number of trajectories that can be queued concurrently by the store." +
                     "This prevents memory overflow.")
+PARSER.add_argument("--publish_interval", default=1, type=int,
+                    help="Number of training epochs between publishing the model for inference. " +
+                    "Set to 0 to publish by time only.")
+PARSER.add_argument("--publish_interval_time", default=0., type=float,
+                    help="Seconds between publishing the model for inference. " +
+                    "Set to 0 to publish by training epochs only.")
+PARSER.add_argument("--max_policy_lag", default=0, type=int,
+                    help="Maximum policy lag of trajectories in training epochs. " +
+                    "Set to 0 for no bound.")
+PARSER.add_argument("--policy_lag_mode", default='drop',
+                    choices=['drop', 'weight'],
+                    help="Drops or down-weights trajectories beyond --max_policy_lag. " +
+                    "Dropped trajectories are not counted as training steps.")
+PARSER.add_argument("--num_learners", default=1, type=int,
+                    help="Number of data-parallel learning processes. \n" +
+                    "Each learns from its own batches, gradients are averaged.")
+PARSER.add_argument("--learner_port", default=29501, type=int,
+                    help="The local port used by the data-parallel learning processes. \n" +
+                    "WARNING: CHANGE WITH CAUTION!")
 
 # Loss settings.
 PARSER.add_argument("--pg_cost", default=1.,
@@ -124,6 +204,11 @@ PARSER.add_argument("--discounting", default=0.99,
 PARSER.add_argument("--reward_clipping", default="abs_one",
                     choices=["abs_one", "none"],
                     help="Reward clipping.")
+PARSER.add_argument("--vectorized_vtrace", action="store_true",
+                    help="Computes the V-trace recursion vectorized instead of a python loop.")
+PARSER.add_argument("--store_action_log_probs_only", action="store_true",
+                    help="Stores only the log-probability of the sampled action, " +
+                    "which is all V-trace needs, instead of also the full policy logits.")
 
 # Optimizer settings.
 PARSER.add_argument("--optimizer", default='rmsprop',
@@ -159,7 +244,8 @@ def _run_threads(rank,
                  env_spawner,
                  model,
                  optimizer,
-                 flags):
+                 flags,
+                 startup_times):
     """Initializes RPC clients.
 
     Intended use as target function for :py:func:`torch.multiprocessing.spawn()`.
@@ -181,6 +267,9 @@ def _run_threads(rank,
         by an environment spawned by :py:attr:`env_spawner`
     optimizer : :py:class:`torch.nn.Module`
         A torch optimizer that links to :py:attr:`model`
+    startup_times : `dict`
+        Durations of startup phases of the mother process,
+        printed with those of the learner and actors by rank 0.
     """
     os.environ['MASTER_ADDR'] = flags.master_address
     os.environ['MASTER_PORT'] = flags.master_port
@@ -191,12 +280,14 @@ def _run_threads(rank,
         backend = rpc.BackendType.PROCESS_GROUP
 
     if rank == 0:
-
+        phase_start = time.time()
         rpc.init_rpc(LEARNER_NAME.format(rank),
                      backend=backend,
                      rank=rank,
                      world_size=world_size,
                      )
+        startup_times['rpc_init'] = time.time() - phase_start
+        phase_start = time.time()
 
         learner_rref = rpc.remote(LEARNER_NAME.format(rank),
                                   Learner,
@@ -212,6 +303,9 @@ def _run_threads(rank,
                                           'discounting': flags.discounting,
                                           'grad_norm_clipping': flags.grad_norm_clipping,
                                           'reward_clipping': flags.reward_clipping == 'abs_one',
+                                          'vectorized_vtrace': flags.vectorized_vtrace,
+                                          'store_action_log_probs_only':
+                                          flags.store_action_log_probs_only,
                                           'batchsize_training': flags.batchsize_training,
                                           'rollout': flags.rollout,
                                           'total_steps': flags.total_steps,
@@ -220,18 +314,52 @@ def _run_threads(rank,
                                           'threads_prefetch': flags.threads_prefetch,
                                           'threads_inference': flags.threads_inference,
                                           'threads_store': flags.threads_store,
+                                          'actor_groups': flags.actor_groups,
+                                          'actor_as_completed': flags.actor_as_completed,
+                                          'shared_frames': flags.shared_frames,
                                           'render': flags.render,
                                           'max_gif_length': flags.max_gif_length,
+                                          'max_gif_memory': flags.max_gif_memory * 2**20,
+                                          'log_modes': flags.log_modes,
+                                          'aggregate_interval': flags.aggregate_interval,
+                                          'log_episodes': not flags.no_episode_logs,
+                                          'metrics_port': flags.metrics_port,
                                           'verbose': flags.verbose,
                                           'print_interval': flags.print_interval,
                                           'system_log_interval': flags.system_log_interval,
                                           'checkpoint_interval': flags.checkpoint_interval,
+                                          'num_checkpoints': flags.num_checkpoints,
                                           'load_checkpoint': flags.load_checkpoint,
                                           'max_queued_batches': flags.max_queued_batches,
                                           'max_queued_drops': flags.max_queued_drops,
+                                          'publish_interval': flags.publish_interval,
+                                          'publish_interval_time': flags.publish_interval_time,
+                                          'max_policy_lag': flags.max_policy_lag,
+                                          'policy_lag_mode': flags.policy_lag_mode,
+                                          'num_learners': flags.num_learners,
+                                          'learner_port': flags.learner_port,
                                           })
 
+        # returns once the learner is constructed
+        learner_rref.rpc_sync().get_runtime()
+        startup_times['learner_init'] = time.time() - phase_start
+        phase_start = time.time()
+
         learner_rref.remote().loop()
+        while (learner_rref.rpc_sync().get_callers_ready() < flags.num_actors and
+               not learner_rref.rpc_sync().get_shutdown()):
+            if 0 < flags.startup_timeout < time.time() - phase_start:
+                print("Only %d of %d actors started within %d seconds, shutting down." %
+                      (learner_rref.rpc_sync().get_callers_ready(),
+                       flags.num_actors,
+                       flags.startup_timeout))
+                learner_rref.rpc_sync().set_shutdown()
+                break
+            time.sleep(0.1)
+        if not learner_rref.rpc_sync().get_shutdown():
+            startup_times['actors_init'] = time.time() - phase_start
+            _print_startup_times(startup_times)
+
         while not learner_rref.rpc_sync().get_shutdown():
             time.sleep(1)
     else:
@@ -248,6 +376,15 @@ def _run_threads(rank,
         return
 
 
+def _print_startup_times(startup_times: dict):
+    """Prints the duration of each startup phase and their total.
+    """
+    print("Startup times:")
+    for phase, duration in startup_times.items():
+        print("  %-16s %8.2fs" % (phase, duration))
+    print("  %-16s %8.2fs" % ('total', sum(startup_times.values())))
+
+
 def _write_flags(flags):
     """Saves flags as a json. Creates directories if needed.
 
@@ -277,8 +414,9 @@ def _check_flag_consistency(flags) -> bool:
         print("CAN NOT RESET AND CONTINUE!")
         return False
     if flags.load_checkpoint:
-        path = os.path.join(flags.full_path, 'model', 'checkpoint_')
-        if not (os.path.isfile(path + '0.pt') or os.path.isfile(path + '1.pt')):
+        path = os.path.join(flags.full_path, 'model')
+        if (read_manifest(path) is None
+                and not glob.glob(os.path.join(path, 'checkpoint_*.pt'))):
             print("NO CHECKPOINT FOUND!")
             return False
 
@@ -301,8 +439,31 @@ def main(flags):
         shutil.rmtree(flags.full_path, ignore_errors=True)
     _write_flags(flags)
 
+    startup_times = {}
+    phase_start = time.time()
+
     # create and wrap environment
-    env_spawner = EnvSpawner(flags.env, flags.num_envs)
+    env_spawner = EnvSpawner(flags.env,
+                             flags.num_envs,
+                             subprocess_envs=flags.subprocess_envs,
+                             fused_preprocessing=flags.fused_preprocessing,
+                             inplace_observations=flags.inplace_observations,
+                             background_resets=flags.background_resets,
+                             batched_preprocessing=flags.batched_preprocessing,
+                             warp_threads=flags.warp_threads,
+                             synthetic_config={
+                                 'frame_shape': flags.synthetic_frame_shape,
+                                 'num_actions': flags.synthetic_num_actions,
+                                 'min_episode_length': flags.synthetic_episode_length[0],
+                                 'max_episode_length': flags.synthetic_episode_length[1],
+                                 'step_time': flags.synthetic_step_time,
+                                 'busy_wait': flags.synthetic_busy_wait,
+                             },
+                             spawn_threads=flags.spawn_threads,
+                             cache_dir=flags.env_cache_dir or None)
+    env_info_phase = 'env_info_cached' if env_spawner.env_info_cached else 'env_info'
+    startup_times[env_info_phase] = time.time() - phase_start
+    phase_start = time.time()
 
     # model
     model = AtariNet(
@@ -326,6 +487,7 @@ def main(flags):
                  }
 
     optimizer = optim_map[flags.optimizer](model.parameters())
+    startup_times['model'] = time.time() - phase_start
     world_size = 1 + flags.num_actors
 
     mp.set_start_method('spawn')
@@ -335,7 +497,8 @@ def main(flags):
               env_spawner,
               model,
               optimizer,
-              flags),
+              flags,
+              startup_times),
         nprocs=world_size,
         join=True
     )
@@ -1,4 +1,9 @@
 """This module includes all data related tools.
 """
+from .checkpoint_writer import CheckpointWriter
+from .frame_ring import FrameRing
+from .metric_aggregator import MetricAggregator
+from .metrics_server import MetricsServer
+from .model_sync import ModelSync
 from .recorder import Recorder
 from .trajectory_store import TrajectoryStore
@@ -0,0 +1,240 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=empty-docstring
+"""
+"""
+import hashlib
+import inspect
+import json
+import os
+import queue
+import time
+from threading import Thread
+from typing import Any, Dict
+
+import torch
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# torch.load() can memory-map tensors since torch 2.1
+_MMAP_SUPPORTED = 'mmap' in inspect.signature(torch.load).parameters
+
+
+class CheckpointWriter():
+    """Object that writes checkpoints on a background thread.
+
+    Checkpoints are written to a temporary file first, which then replaces
+    the checkpoint file atomically. A checkpoint file is either complete or untouched,
+    even if the program is killed while writing.
+
+    After each checkpoint, a manifest file is replaced the same way in the checkpoints directory.
+    It records the file name and SHA-256 checksum of the latest checkpoint,
+    together with the given metadata, e.g. the training epoch.
+    :py:func:`load_latest()` uses it to read only the latest checkpoint.
+
+    Parameters
+    ----------
+    max_queued_checkpoints: `int`
+        The number of snapshots that can wait for writing.
+        :py:meth:`write()` blocks, if this limit is reached.
+    """
+
+    def __init__(self, max_queued_checkpoints: int = 1):
+        # COUNTERS
+        self.write_time = 0.
+        self.checkpoints_written = 0
+
+        # THREADS
+        self._queue = queue.Queue(maxsize=max_queued_checkpoints)
+        self._thread = Thread(target=self._write_loop,
+                              daemon=True,
+                              name='checkpoint_thread')
+        self._thread.start()
+
+    @staticmethod
+    def snapshot(data: Any) -> Any:
+        """Returns a copy of :py:attr:`data` with all tensors copied to CPU memory.
+
+        Nested dictionaries, lists and tuples are copied recursively,
+        other values are kept as they are.
+
+        Parameters
+        ----------
+        data: `any`
+            The data to copy, e.g. a dictionary of state dicts.
+        """
+        if isinstance(data, torch.Tensor):
+            return data.detach().to('cpu', copy=True)
+        if isinstance(data, dict):
+            return data.__class__((k, CheckpointWriter.snapshot(v)) for k, v in data.items())
+        if isinstance(data, (list, tuple)):
+            return data.__class__(CheckpointWriter.snapshot(v) for v in data)
+        return data
+
+    def write(self,
+              snapshot: Any,
+              save_path: str,
+              metadata: Dict[str, Any] = None):
+        """Queues :py:attr:`snapshot` to be written at :py:attr:`save_path`.
+
+        Parameters
+        ----------
+        snapshot: `any`
+            Data as returned by :py:meth:`snapshot()`.
+            It must not be changed after queueing.
+        save_path: `str`
+            The path of the checkpoint file.
+        metadata: `dict`
+            JSON serializable values that are recorded in the manifest.
+        """
+        self._queue.put((snapshot, save_path, metadata or {}))
+
+    def _write_loop(self):
+        """Writes queued snapshots until ``None`` is queued.
+
+        Intended for use as :py:obj:`threading.Thread`.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            snapshot, save_path, metadata = item
+            start = time.time()
+            checksum = self._save(snapshot, save_path)
+            self._write_manifest(save_path, checksum, metadata)
+            self.write_time += time.time() - start
+            self.checkpoints_written += 1
+            del snapshot, item
+
+    @staticmethod
+    def _save(data: Any, save_path: str) -> str:
+        """Saves :py:attr:`data` at :py:attr:`save_path` using a temporary file and atomic rename.
+
+        Returns the SHA-256 checksum of the written file, computed while writing.
+        """
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        tmp_path = save_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            hashing_file = _HashingWriter(file)
+            torch.save(data, hashing_file)
+        os.replace(tmp_path, save_path)
+
+        return hashing_file.hexdigest()
+
+    @staticmethod
+    def _write_manifest(save_path: str,
+                        checksum: str,
+                        metadata: Dict[str, Any]):
+        """Atomically replaces the manifest next to :py:attr:`save_path`.
+        """
+        directory = os.path.dirname(save_path) or '.'
+        manifest = {**metadata,
+                    'file': os.path.basename(save_path),
+                    'sha256': checksum}
+
+        manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        tmp_path = manifest_path + '.tmp'
+        # pylint: disable=invalid-name
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, manifest_path)
+
+    def close(self):
+        """Waits for all queued snapshots to be written and stops the background thread.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class _HashingWriter():
+    """Binary file wrapper that computes the SHA-256 checksum of everything written.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self._hash = hashlib.sha256()
+
+    def write(self, data) -> int:
+        """Updates the checksum and writes :py:attr:`data` to the wrapped file.
+        """
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def flush(self):
+        """Flushes the wrapped file.
+        """
+        self._file.flush()
+
+    def hexdigest(self) -> str:
+        """Returns the checksum of all data written so far.
+        """
+        return self._hash.hexdigest()
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Returns the manifest of the checkpoints in directory :py:attr:`path`,
+    or ``None``, if no manifest exists.
+
+    Parameters
+    ----------
+    path: `str`
+        The directory checkpoints are saved in.
+    """
+    try:
+        # pylint: disable=invalid-name
+        with open(os.path.join(path, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_latest(path: str, verify: bool = False) -> Any:
+    """Loads the latest checkpoint listed by the manifest in directory :py:attr:`path`.
+
+    Tensors are memory-mapped, if the installed torch version supports it.
+
+    Parameters
+    ----------
+    path: `str`
+        The directory checkpoints are saved in.
+    verify: `bool`
+        Set True, if the checksum of the checkpoint file shall be verified.
+        This reads the whole file once more.
+
+    Raises
+    ------
+    FileNotFoundError
+        If there is no manifest or the listed checkpoint is missing.
+    ValueError
+        If :py:attr:`verify` is set and the checksum does not match.
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError('No checkpoint manifest found at %s!' % path)
+
+    checkpoint_path = os.path.join(path, manifest['file'])
+    if verify:
+        checksum = hashlib.sha256()
+        with open(checkpoint_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                checksum.update(chunk)
+        if checksum.hexdigest() != manifest['sha256']:
+            raise ValueError('Checksum of %s does not match its manifest!' % checkpoint_path)
+
+    if _MMAP_SUPPORTED:
+        return torch.load(checkpoint_path, mmap=True)
+    return torch.load(checkpoint_path)
@@ -0,0 +1,137 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=empty-docstring
+"""
+"""
+import inspect
+from typing import Tuple
+
+import numpy as np
+import torch
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # shared memory is available since python 3.8
+    resource_tracker = shared_memory = None
+
+#: True, if this interpreter supports the :py:class:`FrameRing`.
+FRAME_RING_SUPPORTED = shared_memory is not None
+
+# attaching processes must not free the block on exit, configurable since python 3.13
+_TRACK_SUPPORTED = (FRAME_RING_SUPPORTED and
+                    'track' in inspect.signature(shared_memory.SharedMemory).parameters)
+
+
+class FrameRing():
+    """Shared memory ring buffer of frames, indexed by global environment id.
+
+    Lets co-located processes exchange frames without serializing them.
+    Each environment owns :py:attr:`num_slots` slots, which are written in turn.
+    A writer sends only the returned slot index, the reader copies the frame out of the slot.
+    A slot is overwritten after :py:attr:`num_slots` further writes of the same environment,
+    so a frame must be read before.
+
+    The ring is created by one process and attached to by name from all others,
+    see :py:meth:`attach()`.
+
+    Parameters
+    ----------
+    num_envs: `int`
+        Total number of environments.
+    frame_shape: `tuple`
+        Shape of a single frame, e.g. [C, H, W].
+    num_slots: `int`
+        Number of slots per environment.
+    name: `str`
+        Name of the shared memory block.
+        If not given, a new block is created with a unique name.
+    """
+
+    def __init__(self,
+                 num_envs: int,
+                 frame_shape: Tuple[int, ...],
+                 num_slots: int = 2,
+                 name: str = None):
+        assert num_slots > 0
+        if not FRAME_RING_SUPPORTED:
+            raise RuntimeError("FrameRing requires python 3.8 or newer.")
+
+        self.num_envs = num_envs
+        self.frame_shape = tuple(frame_shape)
+        self.num_slots = num_slots
+
+        shape = (num_envs, num_slots) + self.frame_shape
+        self._owner = name is None
+        if self._owner or not _TRACK_SUPPORTED:
+            self._shm = shared_memory.SharedMemory(name=name,
+                                                   create=self._owner,
+                                                   size=int(np.prod(shape)))
+        else:
+            # pylint: disable=unexpected-keyword-arg
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        if not self._owner and not _TRACK_SUPPORTED:
+            # pylint: disable=protected-access
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self.name = self._shm.name
+
+        # pylint: disable=not-callable
+        self.frames = torch.from_numpy(np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf))
+        self._next_slots = [0] * num_envs
+
+    @classmethod
+    def attach(cls, ring_info: dict) -> 'FrameRing':
+        """Attaches to the ring described by :py:attr:`ring_info`,
+        as returned by :py:meth:`info()` of its creator.
+        """
+        return cls(**ring_info)
+
+    def info(self) -> dict:
+        """Returns the picklable description of this ring, used by :py:meth:`attach()`.
+        """
+        return {'num_envs': self.num_envs,
+                'frame_shape': self.frame_shape,
+                'num_slots': self.num_slots,
+                'name': self.name}
+
+    def write(self, env_id: int, frame: torch.Tensor) -> int:
+        """Copies :py:attr:`frame` into the next slot of environment :py:attr:`env_id`
+        and returns the slot index.
+        """
+        slot = self._next_slots[env_id]
+        self._next_slots[env_id] = (slot + 1) % self.num_slots
+        self.frames[env_id, slot].copy_(frame.view(self.frame_shape))
+        return slot
+
+    def read(self, env_ids: torch.Tensor, slots: torch.Tensor) -> torch.Tensor:
+        """Returns a copy of the frames of the given slots, stacked along the first dimension.
+
+        Parameters
+        ----------
+        env_ids: :py:obj:`torch.Tensor`
+            Global environment ids.
+        slots: :py:obj:`torch.Tensor`
+            Slot indices as returned by :py:meth:`write()`, one for each environment id.
+        """
+        return self.frames[env_ids.long().view(-1), slots.long().view(-1)]
+
+    def close(self):
+        """Detaches from the shared memory block, the creator also frees it.
+        """
+        # release the tensor view before the underlying buffer
+        del self.frames
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
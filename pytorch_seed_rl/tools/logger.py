@@ -16,18 +16,45 @@
 """
 """
 import csv
+import json
 import os
+import queue
+import time
 from collections import deque
-from typing import Any, Deque, Dict, List, Union
+from threading import Event, Thread
+from typing import Any, Deque, Dict, List, TextIO, Tuple, Union
 
+import numpy as np
 import torch
 
 CsvRowtype = Dict[str, Union[int, float]]
 
+# control items of the writing queue, followed by an event that is set when done
+_FLUSH = 'flush'
+_CLOSE = 'close'
+
+# npy files are written with a header of fixed length, so that it can be updated inplace
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_HEADER_LENGTH = 128
+NPY_INDEX_FILENAME = 'index.json'
+
 
 class Logger():
     """Object that manages the writing of logs.
 
+    Logged data is passed through a queue to a single background thread,
+    so :py:meth:`log()` never blocks on file I/O.
+    The writing thread buffers rows for each source and writes them in chunks,
+    if a buffer reaches its chunksize or :py:attr:`flush_interval` seconds passed.
+    Tensors are converted to numbers in bulk on the writing thread.
+    Files stay open until :py:meth:`close()`.
+
+    In mode ``'npy'``, each column of a source is appended to its own ``.npy`` file
+    in a directory named after the source, see :py:func:`load_npy_log()`.
+    Columns keep the dtype of their values and are widened, if later values need it,
+    e.g. integer columns become float columns on the first float or ``nan``.
+    Columns missing in some rows are filled with ``nan``, or an empty string in string columns.
+
     Warnings
     --------
     Tensorboard functionality not yet implemented.
@@ -39,11 +66,16 @@ class Logger():
     directory: `str`
         The logs root directory.
     modes: `list` of `str`
-        The modes this instance uses for logging. Possible values are ``'csv'`` and ``'tb'``.
+        The modes this instance uses for logging.
+        Possible values are ``'csv'``, ``'npy'`` and ``'tb'``.
     csv_chunksize: `int`
         The chunksize of buffered writing of csv files.
     tb_chunksize: `int`
         The chunksize of buffered writing of tensorboard files.
+    npy_chunksize: `int`
+        The chunksize of buffered writing of npy files.
+    flush_interval: `float`
+        The maximum time in seconds that logged data waits in buffers.
     """
 
     def __init__(self,
@@ -51,9 +83,12 @@ class Logger():
                  directory: str,
                  modes: List[str] = None,
                  csv_chunksize: int = 10,
-                 tb_chunksize: int = 10):
+                 tb_chunksize: int = 10,
+                 npy_chunksize: int = 100,
+                 flush_interval: float = 1.):
 
-        self.function_map = {'csv': self._write_csv_buffered,
+        self.function_map = {'csv': self._write_csv_rows,
+                             'npy': self._write_npy_rows,
                              'tb': self._write_tb}
 
         # modes must be known to logic
@@ -64,17 +99,29 @@ class Logger():
         self._modes = modes
         self._sources = sources
         self._directory = directory
-        self._csv_chunksize = csv_chunksize
-        self._tb_chunksize = tb_chunksize
+        self._chunksizes = {'csv': csv_chunksize,
+                            'npy': npy_chunksize,
+                            'tb': tb_chunksize}
+        self._flush_interval = flush_interval
 
         # generate paths and storage
         self._filepaths = self._gen_filepaths()
         self._buffers = self._gen_buffers()
-        self._csv_headers = {}
+        self._csv_files: Dict[str, Tuple[TextIO, csv.DictWriter]] = {}
+        self._npy_indices: Dict[str, dict] = {}
+        # values that could not be written to npy files
+        self.dropped_values = 0
 
         for mode, filepath in self._filepaths.items():
             print("%s logs will be saved at %s" % (mode, filepath))
 
+        # THREADS
+        self._queue = queue.SimpleQueue()
+        self._thread = Thread(target=self._write_loop,
+                              daemon=True,
+                              name='logging_thread')
+        self._thread.start()
+
     def _gen_buffers(self) -> Dict[str, Dict[str, Deque[CsvRowtype]]]:
         """Return a dictionary that is intended for use as buffer for all modes known.
         """
@@ -91,7 +138,8 @@ class Logger():
     def log(self,
             source: str,
             log_data: Dict[str, Any]):
-        """Prepare :py:attr:`log_data` inplace and write in all modes declared on initialization.
+        """Prepare :py:attr:`log_data` inplace and queue it for writing
+        in all modes declared on initialization.
 
         Parameters
         ----------
@@ -101,14 +149,17 @@ class Logger():
             The data that shall be logged :py:attr:`log_data`.
         """
         self._prep_data(log_data)
-
-        for mode in self._modes:
-            self.function_map[mode](source, log_data)
+        self._queue.put((source, log_data))
 
     def _prep_data(self,
                    log_data: Dict[str, Any]) -> CsvRowtype:
         """Clean and transform a data dictionary inplace.
 
+        Tensors in CPU memory are replaced by their first element as number.
+        Other tensors are replaced by a copy of their first element,
+        which is converted later by :py:meth:`_convert_tensors()`.
+        Copying does not synchronize with the device of the tensor.
+
         Parameters
         ----------
         log_data: `dict`
@@ -118,88 +169,145 @@ class Logger():
         if 'frame' in log_data.keys():
             del log_data['frame']
 
-        # transform all tensors in log_data
+        # detach all tensors in log_data from memory that could be changed later
         for key, value in log_data.items():
-            if isinstance(value, torch.Tensor):
-                log_data[key] = value.detach() \
-                    .cpu() \
-                    .numpy() \
-                    .flatten()[0]
+            if not isinstance(value, torch.Tensor):
+                continue
+            if value.device.type == 'cpu':
+                log_data[key] = value.detach().numpy().flat[0]
+            else:
+                log_data[key] = value.detach().reshape(-1)[0].clone()
 
-    def _write_tb(self,
-                  source: str,
-                  log_data: Dict[str, Any]):
-        """Prepare :py:attr:`log_data` inplace and write to Tensorboard.
+    @staticmethod
+    def _convert_tensors(rows: List[Dict[str, Any]]):
+        """Replaces all tensors in :py:attr:`rows` inplace by numbers.
 
-        Warnings
-        --------
-        Not yet implemented.
+        Tensors of the same column are copied to CPU memory together.
 
         Parameters
         ----------
-        source: `str`
-            The :py:attr:`source` this :py:attr:`log_data` shall be written to.
-        log_data: `dict`
-            The data that shall be logged :py:attr:`log_data`.
+        rows: `list` of `dict`
+            Rows as prepared by :py:meth:`_prep_data()`.
+        """
+        columns = {}
+        for i, row in enumerate(rows):
+            for key, value in row.items():
+                if isinstance(value, torch.Tensor):
+                    columns.setdefault(key, []).append(i)
+
+        for key, indices in columns.items():
+            values = [rows[i][key] for i in indices]
+            try:
+                converted = torch.stack(values).cpu().numpy()
+            except RuntimeError:  # values on different devices
+                converted = [value.cpu().numpy() for value in values]
+            for i, value in zip(indices, converted):
+                rows[i][key] = value
+
+    def _write_loop(self):
+        """Buffers and writes queued data until :py:meth:`close()` is called.
+
+        Intended for use as :py:obj:`threading.Thread`.
         """
+        last_flush = time.time()
+        while True:
+            try:
+                source, data = self._queue.get(
+                    timeout=max(last_flush + self._flush_interval - time.time(), 0.))
+            except queue.Empty:
+                source, data = _FLUSH, None
+
+            if source in (_FLUSH, _CLOSE):
+                self._write_buffers()
+                last_flush = time.time()
+                if data is not None:
+                    data.set()
+                if source == _CLOSE:
+                    break
+                continue
+
+            for mode in self._modes:
+                buffer = self._buffers[mode][source]
+                buffer.append(data)
+                # write, if buffer has enough entries
+                if len(buffer) >= self._chunksizes[mode]:
+                    self._write_buffer(mode, source)
 
     def write_buffers(self):
-        """Write and clear all buffers.
+        """Waits until all data logged so far is written.
         """
-        for source in self._sources:
-            self._write_buffer(source, True)
+        self._put_control(_FLUSH)
 
-    def _write_buffer(self, source: str, clear: bool = False):
-        """Load and write the buffer registered with :py:attr:`source`.
+    def close(self):
+        """Writes all data logged so far, stops the writing thread and closes all files.
+        """
+        self._put_control(_CLOSE)
+        self._thread.join()
 
-         Clear data that has been written.
+        for csvfile, _ in self._csv_files.values():
+            csvfile.close()
+        self._csv_files = {}
+        self._npy_indices = {}
+
+    def _put_control(self, command: str):
+        """Queues :py:attr:`command` and waits until the writing thread executed it.
+        """
+        if not self._thread.is_alive():
+            return
+        done = Event()
+        self._queue.put((command, done))
+        done.wait()
+
+    def _write_buffers(self):
+        """Write and clear all buffers.
+        """
+        for mode in self._modes:
+            for source in self._sources:
+                self._write_buffer(mode, source)
+
+    def _write_buffer(self, mode: str, source: str):
+        """Write and clear the buffer registered with :py:attr:`mode` and :py:attr:`source`.
 
         Parameters
         ----------
+        mode: `str`
+            The mode this buffer is written in.
         source: `str`
             The source this data relates to. This declares the writing destination.
-        clear: `bool`
-            Set True if *whole* buffer shall be written and cleared
         """
-        # gen filepath
-        path = self._filepaths['csv']
-        filename = "/".join([path, source]) + ".csv"
+        buffer = self._buffers[mode][source]
+        if len(buffer) == 0:
+            return
 
-        # pop buffer
-        buffer = self._buffers['csv'][source]
-        n_rows = len(buffer) if clear else self._csv_chunksize
-        rows = [buffer.popleft() for _ in range(n_rows)]
+        rows = list(buffer)
+        buffer.clear()
+        self._convert_tensors(rows)
+        self.function_map[mode](source, rows)
 
-        if n_rows > 0:
-            self._write_csv_rows(filename, rows)
+    def _write_tb(self,
+                  source: str,
+                  rows: List[CsvRowtype]):
+        """Write :py:attr:`rows` to Tensorboard.
 
-    def _write_csv_buffered(self,
-                            source: str,
-                            log_data: Dict[str, Any]):
-        """Write :py:attr:`log_data` to registered :py:attr:`source` with a buffer.
+        Warnings
+        --------
+        Not yet implemented.
 
         Parameters
         ----------
         source: `str`
-            The :py:attr:`source` this :py:attr:`log_data` shall be written to.
-        log_data: `dict`
-            The data that shall be logged :py:attr:`log_data`.
+            The :py:attr:`source` these :py:attr:`rows` shall be written to.
+        rows: `list` of `dict`
+            The data that shall be logged.
         """
-        # append buffer
-        buffer = self._buffers['csv'][source]
-        buffer.append(log_data)
-
-        # write, if buffer has enough entries
-        if len(buffer) >= self._csv_chunksize:
-            self._write_buffer(source)
 
     def _get_header(self,
                     filename: str,
                     csv_columns: List[str]) -> List[str]:
-        """Write and return a valid csv header (a `list` of column names).
+        """Return a valid csv header (a `list` of column names).
 
         If available, use header of already existing file.
-        Create a header for the given list of columns and write file, otherwise.
+        Use the given list of columns, otherwise.
 
         Parameters
         ----------
@@ -209,67 +317,258 @@ class Logger():
             A list of column names that shall be used.
         """
         # pylint: disable=invalid-name
-
-        # If csv file does not exist, create it
         if not os.path.isfile(filename):
-            csv_header = csv_columns
-            self._write_csv_header(filename, csv_columns)
-        # Else, open it
-        else:
-            with open(filename) as f:
-                reader = csv.reader(f, delimiter=',')
-                csv_header = next(reader)
+            return list(csv_columns)
+
+        with open(filename) as f:
+            reader = csv.reader(f, delimiter=',')
+            return next(reader, list(csv_columns))
+
+    def _get_csv_writer(self,
+                        source: str,
+                        csv_columns: List[str]) -> csv.DictWriter:
+        """Return the writer of the csv file of :py:attr:`source`.
+
+        On first use, the file is opened and kept open.
+        A header is written, if the file is new.
+
+        Parameters
+        ----------
+        source: `str`
+            The source this data relates to.
+        csv_columns: `list` of `str`
+            A list of column names that shall be used for a new file.
+        """
+        if source not in self._csv_files:
+            filename = "/".join([self._filepaths['csv'], source]) + ".csv"
+            header = self._get_header(filename, csv_columns)
+            is_new = not os.path.isfile(filename) or os.path.getsize(filename) == 0
+
+            # pylint: disable=consider-using-with
+            csvfile = open(filename, 'a', newline='')
+            writer = csv.DictWriter(csvfile,
+                                    delimiter=',',
+                                    fieldnames=header)
+            if is_new:
+                writer.writeheader()
+            self._csv_files[source] = (csvfile, writer)
 
-        return csv_header
+        return self._csv_files[source][1]
 
     def _write_csv_rows(self,
-                        filename: str,
+                        source: str,
                         rows: List[CsvRowtype]):
-        """Wrapper for writing rows of data into a csv file.
-
-        Invokes :py:meth:`_get_header()` to get a viable hear for wanted :py:attr:`filename`.
-        Writes csv rows into this file.
+        """Write :py:attr:`rows` into the csv file of :py:attr:`source`.
 
         Parameters
         ----------
-        filename: `str`
-            The destination filename.
+        source: `str`
+            The :py:attr:`source` these :py:attr:`rows` shall be written to.
         rows: `list` of csv rows (`dict`)
             The data as `list`.
         """
-        # get the csv header csv columns
-        csv_columns = rows[0].keys()
-
-        if filename not in self._csv_headers.keys():
-            self._csv_headers[filename] = self._get_header(
-                filename, csv_columns)
-
         try:
-            with open(filename, 'a') as csvfile:
-                writer = csv.DictWriter(csvfile,
-                                        delimiter=',',
-                                        fieldnames=self._csv_headers[filename])
-                writer.writerows(rows)
+            writer = self._get_csv_writer(source, rows[0].keys())
+            writer.writerows(rows)
+            self._csv_files[source][0].flush()
         except IOError:
             print("I/O error")
+        except ValueError as error:  # rows do not match the header
+            print("Can not write %s logs: %s" % (source, error))
+
+    def _get_npy_index(self, source: str) -> dict:
+        """Return the index of the npy files of :py:attr:`source`.
 
-    def _write_csv_header(self,
-                          filename: str,
-                          header: List[str]):
-        """Wrapper for writing only the header into a csv file
+        On first use, an existing index is loaded.
+        Columns are truncated to the rows recorded in the index,
+        which drops rows of a write that was interrupted.
 
         Parameters
         ----------
-        filename: `str`
-            The destination filename.
-        header: `list` of `str`
-            A list of column names.
+        source: `str`
+            The source this data relates to.
+        """
+        if source not in self._npy_indices:
+            directory = os.path.join(self._filepaths['npy'], source)
+            os.makedirs(directory, exist_ok=True)
+            try:
+                with open(os.path.join(directory, NPY_INDEX_FILENAME), 'r',
+                          encoding='utf-8') as index_file:
+                    index = json.load(index_file)
+            except FileNotFoundError:
+                index = {'rows': 0, 'columns': {}}
+
+            for column, dtype in index['columns'].items():
+                _write_npy_data(os.path.join(directory, column + '.npy'),
+                                np.zeros(0, dtype=dtype), index['rows'])
+            self._npy_indices[source] = index
+
+        return self._npy_indices[source]
+
+    def _write_npy_rows(self,
+                        source: str,
+                        rows: List[CsvRowtype]):
+        """Append :py:attr:`rows` column by column to the npy files of :py:attr:`source`.
+
+        Updates the index after all columns are written.
+        Missing values and values that can not be stored,
+        e.g. sequences, are filled with ``nan``, or an empty string in string columns.
+        The latter are counted in :py:attr:`self.dropped_values`.
+
+        Parameters
+        ----------
+        source: `str`
+            The :py:attr:`source` these :py:attr:`rows` shall be written to.
+        rows: `list` of rows (`dict`)
+            The data as `list`.
         """
         try:
-            with open(filename, 'w') as csvfile:
-                writer = csv.DictWriter(csvfile,
-                                        delimiter=',',
-                                        fieldnames=header)
-                writer.writeheader()
+            index = self._get_npy_index(source)
+            directory = os.path.join(self._filepaths['npy'], source)
+
+            columns = list(index['columns'])
+            columns += [key for row in rows for key in row.keys()
+                        if key not in index['columns'] and key not in columns]
+            for column in columns:
+                path = os.path.join(directory, column + '.npy')
+                if column in index['columns']:
+                    stored_dtype = np.dtype(index['columns'][column])
+                    values = self._npy_column_values(source, column, rows, stored_dtype)
+                else:
+                    values = self._npy_column_values(source, column, rows)
+                    # rows written before the column existed are filled
+                    stored_dtype = _widen(values.dtype, values, fill=index['rows'] > 0)
+                    _write_npy_data(path,
+                                    np.full(index['rows'], _fill_value(stored_dtype),
+                                            dtype=stored_dtype),
+                                    0)
+                    index['columns'][column] = stored_dtype.str
+
+                dtype = _widen(stored_dtype, values)
+                if dtype != stored_dtype:
+                    # rewrite the column with a dtype that holds both old and new values
+                    stored = np.load(path, mmap_mode='r')[:index['rows']]
+                    _write_npy_data(path, stored.astype(dtype), 0)
+                    del stored
+                    index['columns'][column] = dtype.str
+                _write_npy_data(path, values.astype(dtype), index['rows'])
+            index['rows'] += len(rows)
+
+            # replace index atomically, it declares which rows are complete
+            index_path = os.path.join(directory, NPY_INDEX_FILENAME)
+            with open(index_path + '.tmp', 'w', encoding='utf-8') as index_file:
+                json.dump(index, index_file)
+            os.replace(index_path + '.tmp', index_path)
         except IOError:
             print("I/O error")
+
+    def _npy_column_values(self,
+                           source: str,
+                           column: str,
+                           rows: List[CsvRowtype],
+                           dtype: np.dtype = None) -> np.ndarray:
+        """Returns the values of :py:attr:`column` in :py:attr:`rows` as 1-dimensional array.
+
+        Missing values are filled, the dtype is widened to hold the fill value if needed.
+        If the values can not be stored, all are filled and counted as dropped.
+        If no value is present, the filled values have the given :py:attr:`dtype`.
+        """
+        present = [column in row for row in rows]
+        if not all(_is_scalar(row[column]) for row in rows if column in row):
+            # e.g. sequences, only scalars are kept
+            kept = [column in row and _is_scalar(row[column]) for row in rows]
+            dropped = sum(present) - sum(kept)
+            self.dropped_values += dropped
+            print("Can not write %s logs of column %s, %d values dropped."
+                  % (source, column, dropped))
+            present = kept
+
+        values = [row[column] for row, is_present in zip(rows, present) if is_present]
+        values = np.asarray(values, dtype=dtype if not values else None)
+        if all(present):
+            return values
+        dtype = _widen(values.dtype, values, fill=True)
+        fill = _fill_value(dtype)
+        return np.asarray([row[column] if is_present else fill
+                           for row, is_present in zip(rows, present)],
+                          dtype=dtype)
+
+
+def _is_scalar(value) -> bool:
+    """Returns True, if :py:attr:`value` can be stored in a npy column.
+    """
+    value = np.asarray(value)
+    return value.ndim == 0 and not value.dtype.hasobject
+
+
+def _widen(dtype: np.dtype, values: np.ndarray, fill: bool = False) -> np.dtype:
+    """Returns the smallest dtype that holds values of :py:attr:`dtype` and :py:attr:`values`,
+    and the fill value of missing values, if :py:attr:`fill` is set.
+
+    Mixing strings and numbers results in strings.
+    """
+    try:
+        dtype = np.result_type(dtype, values)
+    except TypeError:
+        # numpy does not promote numbers to strings
+        dtype = np.result_type(np.asarray(np.zeros(0, dtype=dtype).astype(str)),
+                               values.astype(str))
+    if fill and dtype.kind not in 'US':
+        dtype = np.result_type(dtype, np.float64)
+    return dtype
+
+
+def _fill_value(dtype: np.dtype):
+    """Returns the value that fills missing values of :py:attr:`dtype`.
+    """
+    return '' if dtype.kind in 'US' else np.nan
+
+
+def _write_npy_data(path: str, values: np.ndarray, offset: int):
+    """Writes 1-dimensional :py:attr:`values` into the npy file at :py:attr:`path`,
+    starting at row :py:attr:`offset`, and truncates the file behind them.
+
+    The file is created, if it does not exist.
+    Its header declares the new number of rows.
+    """
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+        values.dtype.str, offset + len(values))
+    header = header.encode('latin1').ljust(_NPY_HEADER_LENGTH - len(_NPY_MAGIC) - 3) + b'\n'
+    header = _NPY_MAGIC + len(header).to_bytes(2, 'little') + header
+
+    mode = 'r+b' if os.path.isfile(path) else 'w+b'
+    # pylint: disable=invalid-name
+    with open(path, mode) as f:
+        f.seek(_NPY_HEADER_LENGTH + offset * values.dtype.itemsize)
+        f.write(values.tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(header)
+
+
+def load_npy_log(directory: str,
+                 as_dataframe: bool = False) -> Union[Dict[str, np.ndarray], 'pandas.DataFrame']:
+    """Loads a log written by a :py:class:`Logger` in mode ``'npy'``.
+
+    Columns are memory mapped read-only, so loading does not depend on the size of the log.
+    Only rows recorded in the index are returned.
+
+    Parameters
+    ----------
+    directory: `str`
+        The directory of a single source, e.g. ``<save_path>/npy/episodes``.
+    as_dataframe: `bool`
+        Set True, if a :py:class:`pandas.DataFrame` shall be returned
+        instead of a dictionary of arrays. Requires :py:mod:`pandas`.
+    """
+    with open(os.path.join(directory, NPY_INDEX_FILENAME), 'r', encoding='utf-8') as index_file:
+        index = json.load(index_file)
+
+    columns = {column: np.load(os.path.join(directory, column + '.npy'),
+                               mmap_mode='r')[:index['rows']]
+               for column in index['columns']}
+    if not as_dataframe:
+        return columns
+
+    import pandas  # pylint: disable=import-outside-toplevel
+    return pandas.DataFrame(columns, copy=False)
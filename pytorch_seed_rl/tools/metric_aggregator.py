@@ -0,0 +1,214 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=empty-docstring
+"""
+"""
+import math
+from threading import Lock
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+# values closer to zero are counted as zero
+_MIN_VALUE = 1e-9
+
+
+class QuantileSketch():
+    """Quantile sketch of fixed memory with relative accuracy guarantees.
+
+    Values are counted in logarithmically sized buckets, separately for positive
+    and negative values, as proposed for DDSketch by Masson et al. (2019).
+    Estimated quantiles deviate from the true ones by at most a factor
+    of :py:attr:`relative_accuracy`.
+    If a sign holds more than :py:attr:`max_buckets` buckets,
+    the buckets of smallest magnitude are merged, which only affects the accuracy of
+    quantiles closest to zero.
+
+    Parameters
+    ----------
+    relative_accuracy: `float`
+        The relative accuracy of estimated quantiles.
+    max_buckets: `int`
+        The maximum number of buckets per sign.
+    """
+
+    def __init__(self,
+                 relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048):
+        assert 0 < relative_accuracy < 1
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._max_buckets = max_buckets
+
+        self.count = 0
+        self._zeros = 0
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+
+    def add(self, value: float):
+        """Adds a single :py:attr:`value`.
+        """
+        self.count += 1
+        if value > _MIN_VALUE:
+            store = self._positive
+        elif value < -_MIN_VALUE:
+            store, value = self._negative, -value
+        else:
+            self._zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        store[key] = store.get(key, 0) + 1
+        if len(store) > self._max_buckets:
+            self._collapse(store)
+
+    def add_array(self, values: Union[np.ndarray, Sequence[float]]):
+        """Adds all :py:attr:`values` at once.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        self.count += len(values)
+        self._zeros += int(np.count_nonzero(np.abs(values) <= _MIN_VALUE))
+        for store, magnitudes in ((self._positive, values[values > _MIN_VALUE]),
+                                  (self._negative, -values[values < -_MIN_VALUE])):
+            if len(magnitudes) == 0:
+                continue
+            keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma),
+                                     return_counts=True)
+            for key, count in zip(keys.astype(np.int64).tolist(), counts.tolist()):
+                store[key] = store.get(key, 0) + count
+            if len(store) > self._max_buckets:
+                self._collapse(store)
+
+    def _collapse(self, store: Dict[int, int]):
+        """Merges the buckets of smallest magnitude of :py:attr:`store`,
+        until it holds :py:attr:`self._max_buckets` buckets.
+        """
+        keys = sorted(store)
+        excess = len(keys) - self._max_buckets
+        target = keys[excess]
+        store[target] += sum(store.pop(key) for key in keys[:excess])
+
+    def _value(self, key: int) -> float:
+        """Returns the representative value of bucket :py:attr:`key`.
+        """
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Returns the estimated :py:attr:`q`-quantile, or ``nan``, if no value was added.
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+
+        seen = 0
+        # from the most negative to the most positive value
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self._zeros
+        if seen > rank:
+            return 0.
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+        return math.nan
+
+
+class MetricAggregator():
+    """Aggregates streams of metrics over windows in fixed memory.
+
+    For each metric, count, mean, minimum, maximum and the given quantiles
+    of all values added since the last call of :py:meth:`emit()` are kept.
+    Quantiles are estimated by a :py:class:`QuantileSketch`.
+
+    Values can be added from multiple threads.
+
+    Parameters
+    ----------
+    names: `list` of `str`
+        The names of aggregated metrics.
+    quantiles: `list` of `float`
+        The quantiles that are emitted for each metric.
+    relative_accuracy: `float`
+        The relative accuracy of estimated quantiles.
+    """
+
+    def __init__(self,
+                 names: List[str],
+                 quantiles: Sequence[float] = (0.5, 0.9, 0.99),
+                 relative_accuracy: float = 0.01):
+        self._names = names
+        self._quantiles = quantiles
+        self._relative_accuracy = relative_accuracy
+
+        self._lock = Lock()
+        self._windows = self._gen_windows()
+
+    def _gen_windows(self) -> Dict[str, dict]:
+        """Returns empty windows for all metrics.
+        """
+        return {name: {'sum': 0.,
+                       'min': math.inf,
+                       'max': -math.inf,
+                       'sketch': QuantileSketch(self._relative_accuracy)}
+                for name in self._names}
+
+    def add(self, name: str, value: float):
+        """Adds a single :py:attr:`value` of metric :py:attr:`name`.
+        """
+        value = float(value)
+        with self._lock:
+            window = self._windows[name]
+            window['sum'] += value
+            window['min'] = min(window['min'], value)
+            window['max'] = max(window['max'], value)
+            window['sketch'].add(value)
+
+    def add_array(self, name: str, values: Union[np.ndarray, Sequence[float]]):
+        """Adds all :py:attr:`values` of metric :py:attr:`name` at once.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if len(values) == 0:
+            return
+        with self._lock:
+            window = self._windows[name]
+            window['sum'] += float(values.sum())
+            window['min'] = min(window['min'], float(values.min()))
+            window['max'] = max(window['max'], float(values.max()))
+            window['sketch'].add_array(values)
+
+    def emit(self) -> Dict[str, float]:
+        """Returns the statistics of the current windows as flat dictionary
+        and starts new windows.
+
+        Keys are the metric name followed by ``_count``, ``_mean``, ``_min``, ``_max``
+        and e.g. ``_p90`` for the 0.9-quantile.
+        Statistics of metrics without values are ``nan``.
+        """
+        with self._lock:
+            windows, self._windows = self._windows, self._gen_windows()
+
+        row = {}
+        for name, window in windows.items():
+            count = window['sketch'].count
+            row['%s_count' % name] = count
+            row['%s_mean' % name] = window['sum'] / count if count > 0 else math.nan
+            row['%s_min' % name] = window['min'] if count > 0 else math.nan
+            row['%s_max' % name] = window['max'] if count > 0 else math.nan
+            for q in self._quantiles:
+                row['%s_p%s' % (name, ('%g' % (100 * q)).replace('.', '_'))] = \
+                    window['sketch'].quantile(q)
+        return row
@@ -0,0 +1,146 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=empty-docstring
+"""
+"""
+import math
+import numbers
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Callable, Dict
+
+import numpy as np
+import torch
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsServer():
+    """Serves metrics over HTTP in the Prometheus text exposition format.
+
+    On each request to ``/metrics``, every source function is called on the serving thread
+    and all numeric values it returns are rendered as gauges
+    named ``<prefix>_<source>_<key>``.
+    Source functions read the current state of their owner without locking,
+    so serving never blocks the owner, but values of one response
+    may stem from slightly different points in time.
+
+    Parameters
+    ----------
+    sources: `dict` of `callable`
+        Functions by source name that return a dictionary of metrics.
+    port: `int`
+        The port to listen on. A free port is chosen, if 0.
+    host: `str`
+        The address to listen on. Defaults to localhost only.
+    prefix: `str`
+        The prefix of all metric names.
+    """
+
+    def __init__(self,
+                 sources: Dict[str, Callable[[], dict]],
+                 port: int = 0,
+                 host: str = '127.0.0.1',
+                 prefix: str = 'seed_rl'):
+        self._sources = sources
+        self._prefix = prefix
+
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Answers requests to ``/metrics``.
+                """
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """Suppresses logging of each request.
+                """
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self.address = self._httpd.server_address
+
+        self._thread = Thread(target=self._httpd.serve_forever,
+                              daemon=True,
+                              name='metrics_server_thread')
+        self._thread.start()
+        print("Metrics are served at http://%s:%d/metrics" % self.address[:2])
+
+    def render(self) -> str:
+        """Returns the current metrics of all sources in the text exposition format.
+        """
+        lines = []
+        for source, metrics_fn in self._sources.items():
+            try:
+                metrics = metrics_fn() or {}
+            except Exception as error:  # pylint: disable=broad-except
+                # sources are read without locks and may be changed meanwhile
+                lines.append('# source %s failed: %s' % (source, error))
+                continue
+            for key, value in metrics.items():
+                value = _to_number(value)
+                if value is None:
+                    continue
+                name = _sanitize('%s_%s_%s' % (self._prefix, source, key))
+                lines.append('# TYPE %s gauge' % name)
+                lines.append('%s %s' % (name, _format_number(value)))
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Stops serving and closes the socket.
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+def _to_number(value) -> float:
+    """Returns :py:attr:`value` as number, or ``None``, if it is not a single number.
+    """
+    if isinstance(value, torch.Tensor):
+        value = value.item() if value.numel() == 1 else None
+    elif isinstance(value, np.ndarray):
+        value = value.item() if value.size == 1 else None
+    if isinstance(value, (bool, np.bool_)):
+        return float(value)
+    if isinstance(value, numbers.Number):
+        return float(value)
+    return None
+
+
+def _format_number(value: float) -> str:
+    """Formats :py:attr:`value` as in the text exposition format.
+    """
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def _sanitize(name: str) -> str:
+    """Replaces characters that are not allowed in metric names.
+    """
+    return re.sub(r'[^a-zA-Z0-9_:]', '_', name)
@@ -0,0 +1,71 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=empty-docstring
+"""
+"""
+from typing import List
+
+import torch
+from torch import nn
+
+
+class ModelSync():
+    """Object that copies parameters and buffers of a model into a replica inplace.
+
+    Pairs of source and target tensors are bound once on initiation.
+    Each :py:meth:`copy()` then writes all target tensors with a single
+    multi-tensor operation, if both models live on the same device.
+    Unlike :py:meth:`torch.nn.Module.load_state_dict()`,
+    this neither builds a state dict nor validates keys.
+
+    The replica must have been created as copy of the source model, e.g. by
+    :py:func:`copy.deepcopy()`, and tensors of both models must only be changed inplace,
+    as optimizers and :py:meth:`~torch.nn.Module.load_state_dict()` do.
+
+    Parameters
+    ----------
+    source: :py:class:`torch.nn.Module`
+        The model whose parameters and buffers are copied.
+    target: :py:class:`torch.nn.Module`
+        The replica that is overwritten.
+    """
+
+    def __init__(self,
+                 source: nn.Module,
+                 target: nn.Module):
+        self._source = self._tensors(source)
+        self._target = self._tensors(target)
+
+        assert len(self._source) == len(self._target)
+        assert all(s.shape == t.shape for s, t in zip(self._source, self._target))
+
+        self._foreach = (hasattr(torch, '_foreach_copy_') and
+                         all(s.device == t.device for s, t in zip(self._source, self._target)))
+
+    @staticmethod
+    def _tensors(model: nn.Module) -> List[torch.Tensor]:
+        """Returns all parameters and buffers of :py:attr:`model` in a fixed order.
+        """
+        return [t.data for t in model.parameters()] + list(model.buffers())
+
+    @torch.no_grad()
+    def copy(self):
+        """Copies all parameters and buffers of the source model into the target model.
+        """
+        if self._foreach:
+            torch._foreach_copy_(self._target, self._source)  # pylint: disable=protected-access
+        else:
+            for target, source in zip(self._target, self._source):
+                target.copy_(source)
@@ -16,13 +16,19 @@
 """
 """
 import os
+import time
+from threading import Lock
 from typing import Any, Dict, List
 
 import imageio
 import numpy as np
 import torch
+import torch.multiprocessing as mp
 
 from .logger import Logger
+from .metric_aggregator import MetricAggregator
+
+AGGREGATED_METRICS = ['return', 'length', 'latency', 'policy_lag']
 
 
 class Recorder():
@@ -30,6 +36,16 @@ class Recorder():
 
     This spawns a :py:class:`~.Logger`.
 
+    Recorded frames are copied to CPU memory, checked and written as gif
+    by a background process, which is started with the first gif.
+    Frames are dropped and counted in :py:attr:`self.dropped_frames`, if recorded frames
+    and frames of gifs waiting to be written exceed :py:attr:`max_recording_bytes`.
+
+    Episode returns, lengths and latencies, and policy lags given to :py:meth:`aggregate()`
+    are aggregated by a :py:class:`~.MetricAggregator`.
+    Aggregates are logged as source ``'aggregates'``
+    every :py:attr:`aggregate_interval` seconds, if new values arrived.
+
     Parameters
     ----------
     save_path: `str`
@@ -39,29 +55,60 @@ class Recorder():
     max_gif_length: `int`
         The maximum number of frames that shall be saved as a single gif.
         Set to 0 (default), if no limit shall be enforced.
+    log_modes: `list` of `str`
+        The modes of the :py:class:`~.Logger`. Default: ``['csv']``.
+    max_recording_bytes: `int`
+        The maximum memory in bytes held by recorded frames, that are not written yet.
+    aggregate_interval: `float`
+        The interval of logging aggregates in seconds.
+    log_episodes: `bool`
+        Set False, if no row shall be logged per episode, only aggregates.
     """
 
     def __init__(self,
                  save_path='',
                  render=False,
-                 max_gif_length=10000):
+                 max_gif_length=10000,
+                 log_modes=None,
+                 max_recording_bytes=2**28,
+                 aggregate_interval=10.,
+                 log_episodes=True):
         # ATTRIBUTES
         self._save_path = save_path
         self._render = render
         self._max_gif_length = max_gif_length
-        self._logger = Logger(['episodes', 'training', 'system'],
+        self._logger = Logger(['episodes', 'training', 'system', 'aggregates'],
                               self._save_path,
-                              modes=['csv'])
+                              modes=log_modes or ['csv'])
+        self._max_recording_bytes = max_recording_bytes
+        self._aggregator = MetricAggregator(AGGREGATED_METRICS)
+        self._aggregate_interval = aggregate_interval
+        self._log_episodes = log_episodes
+        self._t_start = time.time()
+        self._last_aggregate = self._t_start
+        self._new_aggregates = False
+        self._lock_aggregates = Lock()
+        self.aggregates = {}
+
         # COUNTERS
         self.episodes_seen = 0
         self.trajectories_seen = 0
+        self.dropped_frames = 0
 
         # STORAGE
         self.mean_latency = 0.
+        self.mean_metrics = {}
         self.rec_frames = []
         self.record_eps_id = None
         self.best_return = None
         self.record_return = 0
+        self._rec_checks = True
+        self._rec_bytes = 0
+
+        # gif writing process and the bytes of frames it has not written yet
+        self._gif_queue = None
+        self._gif_process = None
+        self._gif_bytes = mp.Value('q', 0)
 
     def log(self,
             key: str,
@@ -77,6 +124,56 @@ class Recorder():
         """
         self._logger.log(key, in_data)
 
+    @property
+    def dropped_log_values(self) -> int:
+        """The number of logged values that could not be written, see :py:class:`~.Logger`.
+        """
+        return self._logger.dropped_values
+
+    def aggregate(self, key: str, values: np.ndarray):
+        """Adds :py:attr:`values` to the aggregates of metric :py:attr:`key`.
+
+        Parameters
+        ----------
+        key: `str`
+            The metric, one of :py:data:`AGGREGATED_METRICS`.
+        values: :py:obj:`numpy.ndarray`
+            The values to add.
+        """
+        self._aggregator.add_array(key, values)
+        self._new_aggregates = True
+        self._log_aggregates()
+
+    def _log_aggregates(self, force: bool = False):
+        """Logs and resets aggregates, if :py:attr:`self._aggregate_interval` passed.
+        """
+        now = time.time()
+        if not (force or now - self._last_aggregate >= self._aggregate_interval):
+            return
+        # another thread is logging aggregates right now
+        if not self._lock_aggregates.acquire(blocking=force):
+            return
+        try:
+            self._last_aggregate = now
+            if self._new_aggregates:
+                self._new_aggregates = False
+                self.aggregates = {'runtime': now - self._t_start,
+                                   'episodes_seen': self.episodes_seen,
+                                   **self._aggregator.emit()}
+                self._logger.log('aggregates', dict(self.aggregates))
+        finally:
+            self._lock_aggregates.release()
+
+    def close(self):
+        """Writes all logged data and gifs and closes the :py:class:`~.Logger`.
+        """
+        self._log_aggregates(force=True)
+        self._logger.close()
+        if self._gif_process is not None:
+            self._gif_queue.put(None)
+            self._gif_process.join()
+            self._gif_process = None
+
     def log_trajectory(self, trajectory: dict):
         """Extracts and logs episode data from a completed trajectory.
 
@@ -122,7 +219,7 @@ class Recorder():
                         (trajectory['states']['episode_step'][i] > 10*60*24)):
 
                     self.record_eps_id = None
-                    self.rec_frames = []
+                    self._clear_frames()
 
     def _log_episode(self,
                      trajectory: dict,
@@ -142,43 +239,55 @@ class Recorder():
         state = {k: v[i] for k, v in trajectory['states'].items()}
         metrics = {k: v[i] for k, v in trajectory['metrics'].items()}
 
-        latency = metrics['latency'].item()
-        self.mean_latency = self.mean_latency + \
-            (latency - self.mean_latency) / self.episodes_seen
+        # running means of all metrics sent by actors
+        for key, value in metrics.items():
+            mean = self.mean_metrics.get(key, 0.)
+            self.mean_metrics[key] = mean + (value.item() - mean) / self.episodes_seen
+        self.mean_latency = self.mean_metrics['latency']
+
+        self._aggregator.add('return', state['episode_return'].item())
+        self._aggregator.add('length', state['episode_step'].item())
+        self._aggregator.add('latency', metrics['latency'].item())
+        self._new_aggregates = True
 
-        episode_data = {
-            'episode_id': state['episode_id'],
-            'return': state['episode_return'],
-            'length': state['episode_step'],
-            'training_steps': state['training_steps'],
-        }
+        if self._log_episodes:
+            episode_data = {
+                'episode_id': state['episode_id'],
+                'return': state['episode_return'],
+                'length': state['episode_step'],
+                'training_steps': state['training_steps'],
+            }
+            self._logger.log('episodes', episode_data)
 
-        self._logger.log('episodes', episode_data)
+        self._log_aggregates()
 
     def _record_frame(self, frame: torch.Tensor, checks=True):
-        """Copies a frame and appends it to the internal buffer.
+        """Copies a frame to CPU memory and appends it to the internal buffer.
 
-        The frame is checked, if it's a black screen or equal to
-        the last frame recorded.
+        If :py:attr:`checks` is set, the gif writing process skips the frame,
+        if it's a black screen or equal to the last frame recorded.
+        The frame is dropped, if the memory limit of recordings is reached.
 
         Parameters
         ----------
         frame: :py:obj:`torch.Tensor`
             The frame to record.
         """
-        frame = frame[0, 0].clone().to('cpu').numpy()
+        frame = frame[0, 0]
+        nbytes = frame.numel() * frame.element_size()
+        if self._rec_bytes + self._gif_bytes.value + nbytes > self._max_recording_bytes:
+            self.dropped_frames += 1
+            return
 
-        # skip black screens (should not happen)
-        if checks:
-            if np.sum(frame) > 0:
-                if len(self.rec_frames) > 0:
-                    # skip frame, if it did not change
-                    if not np.array_equal(frame, self.rec_frames[-1]):
-                        self.rec_frames.append(frame)
-                else:
-                    self.rec_frames.append(frame)
-        else:
-            self.rec_frames.append(frame)
+        self.rec_frames.append(frame.to('cpu', copy=True))
+        self._rec_bytes += nbytes
+        self._rec_checks = checks
+
+    def _clear_frames(self):
+        """Empties :py:attr:`self.rec_frames`.
+        """
+        self.rec_frames = []
+        self._rec_bytes = 0
 
     def _record_episode(self, check_return=True):
         """Empties :py:attr:`self.rec_frames` and writes a gif, if episode score is a new record.
@@ -200,30 +309,78 @@ class Recorder():
             fname = "e%d" % (self.record_eps_id)
             self._write_gif(self.rec_frames, fname)
         self.record_eps_id = None
-        self.rec_frames = []
+        self._clear_frames()
 
     def _write_gif(self,
-                   frames: List[np.ndarray],
+                   frames: List[torch.Tensor],
                    filename: str):
-        """Writes a gif file made off the list of :py:attr:`frames`
+        """Queues the list of :py:attr:`frames` to be written as gif file
         using the given :py:attr:`filename`.
 
+        Starts the gif writing process, if needed.
+
         Parameters
         ----------
-        frames: `list` of py:obj:`numpy.ndarray`
-            A list of images as numpy arrays.
+        frames: `list` of py:obj:`torch.Tensor`
+            A list of images as tensors in CPU memory.
         filename: `str`
             A name for the created gif file.
         """
-        rec_array = np.asarray(frames, dtype='uint8')
-        # [T, H, W]
-
         directory = os.path.join(self._save_path, 'gif')
         os.makedirs(directory, exist_ok=True)
-
         fpath = os.path.join(directory, '%s.gif' % filename)
+
+        if self._gif_process is None:
+            self._gif_queue = mp.Queue()
+            self._gif_process = mp.Process(target=_write_gifs,
+                                           args=(self._gif_queue, self._gif_bytes),
+                                           daemon=True,
+                                           name='gif_process')
+            self._gif_process.start()
+
+        # stacked frames are moved to shared memory instead of pickled
+        with self._gif_bytes.get_lock():
+            self._gif_bytes.value += self._rec_bytes
+        self._gif_queue.put((torch.stack(frames), fpath, self._rec_checks, self._rec_bytes))
+
+
+def _write_gifs(gif_queue: mp.Queue, gif_bytes: mp.Value):
+    """Writes gifs of frames received through :py:attr:`gif_queue` until ``None`` is received.
+
+    Intended for use as :py:obj:`multiprocessing.Process`.
+
+    Parameters
+    ----------
+    gif_queue: :py:obj:`multiprocessing.Queue`
+        Queue of tuples of stacked frames, file path, if frames shall be checked,
+        and the number of bytes the frames held when recorded.
+    gif_bytes: :py:obj:`multiprocessing.Value`
+        Number of bytes of frames that are not written yet.
+    """
+    torch.set_num_threads(1)
+    while True:
+        item = gif_queue.get()
+        if item is None:
+            break
+        frames, fpath, checks, nbytes = item
+        frames = frames.numpy()
+
+        if checks:
+            # skip black screens (should not happen) and frames that did not change
+            kept = []
+            for frame in frames:
+                if np.sum(frame) > 0 and (len(kept) == 0 or not np.array_equal(frame, kept[-1])):
+                    kept.append(frame)
+            frames = kept
+
+        rec_array = np.asarray(frames, dtype='uint8')
+        # [T, H, W]
         try:
-            imageio.mimsave(fpath, rec_array, fps=20)
+            if len(rec_array) > 0:
+                imageio.mimsave(fpath, rec_array, fps=20)
         except ValueError:
-            print(rec_array.shape)
-            raise ValueError
+            print("Can not write gif %s of shape %s" % (fpath, rec_array.shape))
+        finally:
+            del frames, rec_array, item
+            with gif_bytes.get_lock():
+                gif_bytes.value -= nbytes
@@ -0,0 +1,91 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for collective operations of data-parallel learning processes.
+
+Every test spawns a group of CPU processes using the gloo backend.
+"""
+import copy
+import socket
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch import nn
+
+from pytorch_seed_rl.agents import data_parallel
+
+
+def assert_allclose(actual, desired):
+    return np.testing.assert_allclose(actual, desired, rtol=1e-06, atol=1e-05)
+
+
+def _free_port():
+    """Returns a currently unused local port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _model(seed):
+    torch.manual_seed(seed)
+    return nn.Linear(4, 2)
+
+
+def _loss(model, rank):
+    torch.manual_seed(100 + rank)
+    return model(torch.randn(8, 4)).pow(2).sum()
+
+
+def _run_group(rank, world_size, port):
+    data_parallel.init_process_group(rank, world_size, port)
+
+    # every process starts with different parameters
+    model = _model(rank)
+    data_parallel.broadcast_parameters(model)
+    for param, expected in zip(model.parameters(), _model(0).parameters()):
+        assert_allclose(param.detach(), expected.detach())
+
+    # gradients equal the mean of all processes gradients
+    reference = copy.deepcopy(model)
+    sum(_loss(reference, r) for r in range(world_size)).backward()
+
+    _loss(model, rank).backward()
+    total_steps = data_parallel.all_reduce_gradients(model.parameters(),
+                                                     world_size,
+                                                     rank + 1)
+    assert total_steps == sum(range(1, world_size + 1))
+    for param, expected in zip(model.parameters(), reference.parameters()):
+        assert_allclose(param.grad, expected.grad / world_size)
+
+    # every process must be ready, a single process can shut down all
+    assert data_parallel.agree(True, False) == (True, False)
+    assert data_parallel.agree(rank != 1, False) == (False, False)
+    assert data_parallel.agree(True, rank == world_size - 1) == (True, True)
+
+    data_parallel.destroy_process_group()
+
+
+def _spawn(world_size):
+    mp.spawn(_run_group,
+             args=(world_size, _free_port()),
+             nprocs=world_size,
+             join=True)
+
+
+def test_data_parallel_2_processes():
+    _spawn(2)
+
+
+def test_data_parallel_4_processes():
+    _spawn(4)
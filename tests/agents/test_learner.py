@@ -0,0 +1,124 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the policy lag handling of the learner.
+
+The learner is not constructed, as this requires rpc.
+Its methods are tested on instances that only hold the used attributes.
+"""
+import numpy as np
+import torch
+from torch import nn
+
+from pytorch_seed_rl.agents.learner import POLICY_LAG_BINS, Learner
+
+T, B, A = 5, 4, 3
+
+
+class _Recorder():
+    def __init__(self):
+        self.aggregated = {}
+
+    def aggregate(self, key, values):
+        self.aggregated[key] = values
+
+
+class _Model(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.linear = nn.Linear(4, A + 1)
+
+    def forward(self, inputs, sample_action=True):  # pylint: disable=arguments-differ
+        out = self.linear(inputs['frame'])
+        return {'policy_logits': out[..., :A], 'baseline': out[..., A]}, ()
+
+
+def _learner(max_policy_lag=0, policy_lag_mode='drop', training_epoch=10):
+    learner = Learner.__new__(Learner)
+    learner.training_epoch = training_epoch
+    learner.training_steps = 1000
+    learner.policy_lag_histogram = torch.zeros(len(POLICY_LAG_BINS), dtype=torch.long)
+    learner.recorder = _Recorder()
+    learner._max_policy_lag = max_policy_lag
+    learner._policy_lag_mode = policy_lag_mode
+    return learner
+
+
+def _batch(versions):
+    torch.manual_seed(0)
+    return {'frame': torch.randn(T, B, 4),
+            'action': torch.randint(A, (T, B)),
+            'action_log_prob': torch.full((T, B), -np.log(A)),
+            'reward': torch.randn(T, B),
+            'done': torch.zeros(T, B, dtype=torch.bool),
+            # stored as floats like the episode return, see Learner.process_batch()
+            'policy_version': torch.as_tensor(versions, dtype=torch.float).expand(T, B).clone(),
+            'training_steps': torch.full((T, B), 900.),
+            'current_length': torch.full((B,), T - 1)}
+
+
+def test_measure_policy_lag():
+    learner = _learner()
+    batch = _batch([10, 9, 7, 2])
+    # the oldest state of a trajectory defines its lag
+    batch['policy_version'][1:, 0] = 12
+
+    metrics = learner._measure_policy_lag(batch)
+    assert metrics['policy_lag_max'] == 8
+    assert metrics['policy_lag_mean'] == (0 + 1 + 3 + 8) / 4
+    assert metrics['policy_lag_steps_mean'] == 100
+    assert metrics['stale_trajectories'] == 0
+    assert 'weight' not in batch
+    np.testing.assert_array_equal(learner.recorder.aggregated['policy_lag'], [0, 1, 3, 8])
+
+    # bins of POLICY_LAG_BINS are lower bounds
+    expected = np.zeros(len(POLICY_LAG_BINS), dtype=np.int64)
+    for lag in (0, 1, 3, 8):
+        expected[np.searchsorted(POLICY_LAG_BINS, lag, side='right') - 1] += 1
+    np.testing.assert_array_equal(learner.policy_lag_histogram.numpy(), expected)
+    assert learner.policy_lag_histogram.tolist() == [1, 1, 1, 0, 1, 0, 0, 0]
+
+
+def test_policy_lag_drop():
+    learner = _learner(max_policy_lag=2)
+    batch = _batch([10, 9, 8, 2])
+    metrics = learner._measure_policy_lag(batch)
+    assert metrics['stale_trajectories'] == 1
+    assert batch['weight'].tolist() == [1., 1., 1., 0.]
+
+
+def test_policy_lag_weight():
+    weights = Learner._policy_lag_weights(torch.tensor([0., 2., 4., 8.]), 2, 'weight')
+    assert weights.tolist() == [1., 1., 0.5, 0.25]
+
+
+def _update(batch):
+    model = _Model()
+    optimizer = torch.optim.RMSprop(model.parameters(), lr=0.01)
+    scheduler = Learner._build_scheduler(optimizer, T * B, 10**6)
+    before = [param.detach().clone() for param in model.parameters()]
+    batch_length, _ = Learner._update(model, optimizer, scheduler, batch)
+    changed = any(not torch.equal(old, new) for old, new in zip(before, model.parameters()))
+    return batch_length, changed, scheduler.last_epoch
+
+
+def test_update_counts_kept_trajectories():
+    batch = _batch([0] * B)
+    batch['weight'] = torch.tensor([1., 0., 1., 0.])
+    assert _update(batch) == (2 * (T - 1), True, 1)
+
+
+def test_update_skips_dropped_batch():
+    batch = _batch([0] * B)
+    batch['weight'] = torch.zeros(B)
+    assert _update(batch) == (0, False, 0)
@@ -0,0 +1,182 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for Atari preprocessing wrappers."""
+
+import functools
+
+import gym
+import numpy as np
+import pytest
+import torch
+
+from pytorch_seed_rl.environments import atari_wrappers
+from pytorch_seed_rl.environments.vec_env import BatchedAtariVecEnv
+
+RAW_SHAPE = (42, 32, 3)
+
+
+class FakeAle():
+    """Mimics the lives counter of the arcade learning environment."""
+
+    def __init__(self):
+        self.num_lives = 0
+
+    def lives(self):
+        return self.num_lives
+
+
+class FakeAtariEnv(gym.Env):
+    """Random, but seeded Atari-like environment with lives."""
+
+    observation_space = gym.spaces.Box(0, 255, RAW_SHAPE, np.uint8)
+
+    def __init__(self, seed: int, action_meanings: list, max_steps: int = 300):
+        self._action_meanings = action_meanings
+        self.action_space = gym.spaces.Discrete(len(action_meanings))
+        self._max_steps = max_steps
+        self._steps = 0
+        self._rng = np.random.RandomState(seed)
+        self._np_random = np.random.RandomState(seed + 1)
+        self.ale = FakeAle()
+
+    def get_action_meanings(self):
+        return self._action_meanings
+
+    def _frame(self):
+        return self._rng.randint(0, 256, RAW_SHAPE, dtype=np.uint8)
+
+    def reset(self, **kwargs):  # pylint: disable=arguments-differ
+        self._steps = 0
+        self.ale.num_lives = 3
+        return self._frame()
+
+    def step(self, action):
+        self._steps += 1
+        if self._rng.rand() < 0.02:
+            self.ale.num_lives -= 1
+        done = self.ale.num_lives == 0 or self._steps == self._max_steps
+        return self._frame(), float(self._rng.rand() * action), done, {}
+
+
+def _make_chain(seed: int, action_meanings: list):
+    env = FakeAtariEnv(seed, action_meanings)
+    env = atari_wrappers.MaxAndSkipEnv(atari_wrappers.NoopResetEnv(env, noop_max=30), skip=4)
+    env = atari_wrappers.wrap_deepmind(env, clip_rewards=False, frame_stack=True, scale=False)
+    return atari_wrappers.DictObservationsEnv(atari_wrappers.wrap_pytorch(env))
+
+
+def _make_fused_preprocessing(seed: int, action_meanings: list):
+    return atari_wrappers.FusedAtariEnv(FakeAtariEnv(seed, action_meanings))
+
+
+def _make_fused(seed: int, action_meanings: list):
+    return atari_wrappers.DictObservationsEnv(_make_fused_preprocessing(seed, action_meanings))
+
+
+def _assert_obs_equal(actual: dict, desired: dict):
+    assert actual.keys() == desired.keys()
+    for key, value in desired.items():
+        assert actual[key].shape == value.shape, key
+        np.testing.assert_array_equal(actual[key].numpy(), value.numpy(), err_msg=key)
+
+
+@pytest.mark.parametrize('action_meanings', [['NOOP', 'FIRE', 'RIGHT', 'LEFT'],
+                                             ['NOOP', 'RIGHT', 'LEFT']])
+def test_fused_atari_env(action_meanings):
+    chain = _make_chain(0, action_meanings)
+    fused = _make_fused(0, action_meanings)
+    assert fused.observation_space.shape == chain.observation_space.shape
+
+    _assert_obs_equal(fused.initial(), chain.initial())
+
+    # recorded actions, long enough for lost lives and episode ends
+    actions = np.random.RandomState(1).randint(0, len(action_meanings), 400)
+    real_dones = 0
+    for action in actions:
+        action = torch.tensor([[action]])
+        desired = chain.step(action)
+        _assert_obs_equal(fused.step(action), desired)
+        real_dones += desired['real_done'].item()
+    assert real_dones > 1
+
+
+@pytest.mark.parametrize('num_threads', [1, 2])
+def test_batched_atari_vec_env(num_threads):
+    action_meanings = ['NOOP', 'FIRE', 'RIGHT', 'LEFT']
+    num_envs = 4
+    envs = [_make_fused(i, action_meanings) for i in range(num_envs)]
+    vec_env = BatchedAtariVecEnv([_make_fused(i, action_meanings) for i in range(num_envs)],
+                                 num_threads)
+    try:
+        for actual, desired in zip(vec_env.initial(), [env.initial() for env in envs]):
+            _assert_obs_equal(actual, desired)
+
+        rng = np.random.RandomState(1)
+        real_dones = 0
+        for _ in range(300):
+            # step all, contiguous or scattered subsets of environments
+            actions = {i: torch.tensor([[rng.randint(len(action_meanings))]])
+                       for i in np.flatnonzero(rng.rand(num_envs) < 0.6)}
+            for i, action in actions.items():
+                vec_env.step_async(i, action)
+            results = vec_env.step_wait()
+            assert results.keys() == actions.keys()
+            for i, action in actions.items():
+                desired = envs[i].step(action)
+                _assert_obs_equal(results[i], desired)
+                real_dones += desired['real_done'].item()
+        assert real_dones > 1
+    finally:
+        vec_env.close()
+
+
+def test_dict_observations_inplace():
+    action_meanings = ['NOOP', 'FIRE', 'RIGHT']
+    env = _make_fused(0, action_meanings)
+    inplace_env = atari_wrappers.DictObservationsEnv(
+        atari_wrappers.FusedAtariEnv(FakeAtariEnv(0, action_meanings)), inplace=True)
+
+    record = inplace_env.initial()
+    _assert_obs_equal(record, env.initial())
+
+    for action in np.random.RandomState(1).randint(0, len(action_meanings), 300):
+        action = torch.tensor([[action]])
+        obs = inplace_env.step(action)
+        assert obs is record
+        _assert_obs_equal(obs, env.step(action))
+
+
+def test_background_reset_env():
+    action_meanings = ['NOOP', 'FIRE', 'RIGHT']
+    env = atari_wrappers.DictObservationsEnv(atari_wrappers.BackgroundResetEnv(
+        functools.partial(_make_fused_preprocessing, 0, action_meanings)))
+    env.initial()
+
+    instances = {id(env.env.env)}
+    real_dones = 0
+    try:
+        for action in np.random.RandomState(1).randint(0, len(action_meanings), 400):
+            active = env.env.env
+            obs = env.step(torch.tensor([[action]]))
+            if obs['real_done'].item():
+                # a fresh game from the spare instance is swapped in
+                real_dones += 1
+                assert env.env.env is not active
+            elif obs['done'].item():
+                # lost lives are handled inline
+                assert env.env.env is active
+            instances.add(id(env.env.env))
+    finally:
+        env.close()
+    assert real_dones > 1 and len(instances) == 2
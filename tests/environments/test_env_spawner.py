@@ -0,0 +1,64 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the environment spawner."""
+
+import os
+
+from pytorch_seed_rl.environments import EnvSpawner, env_spawner
+from pytorch_seed_rl.environments.synthetic_env import SYNTHETIC_ENV_ID
+
+
+def _make_spawner(num_envs: int, frame_shape: tuple, **kwargs):
+    return EnvSpawner(SYNTHETIC_ENV_ID, num_envs,
+                      synthetic_config={'frame_shape': frame_shape, 'num_actions': 3},
+                      **kwargs)
+
+
+def test_env_info_cache(tmp_path):
+    cache_dir = str(tmp_path)
+    spawner = _make_spawner(2, (2, 8, 8), cache_dir=cache_dir)
+    assert not spawner.env_info_cached
+    assert len(os.listdir(cache_dir)) == 1
+
+    cached = _make_spawner(4, (2, 8, 8), cache_dir=cache_dir)
+    assert cached.env_info_cached
+    assert cached.env_info['num_envs'] == 4
+    assert cached.env_info['observation_space'] == spawner.env_info['observation_space']
+    assert cached.env_info['action_space'] == spawner.env_info['action_space']
+    assert cached.placeholder_obs.keys() == spawner.placeholder_obs.keys()
+
+    # a different configuration is cached separately
+    other = _make_spawner(2, (1, 8, 8), cache_dir=cache_dir)
+    assert not other.env_info_cached
+    assert other.env_info['observation_space'].shape == (1, 8, 8)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_spawn_threads():
+    spawner = _make_spawner(5, (2, 8, 8), spawn_threads=3)
+    envs = spawner.spawn()
+    assert len(envs) == 5 and len({id(env) for env in envs}) == 5
+    for env in envs:
+        assert env.initial().keys() == spawner.placeholder_obs.keys()
+        env.close()
+
+
+def test_env_info_cache_source_version(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    _make_spawner(2, (2, 8, 8), cache_dir=cache_dir)
+
+    # infos cached by other wrapper code are not reused
+    monkeypatch.setattr(env_spawner, '_source_hash', lambda: 'changed')
+    assert not _make_spawner(2, (2, 8, 8), cache_dir=cache_dir).env_info_cached
+    assert len(os.listdir(cache_dir)) == 2
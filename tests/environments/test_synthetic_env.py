@@ -0,0 +1,45 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the synthetic environment."""
+
+import torch
+
+from pytorch_seed_rl.environments import EnvSpawner
+from pytorch_seed_rl.environments.synthetic_env import SYNTHETIC_ENV_ID
+
+
+def test_env_spawner():
+    spawner = EnvSpawner(SYNTHETIC_ENV_ID, 2,
+                         synthetic_config={'frame_shape': (2, 8, 8),
+                                           'num_actions': 3,
+                                           'min_episode_length': 3,
+                                           'max_episode_length': 5})
+    assert spawner.env_info['observation_space'].shape == (2, 8, 8)
+    assert spawner.env_info['action_space'].n == 3
+    assert spawner.placeholder_obs['frame'].shape == (1, 1, 2, 8, 8)
+
+    env = spawner.spawn()[0]
+    initial = env.initial()
+    assert initial.keys() == spawner.placeholder_obs.keys()
+
+    episode_lengths = []
+    for _ in range(50):
+        obs = env.step(torch.tensor([[2]]))
+        assert obs['frame'].dtype == torch.uint8
+        assert obs['frame'].shape == (1, 1, 2, 8, 8)
+        if obs['done'].item():
+            episode_lengths.append(obs['episode_step'].item())
+    env.close()
+
+    assert episode_lengths and all(3 <= length <= 5 for length in episode_lengths)
@@ -0,0 +1,86 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for environments stepping in worker processes."""
+
+import functools
+
+import gym
+import numpy as np
+import torch
+
+from pytorch_seed_rl.environments import atari_wrappers
+from pytorch_seed_rl.environments.vec_env import SubprocVecEnv
+
+FRAME_SHAPE = (4, 6, 5)
+
+
+class CountingEnv(gym.Env):
+    """Deterministic environment whose frames encode the step count and last action."""
+
+    observation_space = gym.spaces.Box(0, 255, FRAME_SHAPE[1:] + FRAME_SHAPE[:1], np.uint8)
+    action_space = gym.spaces.Discrete(3)
+
+    def __init__(self, seed: int, episode_length: int = 3):
+        self._seed = seed
+        self._episode_length = episode_length
+        self._step = 0
+        # mimics EpisodicLifeEnv
+        self.was_real_done = True
+
+    def _frame(self, action: int = 0):
+        return np.full(self.observation_space.shape,
+                       self._seed * 10 + self._step + action, dtype=np.uint8)
+
+    def reset(self, **kwargs):  # pylint: disable=arguments-differ
+        self._step = 0
+        return self._frame()
+
+    def step(self, action):
+        self._step += 1
+        done = self._step == self._episode_length
+        self.was_real_done = done
+        return self._frame(action), float(action), done, {}
+
+
+def _make_env(seed: int):
+    return atari_wrappers.DictObservationsEnv(
+        atari_wrappers.wrap_pytorch(CountingEnv(seed)))
+
+
+def _assert_obs_equal(actual: dict, desired: dict):
+    assert actual.keys() == desired.keys()
+    for key, value in desired.items():
+        np.testing.assert_array_equal(np.asarray(actual[key]), np.asarray(value), err_msg=key)
+
+
+def test_subproc_vec_env():
+    num_envs = 3
+    envs = [_make_env(i) for i in range(num_envs)]
+    vec_env = SubprocVecEnv([functools.partial(_make_env, i) for i in range(num_envs)],
+                            FRAME_SHAPE)
+    try:
+        for actual, desired in zip(vec_env.initial(), [env.initial() for env in envs]):
+            _assert_obs_equal(actual, desired)
+
+        for step in range(5):
+            actions = [torch.tensor([[(step + i) % 3]]) for i in range(num_envs)]
+            desired = [env.step(action) for env, action in zip(envs, actions)]
+            actual = vec_env.step(actions)
+            for i in range(num_envs):
+                _assert_obs_equal(actual[i], desired[i])
+                assert actual[i]['frame'].dtype == torch.uint8
+                # frames are views of the shared buffer
+                assert actual[i]['frame'].data_ptr() == vec_env.frames[i].data_ptr()
+    finally:
+        vec_env.close()
@@ -0,0 +1,132 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the fused IMPALA loss against its separately computed components."""
+
+import numpy as np
+import torch
+from torch.nn import functional as F
+
+from pytorch_seed_rl.functional import impala, loss, vtrace
+
+
+def assert_allclose(actual, desired):
+    return np.testing.assert_allclose(actual, desired, rtol=1e-06, atol=1e-05)
+
+
+def _inputs(seq_len=7, batch_size=3, num_actions=5):
+    """Returns random inputs for loss computation."""
+    torch.manual_seed(0)
+    return {
+        "behavior_policy_logits": torch.randn(seq_len, batch_size, num_actions,
+                                              dtype=torch.float64),
+        "target_policy_logits": torch.randn(seq_len, batch_size, num_actions,
+                                            dtype=torch.float64,
+                                            requires_grad=True),
+        "values": torch.randn(seq_len, batch_size, dtype=torch.float64,
+                              requires_grad=True),
+        "bootstrap_value": torch.randn(batch_size, dtype=torch.float64),
+        "actions": torch.randint(0, num_actions, (seq_len, batch_size)),
+        "discounts": torch.full((seq_len, batch_size), 0.99, dtype=torch.float64),
+        "rewards": torch.randn(seq_len, batch_size, dtype=torch.float64),
+    }
+
+
+def _separate_losses(values):
+    """Computes the loss components the way they are computed separately."""
+    vtrace_returns = vtrace.from_logits(**values)
+    pg_loss = loss.policy_gradient(values["target_policy_logits"],
+                                   values["actions"],
+                                   vtrace_returns.pg_advantages)
+    baseline_loss = F.mse_loss(values["values"],
+                               vtrace_returns.vs,
+                               reduction='sum')
+    entropy_loss = loss.entropy(values["target_policy_logits"])
+    return pg_loss, baseline_loss, entropy_loss, vtrace_returns
+
+
+def test_entropy_from_log_probs():
+    logits = torch.randn(4, 2, 6, dtype=torch.float64)
+    assert_allclose(loss.entropy(logits),
+                    loss.entropy_from_log_probs(F.log_softmax(logits, dim=-1)))
+
+
+def test_policy_gradient_from_log_probs():
+    logits = torch.randn(4, 2, 6, dtype=torch.float64)
+    actions = torch.randint(0, 6, (4, 2))
+    advantages = torch.randn(4, 2, dtype=torch.float64)
+    action_log_probs = vtrace._action_log_probs(logits, actions)  # pylint: disable=protected-access
+
+    assert_allclose(loss.policy_gradient(logits, actions, advantages),
+                    loss.policy_gradient_from_log_probs(action_log_probs, advantages))
+
+
+def test_losses_from_logits():
+    values = _inputs()
+    pg_loss, baseline_loss, entropy_loss, vtrace_returns = _separate_losses(values)
+    output = impala.losses_from_logits(**values)
+
+    assert_allclose(pg_loss.detach(), output.pg_loss.detach())
+    assert_allclose(baseline_loss.detach(), output.baseline_loss.detach())
+    assert_allclose(entropy_loss.detach(), output.entropy_loss.detach())
+    for a, b in zip(vtrace_returns, output.vtrace_returns):
+        assert_allclose(a.detach(), b.detach())
+
+
+def test_losses_from_logits_grad():
+    values = _inputs()
+    total_loss = sum(_separate_losses(values)[:3])
+    total_loss.backward()
+    expected_grads = [values["target_policy_logits"].grad.clone(),
+                      values["values"].grad.clone()]
+
+    values["target_policy_logits"].grad = None
+    values["values"].grad = None
+    output = impala.losses_from_logits(**values)
+    total_loss = output.pg_loss + output.baseline_loss + output.entropy_loss
+    total_loss.backward()
+
+    assert_allclose(values["target_policy_logits"].grad, expected_grads[0])
+    assert_allclose(values["values"].grad, expected_grads[1])
+
+
+def test_losses_from_action_log_probs():
+    values = _inputs()
+    expected = impala.losses_from_logits(**values)
+
+    behavior_policy_logits = values.pop("behavior_policy_logits")
+    values["behavior_action_log_probs"] = vtrace._action_log_probs(  # pylint: disable=protected-access
+        behavior_policy_logits, values["actions"])
+    output = impala.losses_from_action_log_probs(**values)
+
+    for a, b in zip(expected[:3], output[:3]):
+        assert_allclose(a.detach(), b.detach())
+    for a, b in zip(expected.vtrace_returns, output.vtrace_returns):
+        assert_allclose(a.detach(), b.detach())
+
+
+def test_losses_weights():
+    values = _inputs()
+    expected = impala.losses_from_logits(**values)
+    output = impala.losses_from_logits(**values, weights=torch.ones(3, dtype=torch.float64))
+    for a, b in zip(expected[:3], output[:3]):
+        assert_allclose(a.detach(), b.detach())
+
+    # weighting a trajectory with 0 equals dropping it
+    weights = torch.tensor([1., 0., 1.], dtype=torch.float64)
+    output = impala.losses_from_logits(**values, weights=weights)
+    kept = {key: value[..., [0, 2], :] if value.dim() == 3 else value[..., [0, 2]]
+            for key, value in values.items()}
+    expected = impala.losses_from_logits(**kept)
+    for a, b in zip(expected[:3], output[:3]):
+        assert_allclose(a.detach(), b.detach())
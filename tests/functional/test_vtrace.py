@@ -247,3 +247,67 @@ def test_higher_rank_inputs_for_importance_weights():
     }
     output = vtrace._from_importance_weights(**values)
     assert output.vs.shape == (T, B, 42)
+
+
+def test_discounted_reverse_scan():
+    """Tests the vectorized scan against the python loop for several sequence lengths."""
+    for seq_len in [1, 7, 8, 20, 80, 321]:
+        deltas = torch.randn(seq_len, 3, dtype=torch.float64)
+        factors = torch.rand(seq_len, 3, dtype=torch.float64)
+        # episode ends
+        factors[::5, 0] = 0.
+
+        acc = torch.zeros(3, dtype=torch.float64)
+        ground_truth = []
+        for t in range(seq_len - 1, -1, -1):
+            acc = deltas[t] + factors[t] * acc
+            ground_truth.append(acc)
+        ground_truth.reverse()
+
+        for chunk_size in [2, 3, 8, 400]:
+            output = vtrace._discounted_reverse_scan(deltas, factors, chunk_size)
+            assert_allclose(torch.stack(ground_truth), output)
+
+
+def test_vtrace_vectorized(batch_size=5):
+    """Tests vectorized V-trace against the python loop implementation."""
+    for seq_len in [5, 20, 80, 320]:
+        log_rhos = torch.randn(seq_len, batch_size)
+        discounts = (torch.rand(seq_len, batch_size) > 0.05).float() * 0.99
+        values = {
+            "log_rhos": log_rhos,
+            "discounts": discounts,
+            "rewards": torch.randn(seq_len, batch_size),
+            "values": torch.randn(seq_len, batch_size),
+            "bootstrap_value": torch.randn(batch_size),
+            "clip_rho_threshold": 3.7,
+            "clip_pg_rho_threshold": 2.2,
+        }
+
+        output_loop = vtrace._from_importance_weights(vectorized=False, **values)
+        output_vectorized = vtrace._from_importance_weights(vectorized=True,
+                                                            **values)
+
+        for a, b in zip(output_loop, output_vectorized):
+            np.testing.assert_allclose(a, b, rtol=1e-05, atol=1e-04)
+
+
+def test_vtrace_vectorized_batch_1():
+    test_vtrace_vectorized(1)
+
+
+def test_higher_rank_inputs_vectorized():
+    """Checks support for additional dimensions in inputs of the vectorized scan."""
+    T = 3  # pylint: disable=invalid-name
+    B = 2  # pylint: disable=invalid-name
+    values = {
+        "log_rhos": torch.zeros(T, B, 1),
+        "discounts": torch.rand(T, B, 1),
+        "rewards": torch.randn(T, B, 42),
+        "values": torch.randn(T, B, 42),
+        "bootstrap_value": torch.randn(B, 42),
+    }
+    output_loop = vtrace._from_importance_weights(**values)
+    output_vectorized = vtrace._from_importance_weights(vectorized=True, **values)
+    assert output_vectorized.vs.shape == (T, B, 42)
+    assert_allclose(output_loop.vs, output_vectorized.vs)
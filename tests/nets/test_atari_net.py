@@ -0,0 +1,68 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the acting and training paths of AtariNet."""
+
+import numpy as np
+import torch
+
+from pytorch_seed_rl.nets import AtariNet
+
+OBSERVATION_SHAPE = (4, 84, 84)
+NUM_ACTIONS = 6
+
+
+def assert_allclose(actual, desired):
+    return np.testing.assert_allclose(actual, desired, rtol=1e-05, atol=1e-05)
+
+
+def _inputs(T, B):  # pylint: disable=invalid-name
+    torch.manual_seed(0)
+    return {
+        'frame': torch.randint(0, 255, (T, B) + OBSERVATION_SHAPE, dtype=torch.uint8),
+        'reward': torch.randn(T, B),
+        'done': torch.zeros(T, B, dtype=torch.bool),
+        'last_action': torch.randint(0, NUM_ACTIONS, (T, B)),
+    }
+
+
+def test_training_path():
+    model = AtariNet(OBSERVATION_SHAPE, NUM_ACTIONS)
+    inputs = _inputs(5, 3)
+
+    acting_outputs, _ = model(inputs)
+    training_outputs, _ = model(inputs, sample_action=False)
+
+    assert set(acting_outputs.keys()) == {'policy_logits', 'baseline',
+                                          'action', 'action_log_prob'}
+    assert set(training_outputs.keys()) == {'policy_logits', 'baseline'}
+    assert acting_outputs['action'].shape == (5, 3)
+    log_probs = torch.log_softmax(acting_outputs['policy_logits'], dim=-1)
+    assert_allclose(acting_outputs['action_log_prob'].detach(),
+                    log_probs.gather(-1, acting_outputs['action'].unsqueeze(-1)).squeeze(-1).detach())
+    for key in training_outputs.keys():
+        assert_allclose(acting_outputs[key].detach(), training_outputs[key].detach())
+
+
+def test_fold_input_scale():
+    model = AtariNet(OBSERVATION_SHAPE, NUM_ACTIONS)
+    inputs = _inputs(1, 4)
+
+    with torch.no_grad():
+        expected, _ = model(inputs, sample_action=False)
+        model.fold_input_scale()
+        model.fold_input_scale()  # folding twice has no effect
+        folded, _ = model(inputs, sample_action=False)
+
+    for key in expected.keys():
+        assert_allclose(folded[key], expected[key])
@@ -0,0 +1,76 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the batched evaluation loop."""
+
+import argparse
+import csv
+import math
+import os
+
+import pytest
+
+from pytorch_seed_rl.environments import EnvSpawner
+from pytorch_seed_rl.environments.synthetic_env import SYNTHETIC_ENV_ID
+from pytorch_seed_rl.eval import (_close, _interaction_loop, _normal_quantile,
+                                  _return_statistics)
+from pytorch_seed_rl.nets import AtariNet
+from pytorch_seed_rl.tools import Recorder
+
+
+@pytest.mark.parametrize('subprocess_envs', [False, True])
+def test_interaction_loop(tmp_path, subprocess_envs):
+    spawner = EnvSpawner(SYNTHETIC_ENV_ID, 3,
+                         subprocess_envs=subprocess_envs,
+                         synthetic_config={'min_episode_length': 2,
+                                           'max_episode_length': 6,
+                                           'reward_probability': 0.5,
+                                           'seed': 0})
+    model = AtariNet(spawner.env_info['observation_space'].shape,
+                     spawner.env_info['action_space'].n)
+    model.eval()
+    flags = argparse.Namespace(num_episodes=7, total_steps=0, render=False, verbose=False)
+    recorder = Recorder(save_path=str(tmp_path))
+
+    envs = spawner.spawn()
+    try:
+        returns, steps = _interaction_loop(flags, model, envs, recorder)
+    finally:
+        _close(envs)
+        recorder.close()
+
+    # exactly the wanted number of episodes is finished
+    assert len(returns) == 7
+    assert 7 * 2 <= steps <= 7 * 6
+    with open(os.path.join(str(tmp_path), 'csv', 'episodes.csv')) as f:
+        rows = list(csv.DictReader(f))
+    assert [float(row['return']) for row in rows] == returns
+
+
+def test_return_statistics():
+    stats = _return_statistics([1., 2., 3., 4.], confidence=0.95)
+    assert stats['episodes'] == 4
+    assert stats['return_mean'] == 2.5
+    assert stats['return_min'] == 1. and stats['return_max'] == 4.
+    half_width = 1.959964 * stats['return_std'] / 2
+    assert math.isclose(stats['return_ci_low'], 2.5 - half_width, rel_tol=1e-5)
+    assert math.isclose(stats['return_ci_high'], 2.5 + half_width, rel_tol=1e-5)
+
+    # a single episode has no interval
+    assert math.isnan(_return_statistics([1.])['return_ci_low'])
+
+
+def test_normal_quantile():
+    assert math.isclose(_normal_quantile(0.5), 0., abs_tol=1e-9)
+    assert math.isclose(_normal_quantile(0.975), 1.959964, rel_tol=1e-6)
+    assert math.isclose(_normal_quantile(0.005), -2.575829, rel_tol=1e-6)
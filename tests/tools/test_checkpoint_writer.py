@@ -0,0 +1,81 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the background checkpoint writer."""
+
+import os
+
+import pytest
+import torch
+
+from pytorch_seed_rl.tools import CheckpointWriter, checkpoint_writer
+
+
+def test_snapshot():
+    tensor = torch.ones(3, requires_grad=True)
+    data = {'state': {'weight': tensor}, 'list': [tensor, 1], 'epoch': 2}
+    snapshot = CheckpointWriter.snapshot(data)
+
+    with torch.no_grad():
+        tensor.add_(1.)
+
+    assert torch.equal(snapshot['state']['weight'], torch.ones(3))
+    assert torch.equal(snapshot['list'][0], torch.ones(3))
+    assert not snapshot['state']['weight'].requires_grad
+    assert snapshot['list'][1] == 1 and snapshot['epoch'] == 2
+
+
+def test_write(tmp_path):
+    writer = CheckpointWriter()
+    for epoch in range(5):
+        snapshot = writer.snapshot({'epoch': epoch, 'weight': torch.full((2,), epoch)})
+        writer.write(snapshot,
+                     os.path.join(str(tmp_path), 'checkpoint_%d.pt' % (epoch % 2)),
+                     metadata={'training_epoch': epoch})
+    writer.close()
+
+    assert sorted(os.listdir(str(tmp_path))) == ['checkpoint_0.pt',
+                                                 'checkpoint_1.pt',
+                                                 'manifest.json']
+    assert writer.checkpoints_written == 5
+    assert torch.load(os.path.join(str(tmp_path), 'checkpoint_0.pt'))['epoch'] == 4
+    assert torch.load(os.path.join(str(tmp_path), 'checkpoint_1.pt'))['epoch'] == 3
+
+
+def test_manifest(tmp_path):
+    path = str(tmp_path)
+    assert checkpoint_writer.read_manifest(path) is None
+    with pytest.raises(FileNotFoundError):
+        checkpoint_writer.load_latest(path)
+
+    writer = CheckpointWriter()
+    for epoch in range(3):
+        snapshot = writer.snapshot({'epoch': epoch, 'weight': torch.full((2,), epoch)})
+        writer.write(snapshot,
+                     os.path.join(path, 'checkpoint_%d.pt' % (epoch % 2)),
+                     metadata={'training_epoch': epoch})
+    writer.close()
+
+    manifest = checkpoint_writer.read_manifest(path)
+    assert manifest['training_epoch'] == 2
+    assert manifest['file'] == 'checkpoint_0.pt'
+
+    checkpoint = checkpoint_writer.load_latest(path, verify=True)
+    assert checkpoint['epoch'] == 2
+    assert torch.equal(checkpoint['weight'], torch.full((2,), 2))
+
+    # corrupt the latest checkpoint
+    with open(os.path.join(path, 'checkpoint_0.pt'), 'ab') as file:
+        file.write(b'0')
+    with pytest.raises(ValueError):
+        checkpoint_writer.load_latest(path, verify=True)
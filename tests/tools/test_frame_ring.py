@@ -0,0 +1,61 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the shared memory frame ring."""
+
+import pytest
+import torch
+
+from pytorch_seed_rl.tools import FrameRing
+from pytorch_seed_rl.tools.frame_ring import FRAME_RING_SUPPORTED
+
+pytestmark = pytest.mark.skipif(not FRAME_RING_SUPPORTED,
+                                reason="shared memory requires python 3.8")
+
+FRAME_SHAPE = (4, 6, 6)
+
+
+def _frame(value):
+    return torch.full((1, 1) + FRAME_SHAPE, value, dtype=torch.uint8)
+
+
+def test_write_read():
+    ring = FrameRing(3, FRAME_SHAPE)
+    writer = FrameRing.attach(ring.info())
+    try:
+        slots = torch.tensor([writer.write(env_id, _frame(env_id + 1)) for env_id in (2, 0)])
+        frames = ring.read(torch.tensor([2, 0]), slots)
+
+        assert frames.shape == (2,) + FRAME_SHAPE
+        assert torch.equal(frames[0], _frame(3)[0, 0])
+        assert torch.equal(frames[1], _frame(1)[0, 0])
+    finally:
+        writer.close()
+        ring.close()
+
+
+def test_slots_rotate():
+    ring = FrameRing(1, FRAME_SHAPE, num_slots=2)
+    try:
+        slots = [ring.write(0, _frame(value)) for value in (1, 2, 3)]
+        assert slots == [0, 1, 0]
+
+        # the oldest frame was overwritten, the previous one is kept
+        frames = ring.read(torch.tensor([0, 0]), torch.tensor([0, 1]))
+        assert frames[0].eq(3).all() and frames[1].eq(2).all()
+
+        # read frames are copies
+        frames[1].fill_(0)
+        assert ring.read(torch.tensor([0]), torch.tensor([1])).eq(2).all()
+    finally:
+        ring.close()
@@ -0,0 +1,136 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the asynchronous logger."""
+
+import csv
+import os
+import time
+
+import numpy as np
+import torch
+
+from pytorch_seed_rl.tools.logger import Logger, load_npy_log
+
+
+def _read_csv(directory: str, source: str) -> list:
+    with open(os.path.join(directory, 'csv', source + '.csv'), newline='') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+
+def test_log_csv(tmp_path):
+    directory = str(tmp_path)
+    logger = Logger(['episodes', 'system'], directory, modes=['csv'],
+                    csv_chunksize=4, flush_interval=60.)
+
+    value = torch.zeros(1, 1)
+    for i in range(10):
+        value.fill_(i)
+        # tensors may be changed after logging
+        logger.log('episodes', {'episode_id': i, 'return': value, 'frame': value})
+    logger.log('system', {'runtime': 1.5})
+
+    logger.write_buffers()
+    rows = _read_csv(directory, 'episodes')
+    assert [row['episode_id'] for row in rows] == [str(i) for i in range(10)]
+    assert [float(row['return']) for row in rows] == list(range(10))
+    assert 'frame' not in rows[0]
+    assert _read_csv(directory, 'system') == [{'runtime': '1.5'}]
+    logger.close()
+
+    # a new logger appends to existing files and keeps their header
+    logger = Logger(['episodes'], directory, modes=['csv'])
+    logger.log('episodes', {'return': 2., 'episode_id': 10})
+    logger.close()
+    rows = _read_csv(directory, 'episodes')
+    assert len(rows) == 11 and rows[-1] == {'episode_id': '10', 'return': '2.0'}
+
+
+def test_flush_interval(tmp_path):
+    directory = str(tmp_path)
+    logger = Logger(['training'], directory, modes=['csv'],
+                    csv_chunksize=100, flush_interval=0.05)
+    logger.log('training', {'loss': torch.tensor(0.5)})
+
+    deadline = time.time() + 5.
+    while not os.path.isfile(os.path.join(directory, 'csv', 'training.csv')):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    logger.close()
+    assert _read_csv(directory, 'training') == [{'loss': '0.5'}]
+
+
+def test_log_npy(tmp_path):
+    directory = str(tmp_path)
+    logger = Logger(['episodes'], directory, modes=['csv', 'npy'], npy_chunksize=3)
+    for i in range(10):
+        logger.log('episodes', {'episode_id': i,
+                                'return': torch.tensor([[i / 2]]),
+                                'done': torch.tensor(i % 2 == 0)})
+    logger.close()
+
+    log = load_npy_log(os.path.join(directory, 'npy', 'episodes'))
+    assert list(log) == ['episode_id', 'return', 'done']
+    np.testing.assert_array_equal(log['episode_id'], np.arange(10))
+    np.testing.assert_array_equal(log['return'], np.arange(10, dtype=np.float32) / 2)
+    assert log['return'].dtype == np.float32 and log['done'].dtype == np.bool_
+    assert len(_read_csv(directory, 'episodes')) == 10
+
+    # a new logger appends, rows beyond the index are dropped
+    with open(os.path.join(directory, 'npy', 'episodes', 'episode_id.npy'), 'ab') as npy_file:
+        npy_file.write(b'incomplete')
+    logger = Logger(['episodes'], directory, modes=['npy'])
+    logger.log('episodes', {'episode_id': 10, 'return': 5., 'done': True})
+    logger.close()
+
+    log = load_npy_log(os.path.join(directory, 'npy', 'episodes'))
+    np.testing.assert_array_equal(log['episode_id'], np.arange(11))
+    assert log['return'][-1] == 5. and log['done'][-1]
+
+
+def test_log_npy_widening(tmp_path):
+    directory = str(tmp_path)
+    logger = Logger(['training'], directory, modes=['npy'], npy_chunksize=2)
+    rows = [{'a': 0, 'b': 'x', 'c': True},
+            {'a': 1, 'b': 'y', 'c': False},
+            {'a': 0.7, 'b': 'longer string', 'c': 1},
+            {'a': 2.5, 'b': 'z', 'c': 2},
+            {'a': float('nan'), 'b': 'w', 'c': 3},
+            {'a': 3, 'b': 'v', 'c': 4}]
+    for row in rows:
+        logger.log('training', row)
+    logger.close()
+
+    # integers are widened to floats instead of truncating later values
+    log = load_npy_log(os.path.join(directory, 'npy', 'training'))
+    np.testing.assert_array_equal(log['a'], [0, 1, 0.7, 2.5, np.nan, 3])
+    assert log['b'].tolist() == [row['b'] for row in rows]
+    assert log['c'].tolist() == [1, 0, 1, 2, 3, 4]
+    assert logger.dropped_values == 0
+
+
+def test_log_npy_columns(tmp_path):
+    directory = str(tmp_path)
+    logger = Logger(['training'], directory, modes=['npy'], npy_chunksize=2)
+    logger.log('training', {'a': 1, 'b': 's'})
+    logger.log('training', {'a': 2, 'b': 't'})
+    # missing, new and unstorable values do not drop the other values of a chunk
+    logger.log('training', {'a': 3, 'c': 0.5})
+    logger.log('training', {'a': [4, 5], 'b': 'u', 'c': 1.5})
+    logger.close()
+
+    log = load_npy_log(os.path.join(directory, 'npy', 'training'))
+    np.testing.assert_array_equal(log['a'], [1, 2, 3, np.nan])
+    assert log['b'].tolist() == ['s', 't', '', 'u']
+    np.testing.assert_array_equal(log['c'], [np.nan, np.nan, 0.5, 1.5])
+    assert logger.dropped_values == 1
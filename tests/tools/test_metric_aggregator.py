@@ -0,0 +1,65 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for streaming metric aggregation."""
+
+import math
+
+import numpy as np
+import pytest
+
+from pytorch_seed_rl.tools import MetricAggregator
+from pytorch_seed_rl.tools.metric_aggregator import QuantileSketch
+
+
+@pytest.mark.parametrize('q', [0., 0.1, 0.5, 0.9, 0.99, 1.])
+def test_quantile_sketch(q):
+    rng = np.random.RandomState(0)
+    values = np.concatenate([rng.lognormal(3., 2., 5000),
+                             -rng.lognormal(1., 1., 2000),
+                             np.zeros(500)])
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.add_array(values[:4000])
+    for value in values[4000:]:
+        sketch.add(value)
+
+    desired = np.quantile(values, q, method='lower')
+    assert sketch.count == len(values)
+    assert sketch.quantile(q) == pytest.approx(desired, rel=0.01, abs=1e-9)
+
+
+def test_quantile_sketch_memory():
+    sketch = QuantileSketch(relative_accuracy=0.01, max_buckets=64)
+    sketch.add_array(np.logspace(-8, 8, 100000))
+    # pylint: disable=protected-access
+    assert len(sketch._positive) == 64
+    # the largest values are not affected by merged buckets
+    assert sketch.quantile(1.) == pytest.approx(1e8, rel=0.01)
+
+
+def test_metric_aggregator():
+    aggregator = MetricAggregator(['return', 'latency'], quantiles=(0.5, 0.99))
+    aggregator.add_array('return', [1., 2., 3.])
+    aggregator.add('return', 10.)
+
+    row = aggregator.emit()
+    assert row['return_count'] == 4
+    assert row['return_mean'] == 4. and row['return_min'] == 1. and row['return_max'] == 10.
+    assert row['return_p50'] == pytest.approx(2., rel=0.01)
+    assert row['return_p99'] == pytest.approx(3., rel=0.01)
+    assert row['latency_count'] == 0 and math.isnan(row['latency_p50'])
+
+    # a new window starts
+    aggregator.add('latency', 0.5)
+    row = aggregator.emit()
+    assert row['return_count'] == 0 and row['latency_mean'] == 0.5
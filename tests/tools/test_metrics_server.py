@@ -0,0 +1,62 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the metrics endpoint."""
+
+import math
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+import torch
+
+from pytorch_seed_rl.tools import MetricsServer
+
+
+def _failing_source():
+    raise RuntimeError("changed meanwhile")
+
+
+def test_metrics_server():
+    system = {'runtime': 1.5, 'queue_batches': 3}
+    server = MetricsServer({'system': lambda: system,
+                            'training': lambda: {'loss': torch.tensor([[0.25]]),
+                                                 'policy_lag_max': np.int64(2),
+                                                 'stale': math.nan,
+                                                 'name': 'skipped',
+                                                 'logits': torch.zeros(3)},
+                            'broken': _failing_source})
+    url = 'http://%s:%d' % server.address[:2]
+    try:
+        with urllib.request.urlopen(url + '/metrics') as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            lines = response.read().decode('utf-8').splitlines()
+        samples = [line for line in lines if not line.startswith('#')]
+        assert samples == ['seed_rl_system_runtime 1.5',
+                           'seed_rl_system_queue_batches 3.0',
+                           'seed_rl_training_loss 0.25',
+                           'seed_rl_training_policy_lag_max 2.0',
+                           'seed_rl_training_stale NaN']
+        assert '# TYPE seed_rl_system_runtime gauge' in lines
+        assert any(line.startswith('# source broken failed') for line in lines)
+
+        # values are read on each request
+        system['runtime'] = 2.
+        with urllib.request.urlopen(url + '/metrics') as response:
+            assert 'seed_rl_system_runtime 2.0' in response.read().decode('utf-8')
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + '/other')
+    finally:
+        server.close()
@@ -0,0 +1,65 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for inplace synchronization of model replicas."""
+
+import copy
+
+import torch
+from torch import nn
+
+from pytorch_seed_rl.tools import ModelSync
+
+
+def _model():
+    return nn.Sequential(nn.Linear(4, 8), nn.BatchNorm1d(8), nn.Linear(8, 2))
+
+
+def _assert_equal(source, target):
+    for key, value in source.state_dict().items():
+        assert torch.equal(value, target.state_dict()[key]), key
+
+
+def test_copy():
+    torch.manual_seed(0)
+    source = _model()
+    target = copy.deepcopy(source)
+    sync = ModelSync(source, target)
+
+    # change parameters and buffers of the source inplace
+    optimizer = torch.optim.SGD(source.parameters(), lr=0.1)
+    source(torch.randn(16, 4)).sum().backward()
+    optimizer.step()
+
+    sync.copy()
+    _assert_equal(source, target)
+
+    # tensors stay bound after loading a state dict
+    source.load_state_dict(_model().state_dict())
+    sync.copy()
+    _assert_equal(source, target)
+
+
+def test_copy_fallback():
+    torch.manual_seed(0)
+    source = _model()
+    target = copy.deepcopy(source)
+    sync = ModelSync(source, target)
+    sync._foreach = False  # pylint: disable=protected-access
+
+    with torch.no_grad():
+        for parameter in source.parameters():
+            parameter.add_(1.)
+
+    sync.copy()
+    _assert_equal(source, target)
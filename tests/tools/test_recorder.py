@@ -0,0 +1,71 @@
+# Copyright 2020 Michael Janschek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the recorder, its gif writing process and aggregates."""
+
+import csv
+import os
+
+import imageio
+import torch
+
+from pytorch_seed_rl.tools import Recorder
+
+FRAME_SHAPE = (1, 1, 16, 16)
+
+
+def _frame(value: int) -> torch.Tensor:
+    return torch.full(FRAME_SHAPE, value, dtype=torch.uint8)
+
+
+def test_write_gif(tmp_path):
+    recorder = Recorder(save_path=str(tmp_path), render=True)
+
+    # black and unchanged frames are skipped by the gif process
+    for value in [0, 10, 10, 20, 0, 30, 30]:
+        recorder._record_frame(_frame(value))  # pylint: disable=protected-access
+    recorder.record_eps_id = 1
+    recorder.record_return = 5
+    recorder._record_episode()  # pylint: disable=protected-access
+    assert recorder.rec_frames == []
+    recorder.close()
+
+    gif = imageio.mimread(os.path.join(str(tmp_path), 'gif', 'e1_r5.gif'))
+    assert [frame.max() for frame in gif] == [10, 20, 30]
+    assert recorder.dropped_frames == 0
+
+
+def test_recording_memory_limit(tmp_path):
+    frame_bytes = 16 * 16
+    recorder = Recorder(save_path=str(tmp_path), render=True,
+                        max_recording_bytes=3 * frame_bytes)
+    for value in range(1, 6):
+        recorder._record_frame(_frame(value), checks=False)  # pylint: disable=protected-access
+    assert len(recorder.rec_frames) == 3 and recorder.dropped_frames == 2
+
+    recorder.record_eps_id = 1
+    recorder._record_episode(check_return=False)  # pylint: disable=protected-access
+    recorder.close()
+    assert len(imageio.mimread(os.path.join(str(tmp_path), 'gif', 'e1.gif'))) == 3
+
+
+def test_aggregates(tmp_path):
+    recorder = Recorder(save_path=str(tmp_path), aggregate_interval=3600.)
+    recorder.aggregate('policy_lag', [0, 1, 1, 4])
+    recorder.close()
+
+    with open(os.path.join(str(tmp_path), 'csv', 'aggregates.csv'), newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert len(rows) == 1
+    assert rows[0]['policy_lag_count'] == '4' and float(rows[0]['policy_lag_max']) == 4.
+    assert rows[0]['return_count'] == '0'